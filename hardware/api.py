@@ -1,27 +1,211 @@
-from flask import Flask, jsonify
-from database import ParkingDatabase
+import base64
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+from database import ParkingDatabase, LOG_PAGES, STATS_QUERIES
 from flask_cors import CORS
+from event_feed import EventBroker
+from export import FORMATS, export_chunks
+from metrics import CONTENT_TYPE, REGISTRY, histogram
+from read_model import LogProjection
 
 app = Flask(__name__)
 CORS(app)  # Allow cross-origin requests for the dashboard
 
-db = ParkingDatabase()
+# One pooled database shared by all request threads
+db = ParkingDatabase(minconn=2, maxconn=10)
+
+# One poller shared by every dashboard subscribed to /api/events
+broker = EventBroker(db).start()
+
+# Newest rows of each log in memory, updated from the broker's feed
+projection = LogProjection(db, broker).start()
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Default window per rollup granularity, and the most buckets one request may return
+STATS_WINDOWS = {'hourly': timedelta(hours=48), 'daily': timedelta(days=30)}
+MAX_STATS_BUCKETS = 2000
+
+# Streaming endpoints (/api/events, /api/export) are timed to their first byte
+REQUEST_SECONDS = histogram('api_request_seconds', 'API request latency by route and status',
+                            ['endpoint', 'status'])
+
+
+def encode_cursor(key):
+    """Opaque cursor for a (timestamp, id) key."""
+    if key is None:
+        return None
+    timestamp, record_id = key
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{record_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    timestamp, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(timestamp), int(record_id)
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    started = g.pop('started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.labels(endpoint=endpoint, status=response.status_code).observe(
+            time.perf_counter() - started)
+    return response
 
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
+    """Newest rows of every log, served from memory.
+
+    Send the ETag back in If-None-Match: if nothing changed the answer is
+    304 Not Modified. The ETag covers the page size, so a new ?limit always
+    gets a full answer. Older history is in /api/logs/<log_type>.
+    """
+    limit = request.args.get('limit', type=int)
+    etag = projection.etag(limit)
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+
+    logs, etag = projection.snapshot(limit)
+    response = jsonify(logs)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # always revalidate, which is cheap
+    return response
+
+@app.route('/api/logs/<log_type>', methods=['GET'])
+def get_log_page(log_type):
+    """One page of checkins, checkouts, payments or alerts, newest first.
+
+    Query parameters: limit, cursor (next_cursor from the previous page),
+    since / until (ISO timestamps, half-open range) and plate.
+    """
+    if log_type not in LOG_PAGES:
+        return jsonify({'error': f"Unknown log type '{log_type}'"}), 404
+
     try:
-        checkins = db.get_all_entries()
-        checkouts = db.get_all_exits()
-        payments = db.get_all_payments()
-        alerts = db.get_all_alerts()
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        cursor = request.args.get('cursor')
+        before = decode_cursor(cursor) if cursor else None
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+        plate = request.args.get('plate', '').strip().upper() or None
+    except ValueError as e:
+        return jsonify({'error': f"Invalid parameter: {e}"}), 400
+
+    try:
+        items, next_key = db.get_log_page(log_type, limit, before, since, until, plate)
         return jsonify({
-            'checkins': checkins,
-            'checkouts': checkouts,
-            'payments': payments,
-            'alerts': alerts
+            'items': items,
+            'next_cursor': encode_cursor(next_key)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """Server-sent events: checkin, checkout, payment and alert as they are written.
+
+    Browsers resend the last id they saw in the Last-Event-ID header when they
+    reconnect; a `reset` event means the client should reload its snapshot.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+
+    return Response(
+        broker.stream(last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/stats/<granularity>', methods=['GET'])
+def get_stats(granularity):
+    """Hourly or daily occupancy, dwell, revenue and unauthorized exits per lot.
+
+    Query parameters: since / until (ISO timestamps, default the last 48 hours
+    or 30 days) and lot. Buckets without activity are omitted; occupancy
+    carries over from the previous bucket.
+    """
+    if granularity not in STATS_QUERIES:
+        return jsonify({'error': f"Unknown granularity '{granularity}'"}), 404
+
+    try:
+        until = request.args.get('until')
+        until = datetime.fromisoformat(until) if until else datetime.now()
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else until - STATS_WINDOWS[granularity]
+        lot_id = request.args.get('lot') or None
+    except ValueError as e:
+        return jsonify({'error': f"Invalid parameter: {e}"}), 400
+
+    try:
+        return jsonify({
+            'granularity': granularity,
+            'since': since.strftime('%Y-%m-%d %H:%M:%S'),
+            'until': until.strftime('%Y-%m-%d %H:%M:%S'),
+            'buckets': db.get_stats(granularity, since, until, lot_id, MAX_STATS_BUCKETS)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stats/occupancy', methods=['GET'])
+def get_occupancy():
+    """Cars currently inside, per lot."""
+    try:
+        return jsonify(db.get_lot_occupancy())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export', methods=['GET'])
+def export_history():
+    """Download parking history as CSV or NDJSON, streamed in chunks.
+
+    Query parameters: format (csv or ndjson, default csv) and since / until
+    (ISO timestamps on entry_time). Rows come from a server-side cursor a
+    batch at a time, so memory does not grow with the size of the export.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in FORMATS:
+        return jsonify({'error': f"Unknown format '{export_format}'"}), 400
+    try:
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+    except ValueError as e:
+        return jsonify({'error': f"Invalid parameter: {e}"}), 400
+
+    name = 'parking_history'
+    if since or until:
+        name += f"_{since.date() if since else 'start'}_{until.date() if until else 'now'}"
+    batches = db.export_records(since, until)
+    return Response(
+        stream_with_context(export_chunks(batches, export_format)),
+        mimetype=FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{name}.{export_format}"'}
+    )
+
+@app.route('/api/db/pool', methods=['GET'])
+def get_pool_stats():
+    """Connection pool checkouts and wait times, for sizing the pool under load."""
+    return jsonify(db.pool_stats())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics for the API process, including its database queries."""
+    return Response(REGISTRY.expose(), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from detector_backend import BACKENDS, create_detector, resolve_model_path
+from export_detector import DEFAULT_WEIGHTS, list_images
+
+DEFAULT_IMAGES = '../model_dev/dataset/images'
+DEFAULT_LABELS = '../model_dev/dataset/labels'
+
+
+def load_ground_truth(label_path, width, height):
+    """Read YOLO-format labels (class cx cy w h, normalized) as pixel xyxy boxes."""
+    boxes = []
+    if not os.path.exists(label_path):
+        return np.zeros((0, 4))
+    with open(label_path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 5:
+                continue
+            cx, cy, w, h = (float(v) for v in parts[1:])
+            boxes.append([(cx - w / 2) * width, (cy - h / 2) * height,
+                          (cx + w / 2) * width, (cy + h / 2) * height])
+    return np.array(boxes).reshape(-1, 4)
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy arrays."""
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)))
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter)
+
+
+def average_precision(predictions, ground_truth, iou_threshold):
+    """COCO-style 101-point AP for a single class.
+
+    predictions: list of (image_index, score, box); ground_truth: list of (N, 4) arrays.
+    """
+    total = sum(len(gt) for gt in ground_truth)
+    if total == 0:
+        return 0.0
+    matched = [np.zeros(len(gt), dtype=bool) for gt in ground_truth]
+    tp = []
+    for image_index, _, box in sorted(predictions, key=lambda p: p[1], reverse=True):
+        gt = ground_truth[image_index]
+        ious = iou_matrix(np.array([box]), gt)[0] if len(gt) else np.array([])
+        best = int(ious.argmax()) if len(ious) else -1
+        if best >= 0 and ious[best] >= iou_threshold and not matched[image_index][best]:
+            matched[image_index][best] = True
+            tp.append(1)
+        else:
+            tp.append(0)
+
+    tp = np.array(tp)
+    if not len(tp):
+        return 0.0
+    cum_tp = np.cumsum(tp)
+    recall = cum_tp / total
+    precision = cum_tp / np.arange(1, len(tp) + 1)
+    # Make precision monotonically decreasing, then sample at 101 recall points
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    points = np.linspace(0, 1, 101)
+    idx = np.searchsorted(recall, points, side='left')
+    return float(np.mean([precision[i] if i < len(precision) else 0.0 for i in idx]))
+
+
+def benchmark(detector, images, label_dir, warmup):
+    """Time detect() per image and compute mAP@0.5 and mAP@0.5:0.95."""
+    frames = [cv2.imread(path) for path in images]
+    for frame in frames[:warmup]:
+        detector.detect(frame)
+
+    latencies, predictions, ground_truth = [], [], []
+    for i, (path, frame) in enumerate(zip(images, frames)):
+        started = time.perf_counter()
+        result = detector.detect(frame)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        predictions.extend((i, score, box) for box, score in zip(result.boxes, result.scores))
+        stem = os.path.splitext(os.path.basename(path))[0]
+        height, width = frame.shape[:2]
+        ground_truth.append(load_ground_truth(os.path.join(label_dir, stem + '.txt'), width, height))
+
+    thresholds = np.arange(0.5, 0.96, 0.05)
+    aps = [average_precision(predictions, ground_truth, t) for t in thresholds]
+    latencies = np.array(latencies)
+    return {
+        'images': len(images),
+        'latency_ms_mean': round(float(latencies.mean()), 2),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 2),
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 2),
+        'fps': round(float(1000 / latencies.mean()), 1),
+        'map50': round(aps[0], 4),
+        'map50_95': round(float(np.mean(aps)), 4),
+    }
+
+
+def parse_backend(spec):
+    """Parse BACKEND[:MODEL_PATH]."""
+    backend, _, path = spec.partition(':')
+    if backend not in BACKENDS:
+        raise argparse.ArgumentTypeError(f"Unknown backend {backend!r}")
+    return backend, path
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Compare plate detector backends on latency and mAP')
+
+    parser.add_argument('--backend', type=parse_backend, action='append',
+                        help='BACKEND[:MODEL_PATH] to benchmark (repeatable). '
+                             'Defaults to torch, onnx and the int8 onnx export.')
+    parser.add_argument('--images', type=str, default=DEFAULT_IMAGES,
+                        help='Directory of evaluation images')
+    parser.add_argument('--labels', type=str, default=DEFAULT_LABELS,
+                        help='Directory of YOLO-format labels')
+    parser.add_argument('--limit', type=int, default=0,
+                        help='Only use the first N images')
+    parser.add_argument('--warmup', type=int, default=5,
+                        help='Warm-up inferences before timing')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='CPU threads for ONNX Runtime / OpenVINO (0 = library default)')
+    parser.add_argument('--output', type=str,
+                        help='Write results as JSON to this file')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_arguments()
+    backends = args.backend or [
+        ('torch', DEFAULT_WEIGHTS),
+        ('onnx', resolve_model_path('onnx', DEFAULT_WEIGHTS)),
+        ('onnx', os.path.splitext(DEFAULT_WEIGHTS)[0] + '-int8.onnx'),
+    ]
+
+    images = list_images(args.images)
+    if args.limit:
+        images = images[:args.limit]
+
+    # Note: the bundled dataset is the training set, so mAP here is only
+    # meaningful as a comparison between backends, not as absolute accuracy.
+    results = {}
+    for backend, path in backends:
+        path = resolve_model_path(backend, path or DEFAULT_WEIGHTS)
+        if not os.path.exists(path):
+            print(f"[SKIPPED] {backend}: {path} not found (run export_detector.py first)")
+            continue
+        name = f"{backend}:{os.path.basename(path)}"
+        print(f"[BENCH] {name} on {len(images)} images")
+        detector = create_detector(backend, path, threads=args.threads)
+        results[name] = benchmark(detector, images, args.labels, args.warmup)
+        print(f"[RESULT] {name}: {json.dumps(results[name])}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"[SAVED] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
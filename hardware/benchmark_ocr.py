@@ -0,0 +1,149 @@
+import argparse
+import json
+import re
+import time
+
+import numpy as np
+
+from benchmark_detector import DEFAULT_IMAGES
+from benchmark_preprocess import DEFAULT_CROPS, PLATE_REGEX, dataset_crops, labeled_crops, load_labels
+from ocr_engine import DEFAULT_RECOGNIZER, ENGINES, create_ocr_engine
+from plate_preprocess import DEFAULT_STRATEGY, STRATEGIES, PlatePreprocessor
+
+# main.py OCRs the 3 best crops of a track per round (track_crops_per_round)
+DEFAULT_BATCH = 3
+
+
+def summarize(latencies):
+    """Mean/p50/p95/p99 of a list of milliseconds."""
+    values = np.array(latencies)
+    return {
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p95_ms': round(float(np.percentile(values, 95)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def run_engine(ocr, images, plates, repeat, warmup, batch):
+    """Read every crop one by one (timed), then in per-vehicle batches; score the single reads."""
+    pattern = re.compile(PLATE_REGEX)
+    for img in images[:warmup]:
+        ocr.recognize(img)
+
+    single, texts = [], []
+    for _ in range(repeat):
+        texts = []
+        for img in images:
+            started = time.perf_counter()
+            texts.append(ocr.recognize(img))
+            single.append((time.perf_counter() - started) * 1000)
+
+    batched = []
+    for start in range(0, len(images), batch):
+        started = time.perf_counter()
+        ocr.recognize_many(images[start:start + batch])
+        batched.append((time.perf_counter() - started) * 1000)
+
+    result = {'crop': summarize(single), 'vehicle_batch': summarize(batched)}
+    labeled = [(text, plate) for text, plate in zip(texts, plates) if plate is not None]
+    if labeled:
+        reads = [pattern.findall(text) for text, _ in labeled]
+        result['accuracy'] = round(sum(bool(r) and r[0] == plate for r, (_, plate) in zip(reads, labeled))
+                                   / len(labeled), 4)
+        result['format_valid'] = round(sum(bool(r) for r in reads) / len(labeled), 4)
+    return result
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Compare OCR engines (accuracy and latency) on labeled plate crops'
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--crops', type=str, default=DEFAULT_CROPS,
+                        help='Directory of plate crops, labeled by a <PLATE>_... file name or --labels')
+    source.add_argument('--dataset', action='store_true',
+                        help='Cut crops from the YOLO dataset boxes instead (named by --labels)')
+    parser.add_argument('--labels', type=str,
+                        help='CSV of file,plate for the crops')
+    parser.add_argument('--engines', type=str, default=','.join(ENGINES),
+                        help='Comma-separated engines to compare')
+    parser.add_argument('--model', type=str, default=DEFAULT_RECOGNIZER,
+                        help='Exported CRNN (.onnx) for the crnn engine')
+    parser.add_argument('--preprocess', type=str, choices=sorted(STRATEGIES), default=DEFAULT_STRATEGY,
+                        help="Preprocessing before Tesseract (the CRNN uses the one it was trained on)")
+    parser.add_argument('--batch', type=int, default=DEFAULT_BATCH,
+                        help='Crops per recognize_many call (one tracker OCR round)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Timed passes over the crops per engine')
+    parser.add_argument('--warmup', type=int, default=5,
+                        help='Untimed crops per engine before timing')
+    parser.add_argument('--limit', type=int, default=0,
+                        help='Only use the first N crops (or dataset images)')
+    parser.add_argument('--output', type=str,
+                        help='Write results as JSON to this file')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_arguments()
+    labels = load_labels(args.labels) if args.labels else {}
+    if args.dataset:
+        crops = [(name, crop, labels.get(name)) for name, crop in dataset_crops(limit=args.limit)]
+        source = DEFAULT_IMAGES
+    else:
+        crops = labeled_crops(args.crops, labels)
+        crops = crops[:args.limit] if args.limit else crops
+        source = args.crops
+    if not crops:
+        print(f"[ERROR] No crops found in {source}")
+        return
+
+    plates = [plate for _, _, plate in crops]
+    labeled = sum(plate is not None for plate in plates)
+    print(f"[BENCH] {len(crops)} crops from {source}, {labeled} labeled")
+    if not labeled:
+        print("[WARNING] No labeled crops: latency only (see train_recognizer.py --dump-crops)")
+
+    results = {}
+    for engine in [name.strip() for name in args.engines.split(',') if name.strip()]:
+        try:
+            ocr = create_ocr_engine(workers=1, engine=engine, model_path=args.model)
+        except (ImportError, OSError, ValueError) as e:
+            print(f"[SKIP] {engine}: {e}")
+            continue
+        strategy = ocr.preprocess or args.preprocess
+        preprocess = PlatePreprocessor(strategy)
+        images = [preprocess(crop) for _, crop, _ in crops]
+        try:
+            result = run_engine(ocr, images, plates, args.repeat, args.warmup, args.batch)
+        finally:
+            ocr.close()
+        result['preprocess'] = strategy
+        results[engine] = result
+
+        crop, batch = result['crop'], result['vehicle_batch']
+        line = (f"  {engine:<10} {type(ocr).__name__:<18} per crop mean {crop['mean_ms']:>8.3f} ms  "
+                f"p95 {crop['p95_ms']:>8.3f} ms  per {args.batch}-crop batch {batch['mean_ms']:>8.3f} ms")
+        if 'accuracy' in result:
+            line += f"  accuracy {result['accuracy']:.1%}  valid format {result['format_valid']:.1%}"
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'source': source,
+                'crops': len(crops),
+                'labeled': labeled,
+                'batch': args.batch,
+                'model': args.model,
+                'engines': results
+            }, f, indent=2)
+        print(f"[SAVED] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from detector_backend import BACKENDS
+from export_detector import DEFAULT_WEIGHTS, list_images
+from main import DEFAULT_CONFIG, PlateRecognitionSystem
+from ocr_engine import DEFAULT_RECOGNIZER, ENGINES as OCR_ENGINES
+from plate_preprocess import STRATEGIES
+from profiler import add_profile_arguments
+
+DEFAULT_IMAGES = '../model_dev/dataset/images'
+STAGES = ('detect', 'preprocess', 'ocr', 'validate', 'frame')
+
+
+class ReplaySystem(PlateRecognitionSystem):
+    """PlateRecognitionSystem fed from recorded frames instead of a camera and Arduino.
+
+    The distance sensor returns whatever the replay script sets, entries are
+    recorded as decisions instead of being logged, and every stage of
+    process_frame is timed.
+    """
+
+    def __init__(self, config):
+        self.distance = float('inf')
+        self.source = None
+        self.frame_index = 0
+        self.decisions = []  # (frame index, source, plate)
+        self.latencies = defaultdict(list)  # stage -> per-frame milliseconds
+        self.frame_times = defaultdict(float)
+        super().__init__(config)
+
+    # -- no hardware, no persistence ----------------------------------------
+
+    def init_session_log(self):
+        pass
+
+    def init_camera(self):
+        self.cap = None
+
+    def read_distance(self):
+        return self.distance
+
+    def save_plate_entry(self, plate_number):
+        self.decisions.append((self.frame_index, self.source, plate_number))
+        return True
+
+    def cleanup(self):
+        try:
+            super().cleanup()
+        except cv2.error:
+            pass  # headless OpenCV build (e.g. CI): there are no windows to destroy
+
+    # -- stage timing -------------------------------------------------------
+
+    @contextmanager
+    def timed(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.frame_times[stage] += (time.perf_counter() - started) * 1000
+
+    def init_ocr(self):
+        super().init_ocr()
+        recognize_many = self.ocr.recognize_many
+
+        def timed_recognize_many(imgs):
+            with self.timed('ocr'):
+                return recognize_many(imgs)
+        self.ocr.recognize_many = timed_recognize_many
+
+    def detect_plates(self, frame):
+        with self.timed('detect'):
+            return super().detect_plates(frame)
+
+    def process_plate_image(self, plate_img):
+        with self.timed('preprocess'):
+            return super().process_plate_image(plate_img)
+
+    def validate_plate(self, plate_text):
+        with self.timed('validate'):
+            return super().validate_plate(plate_text)
+
+    def replay(self, frame, distance, source):
+        """Run one frame through process_frame and record per-stage latency."""
+        self.frame_index += 1
+        self.distance = distance
+        self.source = source
+        self.frame_times.clear()
+        with self.timed('frame'), self.profiler.span('process_frame', frame=self.frame_index):
+            self.process_frame(frame)
+        for stage, elapsed in self.frame_times.items():
+            self.latencies[stage].append(elapsed)
+
+    def next_vehicle(self):
+        """Start a fresh tracker so reads from different still images never share a track."""
+        self.init_tracker()
+        self.plate_buffer = []
+
+
+def parse_distance_script(script):
+    """Parse 'CM:FRAMES,CM:FRAMES,...' (or a single CM) into a list of (cm, frames)."""
+    steps = []
+    for part in script.split(','):
+        cm, _, frames = part.partition(':')
+        steps.append((float(cm), int(frames or 1)))
+    return steps
+
+
+def scripted_distances(steps):
+    """Repeat the distance script forever, one reading per frame."""
+    while True:
+        for cm, frames in steps:
+            for _ in range(frames):
+                yield cm
+
+
+def image_frames(image_dir, frames_per_image, gap_frames, near, far, limit=0):
+    """Each image is one vehicle: held in range for a while, then driven off.
+
+    Yields (frame, distance, source, new_vehicle).
+    """
+    images = list_images(image_dir)
+    if limit:
+        images = images[:limit]
+    for path in images:
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        source = os.path.basename(path)
+        for i in range(frames_per_image):
+            yield frame, near, source, i == 0
+        for _ in range(gap_frames):
+            yield frame, far, source, False
+
+
+def video_frames(video_path, steps, limit=0):
+    """Frames of a recording with distances from the script. Yields (frame, distance, None, False)."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {video_path}")
+    distances = scripted_distances(steps)
+    count = 0
+    try:
+        while not limit or count < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            count += 1
+            yield frame, next(distances), None, False
+    finally:
+        cap.release()
+
+
+def load_ground_truth(path):
+    """Read 'source,plate' rows: source is an image file name, or FIRST-LAST frame numbers of a video."""
+    truth = {}
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[0].strip().lower() == 'source':
+                continue
+            truth[row[0].strip()] = row[1].strip().upper()
+    return truth
+
+
+def match_decisions(decisions, truth, slack):
+    """Pair every ground-truth vehicle with its first decision.
+
+    Image sources match by file name; frame ranges match decisions made
+    inside the range or up to `slack` frames after it (tracks flush late).
+    Returns {source: decided plate or None} and the decisions left over.
+    """
+    ranges = {}
+    for source in truth:
+        first, sep, last = source.partition('-')
+        if sep and first.isdigit() and last.isdigit():
+            ranges[source] = (int(first), int(last) + slack)
+
+    matched, extra = {source: None for source in truth}, []
+    for frame_index, source, plate in decisions:
+        key = source if source in truth else next(
+            (s for s, (first, last) in ranges.items() if first <= frame_index <= last), None)
+        if key is not None and matched[key] is None:
+            matched[key] = plate
+        else:
+            extra.append((frame_index, source, plate))
+    return matched, extra
+
+
+def accuracy_report(decisions, truth, slack):
+    matched, extra = match_decisions(decisions, truth, slack)
+    correct = sum(1 for source, plate in matched.items() if plate == truth[source])
+    wrong = sum(1 for source, plate in matched.items() if plate is not None and plate != truth[source])
+    missed = sum(1 for plate in matched.values() if plate is None)
+    decided = correct + wrong + len(extra)
+    return {
+        'vehicles': len(truth),
+        'correct': correct,
+        'wrong': wrong,
+        'missed': missed,
+        'extra_decisions': len(extra),
+        'accuracy': round(correct / len(truth), 4) if truth else 0.0,
+        'precision': round(correct / decided, 4) if decided else 0.0,
+        'errors': [{'source': source, 'expected': truth[source], 'decided': plate}
+                   for source, plate in sorted(matched.items()) if plate != truth[source]]
+    }
+
+
+def summarize(latencies):
+    latencies = np.array(latencies)
+    return {
+        'frames': len(latencies),
+        'latency_ms_mean': round(float(latencies.mean()), 3),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 3),
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 3),
+        'latency_ms_p99': round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Print FPS and per-stage p50/p95 changes against an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"[COMPARE] against {baseline_path} (commit {baseline.get('commit')})")
+    if baseline.get('fps'):
+        print(f"  fps: {baseline['fps']} -> {results['fps']} "
+              f"({(results['fps'] / baseline['fps'] - 1) * 100:+.1f}%)")
+    for stage, now in results['stages'].items():
+        before = baseline.get('stages', {}).get(stage)
+        if not before:
+            continue
+        for key in ('latency_ms_p50', 'latency_ms_p95'):
+            change = (now[key] / before[key] - 1) * 100 if before[key] else 0.0
+            print(f"  {stage} {key[11:]}: {before[key]} -> {now[key]} ms ({change:+.1f}%)")
+    if 'accuracy' in results and 'accuracy' in baseline:
+        print(f"  accuracy: {baseline['accuracy']['accuracy']} -> {results['accuracy']['accuracy']}")
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Replay recorded frames through PlateRecognitionSystem.process_frame and '
+                    'report FPS, per-stage latency and plate accuracy'
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--images', type=str, default=DEFAULT_IMAGES,
+                        help='Directory of still images, one vehicle per image')
+    source.add_argument('--video', type=str,
+                        help='Video file to replay instead of an image directory')
+    parser.add_argument('--ground-truth', type=str,
+                        help='CSV of source,plate (image file name, or FIRST-LAST video frames)')
+    parser.add_argument('--model', type=str, default=DEFAULT_WEIGHTS,
+                        help='Path to the detector model')
+    parser.add_argument('--backend', type=str, choices=BACKENDS, default='torch',
+                        help='Inference backend for plate detection')
+    parser.add_argument('--frames-per-image', type=int, default=10,
+                        help='Frames each still image is held in range')
+    parser.add_argument('--gap-frames', type=int, default=2,
+                        help='Out-of-range frames after each image (lets tracks flush)')
+    parser.add_argument('--distance', type=str, default='30',
+                        help="Video distance script 'CM:FRAMES,...', repeated (default: always 30cm)")
+    parser.add_argument('--limit', type=int, default=0,
+                        help='Only replay the first N images (or video frames)')
+    parser.add_argument('--motion-gate', action='store_true',
+                        help='Keep the scene-change gate on (off by default: still images never change)')
+    parser.add_argument('--ocr-pool', type=int, default=2,
+                        help='Number of long-lived Tesseract instances')
+    parser.add_argument('--ocr-engine', type=str, choices=OCR_ENGINES, default='tesseract',
+                        help='Plate text recognizer')
+    parser.add_argument('--ocr-model', type=str, default=DEFAULT_RECOGNIZER,
+                        help='Path to the exported CRNN (.onnx) for --ocr-engine crnn')
+    parser.add_argument('--preprocess', type=str, choices=sorted(STRATEGIES),
+                        default=DEFAULT_CONFIG['preprocess_strategy'],
+                        help='Plate preprocessing strategy')
+    parser.add_argument('--output', type=str,
+                        help='Write results as JSON to this file')
+    parser.add_argument('--baseline', type=str,
+                        help='Earlier --output file to compare against')
+    add_profile_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_arguments()
+    far = DEFAULT_CONFIG['detection_distance'] * 3
+    near = DEFAULT_CONFIG['detection_distance'] / 2
+
+    config = {
+        **DEFAULT_CONFIG,
+        'model_path': args.model,
+        'backend': args.backend,
+        'camera_device': None,
+        'use_arduino': False,
+        'debug_mode': False,
+        'save_plate_images': False,
+        'log_file': os.path.join(tempfile.mkdtemp(prefix='benchmark_pipeline_'), 'replay.log'),
+        'entry_cooldown': 0,  # every vehicle is a new decision
+        'ocr_workers': 1,
+        'ocr_pool_size': args.ocr_pool,
+        'ocr_engine': args.ocr_engine,
+        'ocr_model': args.ocr_model,
+        'motion_gate': args.motion_gate,
+        'preprocess_strategy': args.preprocess,
+        'profile': args.profile,
+        'profile_dir': args.profile_dir,
+        'profile_seconds': args.profile_seconds,
+        'profile_vehicles': args.profile_vehicles,
+        'profile_cprofile': args.profile_cprofile
+    }
+    system = ReplaySystem(config)
+    logging.getLogger('PlateRecognition').setLevel(logging.WARNING)  # no per-plate log lines
+
+    if args.video:
+        frames = video_frames(args.video, parse_distance_script(args.distance), args.limit)
+        name = args.video
+    else:
+        frames = image_frames(args.images, args.frames_per_image, args.gap_frames, near, far, args.limit)
+        name = args.images
+
+    print(f"[BENCH] Replaying {name} with the {args.backend} detector and {args.ocr_engine} OCR")
+    started = time.perf_counter()
+    system.profiler.start()
+    try:
+        frame = source = None
+        for frame, distance, source, new_vehicle in frames:
+            if new_vehicle:
+                system.next_vehicle()
+            system.replay(frame, distance, source)
+        if frame is not None:
+            # Drive off after the last frame so pending tracks are read
+            for _ in range(max(1, args.gap_frames)):
+                system.replay(frame, far, source)
+    finally:
+        elapsed = time.perf_counter() - started
+        system.cleanup()
+
+    results = {
+        'commit': git_commit(),
+        'source': name,
+        'backend': args.backend,
+        'preprocess': args.preprocess,
+        'ocr_engine': args.ocr_engine,
+        'model': args.model,
+        'frames': system.frame_index,
+        'elapsed_s': round(elapsed, 2),
+        'fps': round(system.frame_index / elapsed, 1) if elapsed else 0.0,
+        'stages': {stage: summarize(system.latencies[stage]) for stage in STAGES if system.latencies[stage]},
+        'decisions': len(system.decisions),
+    }
+    if args.ground_truth:
+        truth = load_ground_truth(args.ground_truth)
+        results['accuracy'] = accuracy_report(system.decisions, truth, config['track_max_missed'])
+
+    print(f"[RESULT] {results['frames']} frames at {results['fps']} FPS, {results['decisions']} decisions")
+    for stage, summary in results['stages'].items():
+        print(f"  {stage:<10} p50 {summary['latency_ms_p50']:>8.2f} ms  p95 {summary['latency_ms_p95']:>8.2f} ms  "
+              f"p99 {summary['latency_ms_p99']:>8.2f} ms  ({summary['frames']} frames)")
+    if 'accuracy' in results:
+        accuracy = results['accuracy']
+        print(f"  accuracy {accuracy['accuracy']:.1%} ({accuracy['correct']}/{accuracy['vehicles']}), "
+              f"{accuracy['wrong']} wrong, {accuracy['missed']} missed, {accuracy['extra_decisions']} extra")
+
+    if args.baseline:
+        compare(results, args.baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"[SAVED] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
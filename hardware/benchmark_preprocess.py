@@ -0,0 +1,256 @@
+import argparse
+import csv
+import json
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+
+from benchmark_detector import DEFAULT_IMAGES, DEFAULT_LABELS, load_ground_truth
+from export_detector import list_images
+from ocr_engine import DEFAULT_TESSERACT_CONFIG, create_ocr_engine
+from plate_preprocess import PLATE_HEIGHT, STRATEGIES, PlatePreprocessor
+
+# main.py --save-images writes crops here as <PLATE>_<timestamp>.jpg
+DEFAULT_CROPS = 'plates'
+PLATE_REGEX = r'(RA[A-Z]\d{3}[A-Z])'
+
+
+def legacy_otsu(crop):
+    """The lane scripts' preprocessing before plate_preprocess (reference only)."""
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    return cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def legacy_adaptive(crop):
+    """main.py's preprocessing before plate_preprocess (reference only)."""
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
+    kernel = np.ones((1, 1), np.uint8)
+    thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
+    return cv2.medianBlur(thresh, 3)
+
+
+LEGACY = {'legacy_otsu': legacy_otsu, 'legacy_adaptive': legacy_adaptive}
+
+
+def load_labels(path):
+    """Read 'file,plate' rows into {file name: plate}."""
+    labels = {}
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[0].strip().lower() == 'file':
+                continue
+            labels[row[0].strip()] = row[1].strip().upper()
+    return labels
+
+
+def labeled_crops(crop_dir, labels=None):
+    """(name, crop, plate) for every image in crop_dir.
+
+    The plate comes from the labels dict, else from a '<PLATE>_...' file
+    name (how main.py saves crops), else it is None and the crop is only
+    used for timing.
+    """
+    pattern = re.compile(PLATE_REGEX)
+    crops = []
+    for path in list_images(crop_dir):
+        name = os.path.basename(path)
+        crop = cv2.imread(path)
+        if crop is None:
+            continue
+        plate = (labels or {}).get(name)
+        if plate is None:
+            match = pattern.fullmatch(name.split('_')[0].upper())
+            plate = match.group(1) if match else None
+        crops.append((name, crop, plate))
+    return crops
+
+
+def dataset_crops(image_dir=DEFAULT_IMAGES, label_dir=DEFAULT_LABELS, pad=0.05, limit=0):
+    """Cut the plate boxes of a YOLO-format dataset out of its images.
+
+    Returns (name, crop) with names '<image stem>_<box index>.jpg', so a
+    labels CSV can give their plate text. Boxes are padded by `pad` of their
+    size on each side, like a slightly loose detection.
+    """
+    crops = []
+    images = list_images(image_dir)
+    for path in images[:limit] if limit else images:
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        height, width = frame.shape[:2]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        boxes = load_ground_truth(os.path.join(label_dir, stem + '.txt'), width, height)
+        for i, (x1, y1, x2, y2) in enumerate(boxes):
+            dx, dy = (x2 - x1) * pad, (y2 - y1) * pad
+            x1, y1 = max(0, int(x1 - dx)), max(0, int(y1 - dy))
+            x2, y2 = min(width, int(x2 + dx)), min(height, int(y2 + dy))
+            if x2 > x1 and y2 > y1:
+                crops.append((f"{stem}_{i}.jpg", frame[y1:y2, x1:x2].copy()))
+    return crops
+
+
+def time_preprocess(preprocess, crops, repeat, warmup):
+    """Per-crop latencies (microseconds) over `repeat` passes, and the outputs of the last pass."""
+    for crop in crops[:warmup]:
+        preprocess(crop)
+    latencies, outputs = [], []
+    for _ in range(repeat):
+        outputs = []
+        for crop in crops:
+            started = time.perf_counter()
+            outputs.append(preprocess(crop))
+            latencies.append((time.perf_counter() - started) * 1e6)
+    return np.array(latencies), outputs
+
+
+def score_ocr(ocr, outputs, plates):
+    """OCR each labeled output; returns (accuracy, mean OCR milliseconds per crop)."""
+    pattern = re.compile(PLATE_REGEX)
+    correct, total, latencies = 0, 0, []
+    for output, plate in zip(outputs, plates):
+        if plate is None:
+            continue
+        started = time.perf_counter()
+        text = ocr.recognize(output)
+        latencies.append((time.perf_counter() - started) * 1000)
+        matches = pattern.findall(text)
+        correct += bool(matches) and matches[0] == plate
+        total += 1
+    return (correct / total if total else None), (float(np.mean(latencies)) if latencies else None)
+
+
+def select(results, min_accuracy):
+    """Fastest registered strategy whose accuracy meets the floor (the most accurate if none does).
+
+    Without OCR scores there is nothing to select on: the cheapest strategy
+    is simply the one that does least (gray), so None is returned.
+    """
+    scored = {name: r for name, r in results.items() if name in STRATEGIES and r.get('accuracy') is not None}
+    if not scored:
+        return None, 'no labeled crops were OCR\'d'
+
+    passing = {name: r for name, r in scored.items() if r['accuracy'] >= min_accuracy}
+    if not passing:
+        best = max(scored, key=lambda name: scored[name]['accuracy'])
+        return best, f"no strategy reached {min_accuracy:.0%}; most accurate"
+    cost = lambda r: r['latency_us_mean'] / 1000 + r['ocr_ms_mean']
+    return min(passing, key=lambda name: cost(passing[name])), f"fastest at >= {min_accuracy:.0%} accuracy"
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Time each plate preprocessing strategy (and its OCR accuracy on labeled crops) '
+                    'and pick the fastest one that meets an accuracy floor'
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--crops', type=str, default=DEFAULT_CROPS,
+                        help='Directory of plate crops, labeled by a <PLATE>_... file name or --labels')
+    source.add_argument('--dataset', action='store_true',
+                        help='Cut crops from the YOLO dataset boxes instead (timing only unless --labels names them)')
+    parser.add_argument('--labels', type=str,
+                        help='CSV of file,plate for the crops')
+    parser.add_argument('--strategies', type=str, default=','.join(STRATEGIES),
+                        help='Comma-separated strategies to compare')
+    parser.add_argument('--height', type=int, default=PLATE_HEIGHT,
+                        help='Normalized crop height in pixels')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='Timed passes over the crops per strategy')
+    parser.add_argument('--warmup', type=int, default=10,
+                        help='Untimed crops per strategy before timing')
+    parser.add_argument('--limit', type=int, default=0,
+                        help='Only use the first N crops (or dataset images)')
+    parser.add_argument('--min-accuracy', type=float, default=0.8,
+                        help='Accuracy floor for the selected strategy')
+    parser.add_argument('--no-ocr', action='store_true',
+                        help='Only time preprocessing')
+    parser.add_argument('--output', type=str,
+                        help='Write results as JSON to this file')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_arguments()
+    labels = load_labels(args.labels) if args.labels else {}
+    if args.dataset:
+        crops = [(name, crop, labels.get(name)) for name, crop in dataset_crops(limit=args.limit)]
+        source = DEFAULT_IMAGES
+    else:
+        crops = labeled_crops(args.crops, labels)
+        crops = crops[:args.limit] if args.limit else crops
+        source = args.crops
+    if not crops:
+        print(f"[ERROR] No crops found in {source}")
+        return
+
+    images = [crop for _, crop, _ in crops]
+    plates = [plate for _, _, plate in crops]
+    labeled = sum(plate is not None for plate in plates)
+    print(f"[BENCH] {len(crops)} crops from {source}, {labeled} labeled")
+
+    ocr = None
+    if labeled and not args.no_ocr:
+        try:
+            ocr = create_ocr_engine(DEFAULT_TESSERACT_CONFIG, workers=1)
+        except ImportError as e:
+            print(f"[WARNING] No OCR engine available ({e}); timing preprocessing only")
+
+    strategies = [name.strip() for name in args.strategies.split(',') if name.strip()]
+    candidates = {name: PlatePreprocessor(name, args.height) for name in strategies}
+    candidates.update(LEGACY)
+
+    results = {}
+    try:
+        for name, preprocess in candidates.items():
+            latencies, outputs = time_preprocess(preprocess, images, args.repeat, args.warmup)
+            result = {
+                'latency_us_mean': round(float(latencies.mean()), 1),
+                'latency_us_p50': round(float(np.percentile(latencies, 50)), 1),
+                'latency_us_p95': round(float(np.percentile(latencies, 95)), 1),
+            }
+            if ocr:
+                accuracy, ocr_ms = score_ocr(ocr, outputs, plates)
+                result['accuracy'] = round(accuracy, 4)
+                result['ocr_ms_mean'] = round(ocr_ms, 2)
+            results[name] = result
+
+            line = (f"  {name:<16} mean {result['latency_us_mean']:>8.1f} us  "
+                    f"p50 {result['latency_us_p50']:>8.1f} us  p95 {result['latency_us_p95']:>8.1f} us")
+            if ocr:
+                line += f"  accuracy {result['accuracy']:.1%}  ocr {result['ocr_ms_mean']:.2f} ms"
+            print(line)
+    finally:
+        if ocr:
+            ocr.close()
+
+    selected, reason = select(results, args.min_accuracy)
+    if selected:
+        print(f"[SELECTED] {selected} ({reason}): run the lanes with --preprocess {selected}")
+    else:
+        print(f"[SELECTED] none ({reason}); keep the current --preprocess default")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'source': source,
+                'crops': len(crops),
+                'labeled': labeled,
+                'height': args.height,
+                'min_accuracy': args.min_accuracy,
+                'strategies': results,
+                'selected': selected,
+                'reason': reason
+            }, f, indent=2)
+        print(f"[SAVED] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from migrate import apply_migrations
+from storage import BACKENDS, open_database
+
+BENCH_SCHEMA = 'bench_storage'
+
+
+def open_postgres():
+    """A ParkingDatabase on a scratch schema with every migration applied."""
+    admin = open_database('postgres', maxconn=1)
+    with admin.transaction() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+    db = open_database('postgres', maxconn=1, options=f'-c search_path={BENCH_SCHEMA}')
+    with db.transaction() as cursor:
+        apply_migrations(cursor)
+
+    def cleanup():
+        db.close()
+        with admin.transaction() as cursor:
+            cursor.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+        admin.close()
+    return db, cleanup
+
+
+def open_sqlite(synchronous):
+    """A SQLiteDatabase on a temporary file."""
+    directory = tempfile.mkdtemp(prefix='bench_storage_')
+    path = os.path.join(directory, 'parking.db')
+    db = open_database('sqlite', path=path, synchronous=synchronous)
+
+    def cleanup():
+        db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.rmdir(directory)
+    return db, cleanup
+
+
+def preload(db, count):
+    """Closed history plus some open sessions, so lookups run against populated indexes."""
+    for i in range(count):
+        plate = f"HX{i:05d}"
+        db.add_entry(plate)
+        if i % 10:
+            db.update_payment_status(plate, 500, 1)
+            if i % 5:
+                db.record_exit(plate)
+
+
+def timed(latencies, call, *args):
+    started = time.perf_counter()
+    result = call(*args)
+    latencies.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def summarize(latencies):
+    latencies = np.array(latencies)
+    return {
+        'decisions': len(latencies),
+        'latency_ms_mean': round(float(latencies.mean()), 3),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 3),
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 3),
+        'latency_ms_p99': round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def benchmark(db, decisions, warmup):
+    """Time full gate decisions straight against the store (no OpenSessionIndex).
+
+    Entry: has_unpaid_record + add_entry. Exit: get_paid_record + record_exit.
+    The payment in between is done by the terminal and not timed.
+    """
+    entry, exit_ = [], []
+    for i in range(warmup + decisions):
+        plate = f"BX{i:05d}"
+        entry_times, exit_times = [], []
+
+        started = time.perf_counter()
+        if not timed(entry_times, db.has_unpaid_record, plate):
+            timed(entry_times, db.add_entry, plate)
+        entry_ms = (time.perf_counter() - started) * 1000
+
+        db.update_payment_status(plate, 500, 1)
+
+        started = time.perf_counter()
+        if timed(exit_times, db.get_paid_record, plate):
+            timed(exit_times, db.record_exit, plate)
+        exit_ms = (time.perf_counter() - started) * 1000
+
+        if i >= warmup:
+            entry.append(entry_ms)
+            exit_.append(exit_ms)
+    return {'entry': summarize(entry), 'exit': summarize(exit_)}
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Compare per-decision latency of the Postgres and SQLite storage backends'
+    )
+    parser.add_argument('--backend', type=str, choices=BACKENDS, action='append',
+                        help='Backend to benchmark (repeatable). Defaults to both.')
+    parser.add_argument('--decisions', type=int, default=1000,
+                        help='Entry and exit decisions to time per backend')
+    parser.add_argument('--warmup', type=int, default=50,
+                        help='Untimed decisions before measuring')
+    parser.add_argument('--preload', type=int, default=10000,
+                        help='Historical sessions inserted before timing')
+    parser.add_argument('--synchronous', type=str, choices=('NORMAL', 'FULL'), default='NORMAL',
+                        help='SQLite synchronous mode (FULL fsyncs every commit, like Postgres)')
+    parser.add_argument('--output', type=str,
+                        help='Write results as JSON to this file')
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_arguments()
+
+    results = {}
+    for backend in args.backend or BACKENDS:
+        db, cleanup = open_postgres() if backend == 'postgres' else open_sqlite(args.synchronous)
+        name = backend if backend == 'postgres' else f"sqlite:{args.synchronous.lower()}"
+        try:
+            print(f"[BENCH] {name}: preloading {args.preload} sessions")
+            preload(db, args.preload)
+            print(f"[BENCH] {name}: timing {args.decisions} entry/exit decisions")
+            results[name] = benchmark(db, args.decisions, args.warmup)
+        finally:
+            cleanup()
+        print(f"[RESULT] {name}: {json.dumps(results[name])}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"[SAVED] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
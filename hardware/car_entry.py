@@ -1,13 +1,40 @@
+import argparse
 import platform
 import cv2
 from ultralytics import YOLO
-import pytesseract
 import os
 import time
 import serial
 import serial.tools.list_ports
 from collections import Counter
-from database import ParkingDatabase
+from storage import open_database
+from session_index import OpenSessionIndex
+from ocr_engine import DEFAULT_RECOGNIZER, ENGINES as OCR_ENGINES, create_ocr_engine
+from plate_preprocess import DEFAULT_STRATEGY, STRATEGIES, PlatePreprocessor
+from plate_tracker import PlateTracker
+from gate_controller import GateController
+from journal import EventJournal
+from detector_backend import INFERENCE_SECONDS
+from profiler import add_profile_arguments, create_profiler
+from metrics import CONSENSUS_OUTCOMES, FRAMES_CAPTURED, FRAMES_SKIPPED, metrics_port, start_metrics_server
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Entry lane: plate recognition and gate control')
+    parser.add_argument('--preprocess', type=str, choices=sorted(STRATEGIES), default=DEFAULT_STRATEGY,
+                        help='Plate preprocessing strategy (benchmark_preprocess.py picks one)')
+    parser.add_argument('--ocr-engine', type=str, choices=OCR_ENGINES, default='tesseract',
+                        help='Plate text recognizer: Tesseract, or the CRNN from train_recognizer.py')
+    parser.add_argument('--ocr-model', type=str, default=DEFAULT_RECOGNIZER,
+                        help='Path to the exported CRNN (.onnx) for --ocr-engine crnn')
+    # --profile records spans of each stage to a Chrome/Perfetto trace in profiles/
+    add_profile_arguments(parser)
+    return parser.parse_args()
+
+
+# Parse first so --help and bad arguments never load the model or touch the database
+args = parse_arguments()
 
 # Load YOLOv8 model
 model = YOLO('../model_dev/runs/detect/train/weights/best.pt')
@@ -18,10 +45,31 @@ ENTRY_COOLDOWN = 300  # seconds
 MAX_DISTANCE = 50     # cm
 MIN_DISTANCE = 0      # cm
 CAPTURE_THRESHOLD = 3 # number of consistent reads before logging
+WEAK_CONSENSUS_RATIO = 0.7  # votes with a smaller majority are counted as weak (metrics only)
 GATE_OPEN_TIME = 15   # seconds
 
-# Initialize database
-db = ParkingDatabase()
+LANE = 'entry'
+
+# Initialize database; open sessions are kept in memory for gate decisions.
+# Entries go through outbox/entry.wal and are applied by a background thread, so a slow or
+# unreachable database never stalls the loop.
+db = open_database(forward_queue=LANE)
+sessions = OpenSessionIndex(db).start()
+
+# Audit trail of reads, decisions and gate commands, group-committed in the background
+journal = EventJournal(db).start()
+
+# Prometheus /metrics on a local port (METRICS_PORT overrides, 0 disables)
+start_metrics_server(metrics_port(9103))
+yolo_seconds = INFERENCE_SECONDS.labels(backend='torch')
+
+# Long-lived OCR: Tesseract workers (no subprocess per crop) or the in-process CRNN
+ocr = create_ocr_engine(engine=args.ocr_engine, model_path=args.ocr_model)
+
+# Fixed-height grayscale + binarization with reused buffers
+preprocess_plate = PlatePreprocessor(args.preprocess)
+profiler = create_profiler(LANE, args.profile, args.profile_dir, args.profile_seconds,
+                           args.profile_vehicles, args.profile_cprofile)
 
 # Ensure directories exist
 os.makedirs(SAVE_DIR, exist_ok=True)
@@ -48,6 +96,7 @@ def read_distance(arduino):
     except (UnicodeDecodeError, ValueError):
         return None
 
+
 # Initialize Arduino
 arduino_port = detect_arduino_port()
 arduino = None
@@ -58,6 +107,9 @@ if arduino_port:
 else:
     print("[ERROR] Arduino not detected.")
 
+# Gate opens/closes on its own scheduler thread so the camera loop never sleeps
+gate = GateController(arduino, hold_time=GATE_OPEN_TIME, journal=journal, lane=LANE)
+
 # Initialize Webcam and Windows
 cap = cv2.VideoCapture(0)
 if not cap.isOpened():
@@ -69,91 +121,122 @@ cv2.namedWindow('Processed', cv2.WINDOW_NORMAL)
 cv2.resizeWindow('Webcam Feed', 800, 600)
 
 # State variables
-plate_buffer = []
+tracker = PlateTracker()  # one consensus buffer per vehicle track
 last_saved_plate = None
 last_entry_time = 0
 
 print("[SYSTEM] Ready. Press 'q' to exit.")
 
+if args.profile:
+    print(f"[PROFILE] Recording stage spans to {profiler.trace_path}")
+profiler.start()
+
 try:
     while True:
-        ret, frame = cap.read()
+        with profiler.span('capture'):
+            ret, frame = cap.read()
         if not ret:
             print("[ERROR] Frame capture failed.")
             break
 
         # Get distance reading, default to safe value
-        distance = read_distance(arduino) or (MAX_DISTANCE - 1)
+        with profiler.span('read_distance'):
+            distance = read_distance(arduino) or (MAX_DISTANCE - 1)
         annotated = frame.copy()
 
-        if MIN_DISTANCE <= distance <= MAX_DISTANCE:
-            results = model(frame)[0]
+        in_range = MIN_DISTANCE <= distance <= MAX_DISTANCE
+        FRAMES_CAPTURED.labels(lane=LANE).inc()
+        if not in_range:
+            FRAMES_SKIPPED.labels(lane=LANE, reason='out_of_range').inc()
+        if in_range:
+            with yolo_seconds.time(), profiler.span('detect'):
+                results = model(frame)[0]
             annotated = results.plot()
 
-            for box in results.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                plate_img = frame[y1:y2, x1:x2]
-
-                # OCR preprocess
-                gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
-                blur = cv2.GaussianBlur(gray, (5,5), 0)
-                thresh = cv2.threshold(blur, 0, 255,
-                                       cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+            # Follow each plate across frames
+            boxes = [tuple(map(int, box.xyxy[0])) for box in results.boxes]
+            with profiler.span('track', boxes=len(boxes)):
+                tracker.update(frame, boxes)
 
-                text = pytesseract.image_to_string(
-                    thresh,
-                    config='--psm 8 --oem 3 '
-                           '-c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-                ).strip().replace(' ', '')
+        # OCR only the sharpest few crops of each vehicle track
+        for track, plate_imgs in tracker.ocr_batches(flush=not in_range):
+            with profiler.span('preprocess', crops=len(plate_imgs)):
+                threshes = [preprocess_plate(plate_img) for plate_img in plate_imgs]
+            with profiler.span('ocr', crops=len(plate_imgs)):
+                texts = ocr.recognize_many(threshes)
 
+            for plate_img, thresh, text in zip(plate_imgs, threshes, texts):
                 # Validate Rwandan format RAxxxA
+                valid = None
                 if text.startswith('RA') and len(text) >= 7:
                     plate = text[:7]
                     pr, dg, su = plate[:3], plate[3:6], plate[6]
                     if pr.isalpha() and dg.isdigit() and su.isalpha():
-                        plate_buffer.append(plate)
-
-                # Once buffer is full, decide
-                if len(plate_buffer) >= CAPTURE_THRESHOLD:
-                    common = Counter(plate_buffer).most_common(1)[0][0]
+                        track.add_read(plate)
+                        valid = plate
+                journal.record('read', LANE, valid, track.id, text=text, valid=bool(valid))
+
+                # Once this vehicle's buffer is full, decide
+                reads = track.read_list()
+                if len(reads) >= CAPTURE_THRESHOLD:
+                    common, votes = Counter(reads).most_common(1)[0]
+                    ratio = votes / len(reads)
+                    journal.record('consensus', LANE, common, track.id, votes=votes, reads=len(reads),
+                                   ratio=round(ratio, 3), ocr_calls=track.ocr_calls)
+                    outcome = 'accepted' if ratio >= WEAK_CONSENSUS_RATIO else 'weak'
+                    CONSENSUS_OUTCOMES.labels(lane=LANE, outcome=outcome).inc()
                     now = time.time()
 
                     # Only save if not duplicate unpaid
-                    if not db.has_unpaid_record(common):
+                    if not sessions.has_unpaid(common):
                         # Optional cooldown logic still applies
                         if common != last_saved_plate or (now - last_entry_time) > ENTRY_COOLDOWN:
-                            entry_id = db.add_entry(common)
+                            with profiler.span('add_entry', plate=common):
+                                entry_id = sessions.add_entry(common)
                             if entry_id:
-                                print(f"[NEW] Logged plate {common} with ID {entry_id}")
+                                print(f"[NEW] Logged plate {common} with ID {entry_id} "
+                                      f"(track {track.id}, {track.ocr_calls} OCR calls)")
+                                journal.record('entry', LANE, common, track.id, outcome='logged', record_id=entry_id)
 
-                                # Gate actuation
-                                if arduino:
-                                    arduino.write(b'1')
-                                    time.sleep(GATE_OPEN_TIME)
-                                    arduino.write(b'0')
+                                # Gate actuation (non-blocking, re-triggers extend the hold)
+                                with profiler.span('control_gate'):
+                                    gate.open()
 
                                 last_saved_plate = common
                                 last_entry_time = now
                             else:
                                 print(f"[ERROR] Failed to log plate {common}")
+                                journal.record('entry', LANE, common, track.id, outcome='error')
                         else:
                             print(f"[SKIPPED] Cooldown: {common}")
+                            journal.record('entry', LANE, common, track.id, outcome='cooldown')
                     else:
                         print(f"[SKIPPED] Unpaid record exists for {common}")
+                        journal.record('entry', LANE, common, track.id, outcome='unpaid_record_exists')
 
-                    plate_buffer.clear()
+                    track.clear_reads()
+                    track.decide(common)
+                    profiler.vehicle_done()
 
                 # Show previews
                 cv2.imshow('Plate', plate_img)
                 cv2.imshow('Processed', thresh)
-                time.sleep(0.5)
+
+                if track.is_decided():
+                    break
 
         # Display feed
         cv2.imshow('Webcam Feed', annotated)
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 finally:
+    profiler.close()
     cap.release()
+    gate.shutdown()
+    sessions.close()
+    journal.close()
+    db.close()
     if arduino:
         arduino.close()
+    ocr.close()
     cv2.destroyAllWindows()
\ No newline at end of file
@@ -1,22 +1,68 @@
+import argparse
 import platform
 import cv2
 from ultralytics import YOLO
-import pytesseract
 import os
 import time
 import serial
 import serial.tools.list_ports
 from collections import Counter
-from database import ParkingDatabase
+from storage import open_database
+from session_index import OpenSessionIndex
+from ocr_engine import DEFAULT_RECOGNIZER, ENGINES as OCR_ENGINES, create_ocr_engine
+from plate_preprocess import DEFAULT_STRATEGY, STRATEGIES, PlatePreprocessor
+from plate_tracker import PlateTracker
+from gate_controller import GateController
+from journal import EventJournal
+from detector_backend import INFERENCE_SECONDS
+from profiler import add_profile_arguments, create_profiler
+from metrics import CONSENSUS_OUTCOMES, FRAMES_CAPTURED, FRAMES_SKIPPED, metrics_port, start_metrics_server
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Exit lane: plate recognition and gate control')
+    parser.add_argument('--preprocess', type=str, choices=sorted(STRATEGIES), default=DEFAULT_STRATEGY,
+                        help='Plate preprocessing strategy (benchmark_preprocess.py picks one)')
+    parser.add_argument('--ocr-engine', type=str, choices=OCR_ENGINES, default='tesseract',
+                        help='Plate text recognizer: Tesseract, or the CRNN from train_recognizer.py')
+    parser.add_argument('--ocr-model', type=str, default=DEFAULT_RECOGNIZER,
+                        help='Path to the exported CRNN (.onnx) for --ocr-engine crnn')
+    # --profile records spans of each stage to a Chrome/Perfetto trace in profiles/
+    add_profile_arguments(parser)
+    return parser.parse_args()
+
+
+# Parse first so --help and bad arguments never load the model or touch the database
+args = parse_arguments()
 
 # Load YOLOv8 model
 model = YOLO('../model_dev/runs/detect/train/weights/best.pt')
 
-# Initialize database
-db = ParkingDatabase()
+LANE = 'exit'
+
+# Initialize database; exits go through outbox/exit.wal and are applied in the background
+db = open_database(forward_queue=LANE)
+sessions = OpenSessionIndex(db).start()  # terminal payments arrive via LISTEN
+
+# Audit trail of reads, decisions and gate commands, group-committed in the background
+journal = EventJournal(db).start()
+
+# Prometheus /metrics on a local port (METRICS_PORT overrides, 0 disables)
+start_metrics_server(metrics_port(9104))
+yolo_seconds = INFERENCE_SECONDS.labels(backend='torch')
+
+# Fixed-height grayscale + binarization with reused buffers
+preprocess_plate = PlatePreprocessor(args.preprocess)
+profiler = create_profiler(LANE, args.profile, args.profile_dir, args.profile_seconds,
+                           args.profile_vehicles, args.profile_cprofile)
+
+# Long-lived OCR: Tesseract workers (no subprocess per crop) or the in-process CRNN
+ocr = create_ocr_engine(engine=args.ocr_engine, model_path=args.ocr_model)
 
 MAX_DISTANCE = 50  # cm
 MIN_DISTANCE = 0  # cm
+WEAK_CONSENSUS_RATIO = 0.7  # votes with a smaller majority are counted as weak (metrics only)
 
 
 # ===== Auto-detect Arduino Serial Port =====
@@ -52,100 +98,138 @@ else:
     print("[ERROR] Arduino not detected.")
     arduino = None
 
+# Gate opens/closes on its own scheduler thread so the camera loop never sleeps
+gate = GateController(arduino, hold_time=15, journal=journal, lane=LANE)
+
 
 # ===== Handle exit logic =====
 def handle_exit(plate_number):
-    """Handle vehicle exit - check if paid and record exit time"""
-    paid_record = db.get_paid_record(plate_number)
+    """Handle vehicle exit - check if paid and record exit time.
+
+    Returns the journaled outcome: 'granted', 'unauthorized' (no paid
+    session) or 'error' (the exit could not be recorded).
+    """
+    paid_record = sessions.get_paid(plate_number)
 
     if paid_record:
-        exit_record = db.record_exit(plate_number)
+        exit_record = sessions.record_exit(plate_number)
         if exit_record:
             print(f"[ACCESS GRANTED] Exit recorded for {plate_number}")
-            return True
+            return 'granted'
         else:
             print(f"[ERROR] Failed to record exit for {plate_number}")
-            return False
+            return 'error'
     else:
         print(f"[ACCESS DENIED] No paid record found for {plate_number}")
-        return False
+        return 'unauthorized'
 
 
 # ===== Webcam and Main Loop =====
 cap = cv2.VideoCapture(0)
-plate_buffer = []
+tracker = PlateTracker()  # one consensus buffer per vehicle track
 
 print("[EXIT SYSTEM] Ready. Press 'q' to quit.")
 
+if args.profile:
+    print(f"[PROFILE] Recording stage spans to {profiler.trace_path}")
+profiler.start()
+
 try:
     while True:
-        ret, frame = cap.read()
+        with profiler.span('capture'):
+            ret, frame = cap.read()
         if not ret:
             break
 
         # Get distance reading, default to safe value
-        distance = read_distance(arduino) or (MAX_DISTANCE - 1)
+        with profiler.span('read_distance'):
+            distance = read_distance(arduino) or (MAX_DISTANCE - 1)
         print(f"[SENSOR] Distance: {distance} cm")
 
-        if MIN_DISTANCE <= distance <= MAX_DISTANCE:
-            results = model(frame)
-
-            for result in results:
-                for box in result.boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    plate_img = frame[y1:y2, x1:x2]
-
-                    # Preprocess
-                    gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
-                    blur = cv2.GaussianBlur(gray, (5, 5), 0)
-                    thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-
-                    # OCR
-                    plate_text = pytesseract.image_to_string(
-                        thresh, config='--psm 8 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-                    ).strip().replace(" ", "")
-
-                    if "RA" in plate_text:
-                        start_idx = plate_text.find("RA")
-                        plate_candidate = plate_text[start_idx:]
-                        if len(plate_candidate) >= 7:
-                            plate_candidate = plate_candidate[:7]
-                            prefix, digits, suffix = plate_candidate[:3], plate_candidate[3:6], plate_candidate[6]
-                            if (prefix.isalpha() and prefix.isupper() and
-                                    digits.isdigit() and suffix.isalpha() and suffix.isupper()):
-                                print(f"[VALID] Plate Detected: {plate_candidate}")
-                                plate_buffer.append(plate_candidate)
-
-                                if len(plate_buffer) >= 3:
-                                    most_common = Counter(plate_buffer).most_common(1)[0][0]
-                                    plate_buffer.clear()
-
-                                    if handle_exit(most_common):
-                                        print(f"[ACCESS GRANTED] Exit recorded for {most_common}")
-                                        if arduino:
-                                            arduino.write(b'1')  # Open gate
-                                            print("[GATE] Opening gate (sent '1')")
-                                            time.sleep(15)
-                                            arduino.write(b'0')  # Close gate
-                                            print("[GATE] Closing gate (sent '0')")
-                                    else:
-                                        print(f"[ACCESS DENIED] Exit not allowed for {most_common}")
-                                        if arduino:
-                                            arduino.write(b'2')  # Buzzer or alert
-                                            print("[ALERT] Buzzer triggered (sent '2')")
-
-                    cv2.imshow("Plate", plate_img)
-                    cv2.imshow("Processed", thresh)
-                    time.sleep(0.5)
-
-        annotated_frame = results[0].plot() if distance <= 50 else frame
+        in_range = MIN_DISTANCE <= distance <= MAX_DISTANCE
+        FRAMES_CAPTURED.labels(lane=LANE).inc()
+        if not in_range:
+            FRAMES_SKIPPED.labels(lane=LANE, reason='out_of_range').inc()
+        if in_range:
+            with yolo_seconds.time(), profiler.span('detect'):
+                results = model(frame)
+
+            # Follow each plate across frames
+            boxes = [tuple(map(int, box.xyxy[0])) for result in results for box in result.boxes]
+            with profiler.span('track', boxes=len(boxes)):
+                tracker.update(frame, boxes)
+
+        # OCR only the sharpest few crops of each vehicle track
+        for track, plate_imgs in tracker.ocr_batches(flush=not in_range):
+            with profiler.span('preprocess', crops=len(plate_imgs)):
+                threshes = [preprocess_plate(plate_img) for plate_img in plate_imgs]
+            with profiler.span('ocr', crops=len(plate_imgs)):
+                texts = ocr.recognize_many(threshes)
+
+            for plate_img, thresh, plate_text in zip(plate_imgs, threshes, texts):
+                valid = False
+                if "RA" in plate_text:
+                    start_idx = plate_text.find("RA")
+                    plate_candidate = plate_text[start_idx:]
+                    if len(plate_candidate) >= 7:
+                        plate_candidate = plate_candidate[:7]
+                        prefix, digits, suffix = plate_candidate[:3], plate_candidate[3:6], plate_candidate[6]
+                        if (prefix.isalpha() and prefix.isupper() and
+                                digits.isdigit() and suffix.isalpha() and suffix.isupper()):
+                            print(f"[VALID] Plate Detected: {plate_candidate} (track {track.id})")
+                            reads = track.add_read(plate_candidate)
+                            valid = True
+                            journal.record('read', LANE, plate_candidate, track.id, text=plate_text, valid=True)
+
+                            if len(reads) >= 3:
+                                most_common, votes = Counter(reads).most_common(1)[0]
+                                ratio = votes / len(reads)
+                                journal.record('consensus', LANE, most_common, track.id, votes=votes,
+                                               reads=len(reads), ratio=round(ratio, 3),
+                                               ocr_calls=track.ocr_calls)
+                                outcome = 'accepted' if ratio >= WEAK_CONSENSUS_RATIO else 'weak'
+                                CONSENSUS_OUTCOMES.labels(lane=LANE, outcome=outcome).inc()
+                                track.clear_reads()
+                                track.decide(most_common)
+
+                                with profiler.span('handle_exit', plate=most_common):
+                                    exit_outcome = handle_exit(most_common)
+                                if exit_outcome == 'granted':
+                                    print(f"[ACCESS GRANTED] Exit recorded for {most_common}")
+                                    journal.record('exit', LANE, most_common, track.id, outcome='granted')
+                                    with profiler.span('control_gate'):
+                                        gate.open()  # Closes itself after the hold time
+                                    print("[GATE] Opening gate (sent '1')")
+                                else:
+                                    print(f"[ACCESS DENIED] Exit not allowed for {most_common}")
+                                    journal.record('exit', LANE, most_common, track.id, outcome=exit_outcome)
+                                    with profiler.span('control_gate'):
+                                        gate.alert()  # Buzzer or alert
+                                    print("[ALERT] Buzzer triggered (sent '2')")
+                                profiler.vehicle_done()
+                if not valid:
+                    journal.record('read', LANE, None, track.id, text=plate_text, valid=False)
+
+                cv2.imshow("Plate", plate_img)
+                cv2.imshow("Processed", thresh)
+
+                if track.is_decided():
+                    break
+
+        annotated_frame = results[0].plot() if in_range else frame
         cv2.imshow("Exit Webcam Feed", annotated_frame)
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
 finally:
+    profiler.close()
     cap.release()
+    gate.shutdown()
+    sessions.close()
+    journal.close()
+    db.close()
     if arduino:
         arduino.close()
+    ocr.close()
     cv2.destroyAllWindows()
\ No newline at end of file
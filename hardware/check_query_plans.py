@@ -0,0 +1,150 @@
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+
+import database
+from database import ParkingDatabase
+from migrate import apply_migrations
+
+SCHEMA = 'plan_check'
+
+SYNTHETIC_DATA_SQL = """
+    INSERT INTO parking_records (entry_time, exit_time, car_plate, due_payment, payment_status, created_at)
+    SELECT entry,
+           CASE WHEN r < 0.98 THEN entry + interval '2 hours' END,
+           plate,
+           CASE WHEN r < 0.97 OR r >= 0.99 THEN 1000 ELSE 0 END,
+           CASE WHEN r < 0.97 OR r >= 0.99 THEN 1 ELSE 0 END,
+           entry
+    FROM (
+        SELECT random() AS r,
+               now() - g * interval '30 seconds' AS entry,
+               'RA' || chr(65 + mod(g, 26)) || lpad(mod(g / 26, 1000)::text, 3, '0')
+                    || chr(65 + mod(g / 26000, 26)) AS plate
+        FROM generate_series(1, %s) AS g
+    ) AS t
+"""
+# Mix: 97% closed and paid, 1% unauthorized exits, 1% open unpaid, 1% open paid
+
+
+def sample_plate(cursor, payment_status):
+    """Pick a plate that currently has an open session with the given status."""
+    cursor.execute("""
+        SELECT car_plate FROM parking_records
+        WHERE payment_status = %s AND exit_time IS NULL LIMIT 1
+    """, (payment_status,))
+    return cursor.fetchone()[0]
+
+
+def build_queries(cursor):
+    """(method, sql, params) for every ParkingDatabase query."""
+    unpaid = sample_plate(cursor, 0)
+    paid = sample_plate(cursor, 1)
+    now = datetime.now()
+    return [
+        ('add_entry', database.ADD_ENTRY_SQL, ('RAZ999Z', now, now, database.DEFAULT_LOT_ID)),
+        ('has_unpaid_record', database.HAS_UNPAID_RECORD_SQL, (unpaid,)),
+        ('get_unpaid_record', database.GET_UNPAID_RECORD_SQL, (unpaid,)),
+        ('get_paid_record', database.GET_PAID_RECORD_SQL, (paid,)),
+        ('update_payment_status', database.UPDATE_PAYMENT_STATUS_SQL, (1000, 1, unpaid)),
+        ('record_exit', database.RECORD_EXIT_SQL, (now, paid)),
+        ('get_open_sessions', database.GET_OPEN_SESSIONS_SQL, ()),
+        ('get_all_alerts', database.GET_ALL_ALERTS_SQL, ()),
+        ('get_all_entries', database.GET_ALL_ENTRIES_SQL, ()),
+        ('get_all_exits', database.GET_ALL_EXITS_SQL, ()),
+        ('get_all_payments', database.GET_ALL_PAYMENTS_SQL, ()),
+        ('export_records', database.EXPORT_RECORDS_SQL,
+         {'since': now - timedelta(days=30), 'until': now}),
+    ] + [
+        (f"get_stats({granularity}, {'one lot' if lot_id else 'all lots'})", sql,
+         {'since': now - timedelta(days=days), 'until': now, 'lot_id': lot_id, 'limit': 1000})
+        for granularity, sql, days in [('hourly', database.STATS_HOURLY_SQL, 2),
+                                       ('daily', database.STATS_DAILY_SQL, 30)]
+        for lot_id in (None, database.DEFAULT_LOT_ID)
+    ] + [
+        (f"get_log_page({log_type}, {variant})", sql, page_params(**filters))
+        for log_type, (sql, _) in database.LOG_PAGES.items()
+        for variant, filters in [
+            ('first page', {}),
+            ('deep page', {'before': (now - timedelta(days=30), 2 ** 31 - 1)}),
+            ('plate', {'plate': paid}),
+            ('time range', {'since': now - timedelta(days=2), 'until': now - timedelta(days=1)}),
+        ]
+    ]
+
+
+def page_params(before=None, plate=None, since=None, until=None, limit=50):
+    """Parameters for a LOG_PAGES query, as ParkingDatabase.get_log_page builds them."""
+    before_time, before_id = before or (None, None)
+    return {'plate': plate, 'since': since, 'until': until,
+            'before_time': before_time, 'before_id': before_id, 'limit': limit + 1}
+
+
+def plan_nodes(node):
+    """Yield every node of an EXPLAIN (FORMAT JSON) plan tree."""
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain(cursor, sql, params):
+    cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+    result = cursor.fetchone()[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Fail if any ParkingDatabase query sequentially scans a large synthetic parking_records'
+    )
+    parser.add_argument('--rows', type=int, default=500000,
+                        help='Number of synthetic parking records')
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_arguments()
+    db = ParkingDatabase(maxconn=1)
+    conn = db.pool.getconn()
+    failures = []
+
+    try:
+        with conn.cursor() as cursor:
+            # Everything happens in a scratch schema inside one transaction that is rolled back
+            cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+            cursor.execute(f"SET LOCAL search_path TO {SCHEMA}")
+            apply_migrations(cursor)
+
+            print(f"[SETUP] Inserting {args.rows} synthetic records")
+            # Event/rollup triggers are not under test and would dominate the load time
+            cursor.execute("ALTER TABLE parking_records DISABLE TRIGGER USER")
+            cursor.execute(SYNTHETIC_DATA_SQL, (args.rows,))
+            cursor.execute("ALTER TABLE parking_records ENABLE TRIGGER USER")
+            cursor.execute("ANALYZE parking_records")
+
+            for method, sql, params in build_queries(cursor):
+                plan = explain(cursor, sql, params)
+                scans = [n for n in plan_nodes(plan['Plan'])
+                         if n['Node Type'] == 'Seq Scan' and n.get('Relation Name') == 'parking_records']
+                node_types = sorted({n['Node Type'] for n in plan_nodes(plan['Plan'])})
+                status = 'FAIL' if scans else 'OK'
+                if scans:
+                    failures.append(method)
+                print(f"[{status}] {method}: {plan['Execution Time']:.2f} ms, nodes: {', '.join(node_types)}")
+    finally:
+        conn.rollback()
+        db.pool.putconn(conn)
+
+    if failures:
+        print(f"[ERROR] Sequential scan in: {', '.join(failures)}")
+        sys.exit(1)
+    print("[SUCCESS] No query falls back to a sequential scan")
+
+
+if __name__ == "__main__":
+    main()
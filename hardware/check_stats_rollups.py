@@ -0,0 +1,82 @@
+import json
+import sys
+from datetime import datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+import database
+from database import ParkingDatabase
+from migrate import apply_migrations
+
+SCHEMA = 'rollup_check'
+LOT_ID = database.DEFAULT_LOT_ID
+
+UNAUTHORIZED_EXITS_SQL = """
+    SELECT COALESCE(SUM(unauthorized_exits), 0) FROM {table}
+    WHERE lot_id = %s AND bucket = date_trunc(%s, %s::timestamp)
+"""
+
+
+def unauthorized_exits(cursor, when):
+    """(hourly, daily) unauthorized_exits of the buckets holding `when`."""
+    counts = []
+    for table, unit in [('parking_stats_hourly', 'hour'), ('parking_stats_daily', 'day')]:
+        cursor.execute(UNAUTHORIZED_EXITS_SQL.format(table=table), (LOT_ID, unit, when))
+        counts.append(cursor.fetchone()[0])
+    return tuple(counts)
+
+
+def journal_exit(cursor, when, plate, outcome):
+    """Insert an exit decision the way journal.EventJournal does."""
+    execute_values(cursor, database.ADD_LANE_EVENTS_SQL,
+                   [(when, LOT_ID, 'exit', 'exit', plate, 1, json.dumps({'outcome': outcome}))])
+
+
+def main():
+    """Main entry point."""
+    db = ParkingDatabase(maxconn=1)
+    conn = db.pool.getconn()
+    failures = []
+
+    try:
+        with conn.cursor() as cursor:
+            # Everything happens in a scratch schema inside one transaction that is rolled back
+            cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+            cursor.execute(f"SET LOCAL search_path TO {SCHEMA}")
+            apply_migrations(cursor)
+
+            # Every event falls in the same hour, a minute apart
+            start = datetime.now().replace(minute=0, second=0, microsecond=0)
+            at = [start + timedelta(minutes=minute) for minute in range(7)]
+            cases = [
+                # (name, entry of the plate first or None, exit time, plate, outcome, hourly/daily change)
+                ('unauthorized exit', at[0], at[1], 'RAC001C', 'unauthorized', (1, 1)),
+                ('same car refused again', None, at[2], 'RAC001C', 'unauthorized', (0, 0)),
+                ('failed exit write', None, at[3], 'RAD002D', 'error', (0, 0)),
+                ('granted exit', None, at[4], 'RAE003E', 'granted', (0, 0)),
+                ('same car after a new entry', at[5], at[6], 'RAC001C', 'unauthorized', (1, 1)),
+            ]
+            for name, entry_at, when, plate, outcome, expected in cases:
+                if entry_at:
+                    cursor.execute(database.ADD_ENTRY_SQL, (plate, entry_at, entry_at, LOT_ID))
+                before = unauthorized_exits(cursor, when)
+                journal_exit(cursor, when, plate, outcome)
+                after = unauthorized_exits(cursor, when)
+                change = tuple(a - b for a, b in zip(after, before))
+                status = 'OK' if change == expected else 'FAIL'
+                if change != expected:
+                    failures.append(name)
+                print(f"[{status}] {name}: unauthorized_exits hourly +{change[0]}, daily +{change[1]}"
+                      f" (expected +{expected[0]}, +{expected[1]})")
+    finally:
+        conn.rollback()
+        db.pool.putconn(conn)
+
+    if failures:
+        print(f"[ERROR] Wrong rollups for: {', '.join(failures)}")
+        sys.exit(1)
+    print("[SUCCESS] Unauthorized exits are counted once per visit")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,16 @@
 import cv2
 from ultralytics import YOLO
-import pytesseract
 import os
 import time
+from ocr_engine import create_ocr_engine
 import re
 
 # Load YOLOv8 model (update path if needed)
 model = YOLO('/opt/homebrew/runs/detect/train4/weights/best.pt')
 
+# Long-lived Tesseract workers
+ocr = create_ocr_engine(workers=1)
+
 # Create folder to save cropped plates
 save_dir = 'plates'
 os.makedirs(save_dir, exist_ok=True)
@@ -42,10 +45,7 @@ while True:
             thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
 
             # ===== OCR Extraction =====
-            plate_text = pytesseract.image_to_string(
-                thresh,
-                config='--psm 8 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
-            ).strip()
+            plate_text = ocr.recognize(thresh)
 
             # ===== Validation Logic with 8th Char Tolerance =====
             match = re.search(r'RA[A-Z0-9 ]*', plate_text.upper())
@@ -83,4 +83,5 @@ while True:
         break
 
 cap.release()
+ocr.close()
 cv2.destroyAllWindows()
\ No newline at end of file
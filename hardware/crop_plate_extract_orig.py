@@ -1,12 +1,15 @@
 import cv2
 from ultralytics import YOLO
-import pytesseract
 import os
 import time
+from ocr_engine import create_ocr_engine
 
 # Load YOLOv8 model
 model = YOLO('/opt/homebrew/runs/detect/train4/weights/best.pt')  # Absolute path to your best weights
 
+# Long-lived Tesseract workers
+ocr = create_ocr_engine(workers=1)
+
 # Create folder to save cropped plates
 save_dir = 'plates'
 os.makedirs(save_dir, exist_ok=True)
@@ -44,7 +47,7 @@ while True:
             thresh = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
 
             # ===== OCR Extraction =====
-            plate_text = pytesseract.image_to_string(thresh, config='--psm 8 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+            plate_text = ocr.recognize(thresh)
 
             print(f"[INFO] Extracted Plate Number: {plate_text.strip()}")
 
@@ -62,4 +65,5 @@ while True:
         break
 
 cap.release()
+ocr.close()
 cv2.destroyAllWindows()
\ No newline at end of file
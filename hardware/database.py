@@ -1,169 +1,698 @@
-import psycopg2
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
 
-class ParkingDatabase:
-    def __init__(self):
-        self.conn = psycopg2.connect(
-            dbname="parking_system",
-            user="postgres",
-            password="password",  # Replace with your actual password
-            host="localhost",
-            port="5432"
-        )
-        self.cursor = self.conn.cursor()
+import psycopg2
+from psycopg2 import pool
+from psycopg2.extras import execute_values
+
+from storage import ParkingStore, timed_query
+
+DB_CONFIG = {
+    'dbname': "parking_system",
+    'user': "postgres",
+    'password': "password",  # Replace with your actual password
+    'host': "localhost",
+    'port': "5432",
+    'connect_timeout': 5,  # seconds; an unreachable server must not hang a lane
+    # Notice a dead network path within about a minute instead of waiting on TCP forever
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'keepalives_count': 3
+}
+
+# Lot this process records entries for (migration 0006); one database can serve several lots
+DEFAULT_LOT_ID = os.environ.get('PARKING_LOT_ID', 'main')
+
+
+# Queries are module-level so tools such as check_query_plans.py run exactly the same SQL
+ADD_ENTRY_SQL = """
+    INSERT INTO parking_records (car_plate, entry_time, created_at, lot_id)
+    VALUES (%s, %s, %s, %s) RETURNING id
+"""
+
+HAS_UNPAID_RECORD_SQL = """
+    SELECT id FROM parking_records
+    WHERE car_plate = %s AND payment_status = 0 AND exit_time IS NULL
+"""
+
+GET_PAID_RECORD_SQL = """
+    SELECT * FROM parking_records
+    WHERE car_plate = %s AND payment_status = 1 AND exit_time IS NULL
+    ORDER BY entry_time DESC LIMIT 1
+"""
+
+RECORD_EXIT_SQL = """
+    UPDATE parking_records
+    SET exit_time = %s
+    WHERE car_plate = %s AND payment_status = 1 AND exit_time IS NULL
+    RETURNING id, entry_time
+"""
+
+GET_UNPAID_RECORD_SQL = """
+    SELECT * FROM parking_records
+    WHERE car_plate = %s AND payment_status = 0 AND exit_time IS NULL
+    ORDER BY entry_time DESC LIMIT 1
+"""
+
+UPDATE_PAYMENT_STATUS_SQL = """
+    UPDATE parking_records
+    SET due_payment = %s, payment_status = %s
+    WHERE car_plate = %s AND payment_status = 0 AND exit_time IS NULL
+    RETURNING id, entry_time
+"""
+
+# Each branch matches one open-session partial index
+GET_OPEN_SESSIONS_SQL = """
+    SELECT id, car_plate, entry_time, payment_status
+    FROM parking_records
+    WHERE payment_status = 0 AND exit_time IS NULL
+    UNION ALL
+    SELECT id, car_plate, entry_time, payment_status
+    FROM parking_records
+    WHERE payment_status = 1 AND exit_time IS NULL
+"""
+
+# Session changes are announced on this channel; delivered only when the writing transaction commits
+SESSION_CHANNEL = 'open_sessions'
+NOTIFY_SESSION_SQL = "SELECT pg_notify(%s, %s)"
+
+GET_ALL_ENTRIES_SQL = """
+    SELECT id, car_plate, entry_time
+    FROM parking_records
+    WHERE entry_time IS NOT NULL
+    ORDER BY entry_time DESC
+"""
+
+GET_ALL_EXITS_SQL = """
+    SELECT id, car_plate, exit_time
+    FROM parking_records
+    WHERE exit_time IS NOT NULL
+    ORDER BY exit_time DESC
+"""
+
+GET_ALL_PAYMENTS_SQL = """
+    SELECT car_plate, due_payment, created_at
+    FROM parking_records
+    WHERE payment_status = 1
+    ORDER BY created_at DESC
+"""
+
+GET_ALL_ALERTS_SQL = """
+    SELECT car_plate, created_at, 'Unauthorized Exit' as reason
+    FROM parking_records
+    WHERE payment_status = 0 AND exit_time IS NOT NULL
+    ORDER BY created_at DESC
+"""
+
+
+def log_page_sql(columns, time_column, condition):
+    """Keyset-paginated query for one log type, newest first.
+
+    Optional filters are written as `(%(x)s IS NULL OR ...)`; psycopg2 inlines
+    the parameters, so the planner folds away the unused branches and picks the
+    (time, id) or (car_plate, time, id) index.
+    """
+    return f"""
+    SELECT {columns}
+    FROM parking_records
+    WHERE {condition}
+      AND (%(plate)s IS NULL OR car_plate = %(plate)s)
+      AND (%(since)s IS NULL OR {time_column} >= %(since)s)
+      AND (%(until)s IS NULL OR {time_column} < %(until)s)
+      AND (%(before_time)s IS NULL OR ({time_column}, id) < (%(before_time)s, %(before_id)s))
+    ORDER BY {time_column} DESC, id DESC
+    LIMIT %(limit)s
+"""
+
+
+# Every page query selects id and the ordering timestamp first; together they are the cursor
+ENTRIES_PAGE_SQL = log_page_sql(
+    "id, entry_time, car_plate", 'entry_time', 'entry_time IS NOT NULL'
+)
+
+EXITS_PAGE_SQL = log_page_sql(
+    "id, exit_time, car_plate", 'exit_time', 'exit_time IS NOT NULL'
+)
+
+PAYMENTS_PAGE_SQL = log_page_sql(
+    "id, created_at, car_plate, due_payment", 'created_at', 'payment_status = 1'
+)
+
+ALERTS_PAGE_SQL = log_page_sql(
+    "id, created_at, car_plate, 'Unauthorized Exit' as reason", 'created_at',
+    'payment_status = 0 AND exit_time IS NOT NULL'
+)
+
+LOG_PAGES = {
+    'checkins': (ENTRIES_PAGE_SQL, lambda row: {
+        'id': row[0],
+        'car_plate': row[2],
+        'entry_time': row[1].strftime('%Y-%m-%d %H:%M:%S')
+    }),
+    'checkouts': (EXITS_PAGE_SQL, lambda row: {
+        'id': row[0],
+        'car_plate': row[2],
+        'exit_time': row[1].strftime('%Y-%m-%d %H:%M:%S')
+    }),
+    'payments': (PAYMENTS_PAGE_SQL, lambda row: {
+        'id': row[0],
+        'car_plate': row[2],
+        'due_payment': float(row[3]),
+        'created_at': row[1].strftime('%Y-%m-%d %H:%M:%S')
+    }),
+    'alerts': (ALERTS_PAGE_SQL, lambda row: {
+        'id': row[0],
+        'car_plate': row[2],
+        'timestamp': row[1].strftime('%Y-%m-%d %H:%M:%S'),
+        'reason': row[3]
+    }),
+}
+
+
+def stats_sql(table):
+    """Rollup buckets in [since, until), optionally for one lot, oldest first."""
+    return f"""
+    SELECT lot_id, bucket, entries, exits, unauthorized_exits, dwell_seconds,
+           payments, revenue, occupancy, peak_occupancy
+    FROM {table}
+    WHERE bucket >= %(since)s AND bucket < %(until)s
+      AND (%(lot_id)s IS NULL OR lot_id = %(lot_id)s)
+    ORDER BY bucket, lot_id
+    LIMIT %(limit)s
+"""
+
+
+# Rollup tables from migration 0006, kept current by a trigger on parking_records
+STATS_HOURLY_SQL = stats_sql('parking_stats_hourly')
+STATS_DAILY_SQL = stats_sql('parking_stats_daily')
+STATS_QUERIES = {'hourly': STATS_HOURLY_SQL, 'daily': STATS_DAILY_SQL}
+
+GET_LOT_OCCUPANCY_SQL = "SELECT lot_id, occupancy FROM parking_lot_occupancy ORDER BY lot_id"
+
+# Full history for exports, oldest first; streamed through a named (server-side) cursor
+EXPORT_RECORDS_SQL = """
+    SELECT id, lot_id, car_plate, entry_time, exit_time, due_payment, payment_status, created_at
+    FROM parking_records
+    WHERE entry_time IS NOT NULL
+      AND (%(since)s IS NULL OR entry_time >= %(since)s)
+      AND (%(until)s IS NULL OR entry_time < %(until)s)
+    ORDER BY entry_time, id
+"""
+EXPORT_COLUMNS = ['id', 'lot_id', 'car_plate', 'entry_time', 'exit_time',
+                  'due_payment', 'payment_status', 'created_at']
+
+# lane_events (migration 0007); execute_values expands %s into one multi-row VALUES list
+ADD_LANE_EVENTS_SQL = """
+    INSERT INTO lane_events (occurred_at, lot_id, lane, kind, car_plate, track_id, details)
+    VALUES %s
+"""
+
+# Idempotency keys for replayed lane writes (migration 0008)
+CLAIM_WRITE_KEY_SQL = """
+    INSERT INTO applied_writes (key, op, car_plate) VALUES (%s, %s, %s)
+    ON CONFLICT (key) DO NOTHING
+    RETURNING key
+"""
+
+GET_WRITE_KEY_SQL = """
+    SELECT record_id FROM applied_writes WHERE key = %s
+"""
+
+SET_WRITE_RECORD_SQL = """
+    UPDATE applied_writes SET record_id = %s WHERE key = %s
+"""
+
+PRUNE_WRITE_KEYS_SQL = """
+    DELETE FROM applied_writes WHERE applied_at < %s
+"""
+
+# Every write to parking_records notifies this channel (trigger from migration 0005)
+CHANGE_CHANNEL = 'parking_records_changed'
+
+# parking_events (migration 0004) is filled by a trigger on parking_records
+GET_EVENTS_SQL = """
+    SELECT id, kind, record_id, occurred_at, car_plate, amount
+    FROM parking_events
+    WHERE id > %s OR id = ANY(%s)
+    ORDER BY id
+    LIMIT %s
+"""
+
+GET_LAST_EVENT_ID_SQL = "SELECT COALESCE(MAX(id), 0) FROM parking_events"
+
+# Event kind -> the log type whose item shape its payload uses
+EVENT_LOG_TYPES = {
+    'checkin': 'checkins',
+    'checkout': 'checkouts',
+    'payment': 'payments',
+    'alert': 'alerts',
+}
+
+
+def record_to_dict(record):
+    """A parking_records row (id, entry_time, exit_time, car_plate, due_payment, payment_status, created_at)."""
+    return {
+        'id': record[0],
+        'entry_time': record[1],
+        'exit_time': record[2],
+        'car_plate': record[3],
+        'due_payment': record[4],
+        'payment_status': record[5],
+        'created_at': record[6]
+    }
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the pool's wait timeout."""
+
+
+class BoundedConnectionPool:
+    """Thread-safe psycopg2 pool that waits for a free connection instead of failing.
+
+    psycopg2's ThreadedConnectionPool raises as soon as maxconn connections are
+    checked out; this wrapper queues callers behind a semaphore (up to
+    `timeout` seconds) and records checkout and wait statistics.
+    """
+
+    def __init__(self, minconn=1, maxconn=10, timeout=5.0, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.pool = pool.ThreadedConnectionPool(minconn, maxconn, **connect_kwargs)
+        self.slots = threading.BoundedSemaphore(maxconn)
+
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waits = 0  # checkouts that had to wait for a free slot
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def getconn(self):
+        started = time.perf_counter()
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.waits += 1
+            if not self.slots.acquire(timeout=self.timeout):
+                with self.lock:
+                    self.timeouts += 1
+                raise PoolTimeout(f"No database connection free within {self.timeout}s")
+
+        try:
+            conn = self.pool.getconn()
+        except Exception:
+            self.slots.release()
+            raise
+
+        waited = time.perf_counter() - started
+        with self.lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return conn
+
+    def putconn(self, conn, close=False):
+        try:
+            self.pool.putconn(conn, close=close or bool(conn.closed))
+        finally:
+            with self.lock:
+                self.in_use -= 1
+            self.slots.release()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3)
+            }
+
+    def closeall(self):
+        if not self.pool.closed:
+            self.pool.closeall()
+
+
+class ParkingDatabase(ParkingStore):
+    backend = 'postgres'
+    supports_notify = True
+    unavailable_errors = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout)
+
+    def __init__(self, minconn=1, maxconn=10, timeout=5.0, lot_id=None, **db_config):
+        self.lot_id = lot_id or DEFAULT_LOT_ID
+        self.config = {**DB_CONFIG, **db_config}
+        self.pool = BoundedConnectionPool(minconn, maxconn, timeout, **self.config)
+
+    @contextmanager
+    def transaction(self):
+        """Check out a connection and yield a fresh cursor; commit on success, roll back on error."""
+        conn = self.pool.getconn()
+        broken = False
+        try:
+            with conn.cursor() as cursor:
+                yield cursor
+            conn.commit()
+        except Exception as e:
+            broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn, close=broken)
+
+    def pool_stats(self):
+        return self.pool.stats()
 
+    def notify_session(self, cursor, event, plate_number, record_id, entry_time):
+        """Announce an open-session change to every OpenSessionIndex listening."""
+        payload = json.dumps({
+            'event': event,
+            'plate': plate_number,
+            'id': record_id,
+            'entry_time': entry_time.isoformat()
+        })
+        cursor.execute(NOTIFY_SESSION_SQL, (SESSION_CHANNEL, payload))
+
+    def insert_entry(self, cursor, plate_number, entry_time):
+        cursor.execute(ADD_ENTRY_SQL, (plate_number, entry_time, entry_time, self.lot_id))
+        entry_id = cursor.fetchone()[0]
+        self.notify_session(cursor, 'entry', plate_number, entry_id, entry_time)
+        return entry_id
+
+    def mark_exit(self, cursor, plate_number, exit_time):
+        cursor.execute(RECORD_EXIT_SQL, (exit_time, plate_number))
+        record = cursor.fetchone()
+        if record:
+            self.notify_session(cursor, 'exit', plate_number, record[0], record[1])
+        return record[0] if record else None
+
+    def mark_payment(self, cursor, plate_number, amount, status):
+        cursor.execute(UPDATE_PAYMENT_STATUS_SQL, (amount, status, plate_number))
+        record = cursor.fetchone()
+        if record and status == 1:
+            self.notify_session(cursor, 'paid', plate_number, record[0], record[1])
+        return record[0] if record else None
+
+    @timed_query
     def add_entry(self, plate_number):
         try:
-            query = """
-                INSERT INTO parking_records (car_plate, entry_time, created_at)
-                VALUES (%s, %s, %s) RETURNING id
-            """
-            self.cursor.execute(query, (plate_number, datetime.now(), datetime.now()))
-            self.conn.commit()
-            return self.cursor.fetchone()[0]
+            with self.transaction() as cursor:
+                return self.insert_entry(cursor, plate_number, datetime.now())
         except Exception as e:
             print(f"[ERROR] Failed to add entry: {e}")
-            self.conn.rollback()
             return None
 
+    @timed_query
     def has_unpaid_record(self, plate_number):
-        query = """
-            SELECT id FROM parking_records
-            WHERE car_plate = %s AND payment_status = 0 AND exit_time IS NULL
-        """
-        self.cursor.execute(query, (plate_number,))
-        return bool(self.cursor.fetchone())
+        query = HAS_UNPAID_RECORD_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query, (plate_number,))
+            return bool(cursor.fetchone())
 
+    @timed_query
     def get_paid_record(self, plate_number):
-        query = """
-            SELECT * FROM parking_records
-            WHERE car_plate = %s AND payment_status = 1 AND exit_time IS NULL
-            ORDER BY entry_time DESC LIMIT 1
-        """
-        self.cursor.execute(query, (plate_number,))
-        record = self.cursor.fetchone()
-        if record:
-            return {
-                'id': record[0],
-                'entry_time': record[1],
-                'exit_time': record[2],
-                'car_plate': record[3],
-                'due_payment': record[4],
-                'payment_status': record[5],
-                'created_at': record[6]
-            }
-        return None
+        query = GET_PAID_RECORD_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query, (plate_number,))
+            record = cursor.fetchone()
+        return record_to_dict(record) if record else None
 
+    @timed_query
     def record_exit(self, plate_number):
-        query = """
-            UPDATE parking_records
-            SET exit_time = %s
-            WHERE car_plate = %s AND payment_status = 1 AND exit_time IS NULL
-            RETURNING id
-        """
-        self.cursor.execute(query, (datetime.now(), plate_number))
-        self.conn.commit()
-        return bool(self.cursor.fetchone())
+        with self.transaction() as cursor:
+            return bool(self.mark_exit(cursor, plate_number, datetime.now()))
 
+    @timed_query
     def get_unpaid_record(self, plate_number):
-        query = """
-            SELECT * FROM parking_records
-            WHERE car_plate = %s AND payment_status = 0 AND exit_time IS NULL
-            ORDER BY entry_time DESC LIMIT 1
-        """
-        self.cursor.execute(query, (plate_number,))
-        record = self.cursor.fetchone()
-        if record:
-            return {
-                'id': record[0],
-                'entry_time': record[1],
-                'exit_time': record[2],
-                'car_plate': record[3],
-                'due_payment': record[4],
-                'payment_status': record[5],
-                'created_at': record[6]
-            }
-        return None
+        query = GET_UNPAID_RECORD_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query, (plate_number,))
+            record = cursor.fetchone()
+        return record_to_dict(record) if record else None
 
+    @timed_query
     def update_payment_status(self, plate_number, amount, status):
-        query = """
-            UPDATE parking_records
-            SET due_payment = %s, payment_status = %s
-            WHERE car_plate = %s AND payment_status = 0 AND exit_time IS NULL
-            RETURNING id
+        with self.transaction() as cursor:
+            return bool(self.mark_payment(cursor, plate_number, amount, status))
+
+    @timed_query
+    def apply_write(self, key, op, plate_number, occurred_at, amount=None):
+        """Apply a lane write at most once per idempotency key.
+
+        op is 'entry', 'payment' or 'exit'; occurred_at is when the lane made
+        the decision, which becomes the entry/exit time even when the write is
+        replayed later. Returns the affected record id (None if there was
+        nothing to pay or close); a repeated key returns the first result
+        without writing again.
         """
-        self.cursor.execute(query, (amount, status, plate_number))
-        self.conn.commit()
-        return bool(self.cursor.fetchone())
+        with self.transaction() as cursor:
+            cursor.execute(CLAIM_WRITE_KEY_SQL, (key, op, plate_number))
+            if not cursor.fetchone():
+                cursor.execute(GET_WRITE_KEY_SQL, (key,))
+                return cursor.fetchone()[0]
+
+            if op == 'entry':
+                record_id = self.insert_entry(cursor, plate_number, occurred_at)
+            elif op == 'payment':
+                record_id = self.mark_payment(cursor, plate_number, amount, 1)
+            elif op == 'exit':
+                record_id = self.mark_exit(cursor, plate_number, occurred_at)
+            else:
+                raise ValueError(f"Unknown write '{op}'")
+            cursor.execute(SET_WRITE_RECORD_SQL, (record_id, key))
+            return record_id
+
+    @timed_query
+    def prune_write_keys(self, before):
+        """Forget idempotency keys applied before the given time."""
+        query = PRUNE_WRITE_KEYS_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query, (before,))
+            return cursor.rowcount
+
+    @timed_query
+    def get_open_sessions(self):
+        query = GET_OPEN_SESSIONS_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        return [
+            {
+                'id': row[0],
+                'car_plate': row[1],
+                'entry_time': row[2],
+                'payment_status': row[3]
+            }
+            for row in rows
+        ]
 
+    @timed_query
     def get_all_entries(self):
-        query = """
-            SELECT id, car_plate, entry_time
-            FROM parking_records
-            WHERE entry_time IS NOT NULL
-            ORDER BY entry_time DESC
-        """
-        self.cursor.execute(query)
+        query = GET_ALL_ENTRIES_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
         return [
             {
                 'id': row[0],
                 'car_plate': row[1],
                 'entry_time': row[2].strftime('%Y-%m-%d %H:%M:%S')
             }
-            for row in self.cursor.fetchall()
+            for row in rows
         ]
 
+    @timed_query
     def get_all_exits(self):
-        query = """
-            SELECT id, car_plate, exit_time
-            FROM parking_records
-            WHERE exit_time IS NOT NULL
-            ORDER BY exit_time DESC
-        """
-        self.cursor.execute(query)
+        query = GET_ALL_EXITS_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
         return [
             {
                 'id': row[0],
                 'car_plate': row[1],
                 'exit_time': row[2].strftime('%Y-%m-%d %H:%M:%S')
             }
-            for row in self.cursor.fetchall()
+            for row in rows
         ]
 
+    @timed_query
     def get_all_payments(self):
-        query = """
-            SELECT car_plate, due_payment, created_at
-            FROM parking_records
-            WHERE payment_status = 1
-            ORDER BY created_at DESC
-        """
-        self.cursor.execute(query)
+        query = GET_ALL_PAYMENTS_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
         return [
             {
                 'car_plate': row[0],
                 'due_payment': float(row[1]),
                 'created_at': row[2].strftime('%Y-%m-%d %H:%M:%S')
             }
-            for row in self.cursor.fetchall()
+            for row in rows
         ]
 
+    @timed_query
     def get_all_alerts(self):
-        query = """
-            SELECT car_plate, created_at, 'Unauthorized Exit' as reason
-            FROM parking_records
-            WHERE payment_status = 0 AND exit_time IS NOT NULL
-            ORDER BY created_at DESC
-        """
-        self.cursor.execute(query)
+        query = GET_ALL_ALERTS_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
         return [
             {
                 'car_plate': row[0],
                 'timestamp': row[1].strftime('%Y-%m-%d %H:%M:%S'),
                 'reason': row[2]
             }
-            for row in self.cursor.fetchall()
+            for row in rows
+        ]
+
+    @timed_query
+    def get_log_page(self, log_type, limit=50, before=None, since=None, until=None, plate=None):
+        """One page of a log, newest first.
+
+        `before` is the (timestamp, id) key of the last row of the previous page.
+        Returns (rows, next_key); next_key is None on the last page.
+        """
+        query, to_dict = LOG_PAGES[log_type]
+        before_time, before_id = before or (None, None)
+        params = {
+            'plate': plate,
+            'since': since,
+            'until': until,
+            'before_time': before_time,
+            'before_id': before_id,
+            'limit': limit + 1  # one extra row tells us whether another page exists
+        }
+        with self.transaction() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_key = (rows[-1][1], rows[-1][0])
+        return [to_dict(row) for row in rows], next_key
+
+    @timed_query
+    def get_events(self, after_id, missing_ids=(), limit=1000):
+        """Events with id > after_id, plus any of missing_ids that have since committed."""
+        query = GET_EVENTS_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query, (after_id, list(missing_ids), limit))
+            rows = cursor.fetchall()
+
+        events = []
+        for event_id, kind, record_id, occurred_at, car_plate, amount in rows:
+            log_type = EVENT_LOG_TYPES[kind]
+            # Same row layout as the LOG_PAGES queries: id, timestamp, plate, extra
+            extra = amount if kind == 'payment' else 'Unauthorized Exit'
+            events.append({
+                'id': event_id,
+                'kind': kind,
+                'data': LOG_PAGES[log_type][1]((record_id, occurred_at, car_plate, extra))
+            })
+        return events
+
+    @timed_query
+    def get_last_event_id(self):
+        query = GET_LAST_EVENT_ID_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query)
+            return cursor.fetchone()[0]
+
+    @timed_query
+    def add_lane_events(self, events):
+        """Insert a batch of journal events in one statement and one commit.
+
+        events: (occurred_at, lane, kind, car_plate, track_id, details) tuples.
+        """
+        query = ADD_LANE_EVENTS_SQL
+        rows = [(occurred_at, self.lot_id, lane, kind, plate, track_id, json.dumps(details))
+                for occurred_at, lane, kind, plate, track_id, details in events]
+        with self.transaction() as cursor:
+            execute_values(cursor, query, rows, page_size=len(rows) or 1)
+
+    def stream_rows(self, query, params=None, batch_size=1000):
+        """Yield lists of up to batch_size rows from a named server-side cursor.
+
+        Only one batch is held in memory at a time, however large the result.
+        The pooled connection stays checked out until the generator finishes or
+        is closed.
+        """
+        conn = self.pool.getconn()
+        broken = False
+        try:
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if not broken and not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+                conn.rollback()  # consumer stopped early
+            self.pool.putconn(conn, close=broken)
+
+    def export_records(self, since=None, until=None, batch_size=1000):
+        """Stream parking records with entry_time in [since, until) as batches of rows."""
+        query = EXPORT_RECORDS_SQL
+        return self.stream_rows(query, {'since': since, 'until': until}, batch_size)
+
+    @timed_query
+    def get_stats(self, granularity, since, until, lot_id=None, limit=1000):
+        """Hourly or daily rollup buckets; buckets with no activity are absent."""
+        query = STATS_QUERIES[granularity]
+        params = {'since': since, 'until': until, 'lot_id': lot_id, 'limit': limit}
+        with self.transaction() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        return [
+            {
+                'lot_id': row[0],
+                'bucket': row[1].strftime('%Y-%m-%d %H:%M:%S'),
+                'entries': row[2],
+                'exits': row[3],
+                'unauthorized_exits': row[4],
+                'avg_dwell_minutes': round(row[5] / row[3] / 60, 1) if row[3] else None,
+                'payments': row[6],
+                'revenue': float(row[7]),
+                'occupancy': row[8],
+                'peak_occupancy': row[9]
+            }
+            for row in rows
         ]
 
+    @timed_query
+    def get_lot_occupancy(self):
+        query = GET_LOT_OCCUPANCY_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query)
+            return dict(cursor.fetchall())
+
+    def close(self):
+        self.pool.closeall()
+
     def __del__(self):
-        self.cursor.close()
-        self.conn.close()
\ No newline at end of file
+        if hasattr(self, 'pool'):
+            self.close()
\ No newline at end of file
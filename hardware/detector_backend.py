@@ -0,0 +1,196 @@
+import os
+
+import cv2
+import numpy as np
+
+from metrics import histogram
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+
+INFERENCE_SECONDS = histogram('plate_detector_inference_seconds',
+                              'Plate detector (YOLO) inference time per call', ['backend'])
+
+
+class DetectionResult:
+    """Plate boxes found in one frame, independent of the inference backend."""
+
+    def __init__(self, frame, boxes, scores):
+        self.frame = frame
+        self.boxes = boxes  # list of (x1, y1, x2, y2) ints in frame coordinates
+        self.scores = scores
+
+    def plot(self):
+        """Return a copy of the frame with the boxes drawn on it."""
+        annotated = self.frame.copy()
+        for (x1, y1, x2, y2), score in zip(self.boxes, self.scores):
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(annotated, f"plate {score:.2f}", (x1, max(0, y1 - 5)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+        return annotated
+
+
+class PlateDetector:
+    """Common interface for plate detection backends."""
+
+    backend = None
+
+    def __init__(self, conf=0.25, iou=0.7, imgsz=640):
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        self.inference_seconds = INFERENCE_SECONDS.labels(backend=self.backend)
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames):
+        """Run detection on several frames in one call and return a DetectionResult each."""
+        with self.inference_seconds.time():
+            return self.infer_batch(frames)
+
+    def infer_batch(self, frames):
+        raise NotImplementedError
+
+
+class TorchDetector(PlateDetector):
+    """The trained PyTorch weights through ultralytics (reference path)."""
+
+    backend = 'torch'
+
+    def __init__(self, model_path, **kwargs):
+        super().__init__(**kwargs)
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+
+    def infer_batch(self, frames):
+        results = self.model(frames, conf=self.conf, iou=self.iou, imgsz=self.imgsz, verbose=False)
+        return [
+            DetectionResult(
+                frame,
+                [tuple(map(int, box.xyxy[0])) for box in result.boxes],
+                [float(box.conf[0]) for box in result.boxes]
+            )
+            for frame, result in zip(frames, results)
+        ]
+
+
+def letterbox(img, size, color=114):
+    """Resize keeping aspect ratio and pad to a size x size square, as YOLO does."""
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas = np.full((size, size, 3), color, dtype=np.uint8)
+    canvas[top:top + nh, left:left + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return canvas, scale, (left, top)
+
+
+def to_blob(canvases):
+    """Stack letterboxed BGR images into a normalized NCHW RGB float32 tensor."""
+    batch = np.stack(canvases)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+
+class ExportedDetector(PlateDetector):
+    """Shared pre/post-processing for YOLOv8 graphs exported from best.pt.
+
+    The exported graph outputs (batch, 4 + classes, anchors) with boxes as
+    centre x/y, width and height in letterboxed pixels.
+    """
+
+    def run(self, blob):
+        raise NotImplementedError
+
+    def infer_batch(self, frames):
+        letterboxed = [letterbox(frame, self.imgsz) for frame in frames]
+        output = self.run(to_blob([canvas for canvas, _, _ in letterboxed]))
+        return [
+            self.postprocess(frame, output[i], scale, pad)
+            for i, (frame, (_, scale, pad)) in enumerate(zip(frames, letterboxed))
+        ]
+
+    def postprocess(self, frame, pred, scale, pad):
+        pred = pred.T
+        scores = pred[:, 4:].max(axis=1)
+        keep = scores >= self.conf
+        pred, scores = pred[keep], scores[keep]
+        if not len(pred):
+            return DetectionResult(frame, [], [])
+
+        # Centre/size in letterbox space -> corner boxes in frame space
+        cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+        x1 = (cx - w / 2 - pad[0]) / scale
+        y1 = (cy - h / 2 - pad[1]) / scale
+        x2 = (cx + w / 2 - pad[0]) / scale
+        y2 = (cy + h / 2 - pad[1]) / scale
+
+        height, width = frame.shape[:2]
+        x1, x2 = x1.clip(0, width), x2.clip(0, width)
+        y1, y2 = y1.clip(0, height), y2.clip(0, height)
+
+        rects = np.stack([x1, y1, x2 - x1, y2 - y1], axis=1).tolist()
+        indices = cv2.dnn.NMSBoxes(rects, scores.tolist(), self.conf, self.iou)
+        indices = np.array(indices).reshape(-1)
+
+        boxes = [(int(x1[i]), int(y1[i]), int(x2[i]), int(y2[i])) for i in indices]
+        return DetectionResult(frame, boxes, [float(scores[i]) for i in indices])
+
+
+class OnnxDetector(ExportedDetector):
+    """ONNX Runtime on CPU. Works with fp32 and int8 (QDQ) exports."""
+
+    backend = 'onnx'
+
+    def __init__(self, model_path, threads=0, **kwargs):
+        super().__init__(**kwargs)
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.batch_dynamic = not isinstance(self.session.get_inputs()[0].shape[0], int)
+
+    def run(self, blob):
+        if self.batch_dynamic or len(blob) == 1:
+            return self.session.run(None, {self.input_name: blob})[0]
+        # Static-batch export: run frames one by one
+        return np.concatenate([self.session.run(None, {self.input_name: blob[i:i + 1]})[0]
+                               for i in range(len(blob))])
+
+
+class OpenVINODetector(ExportedDetector):
+    """OpenVINO on CPU. Loads an OpenVINO IR (.xml) or an ONNX file directly."""
+
+    backend = 'openvino'
+
+    def __init__(self, model_path, threads=0, **kwargs):
+        super().__init__(**kwargs)
+        import openvino as ov
+        core = ov.Core()
+        config = {'INFERENCE_NUM_THREADS': threads} if threads else {}
+        self.compiled = core.compile_model(core.read_model(model_path), 'CPU', config)
+        self.output = self.compiled.output(0)
+
+    def run(self, blob):
+        return self.compiled(blob)[self.output]
+
+
+def resolve_model_path(backend, model_path):
+    """Map the default best.pt path to the exported file for non-torch backends."""
+    if backend != 'torch' and model_path.endswith('.pt'):
+        return os.path.splitext(model_path)[0] + '.onnx'
+    return model_path
+
+
+def create_detector(backend, model_path, conf=0.25, iou=0.7, imgsz=640, threads=0):
+    """Build the requested detection backend."""
+    model_path = resolve_model_path(backend, model_path)
+    if backend == 'torch':
+        return TorchDetector(model_path, conf=conf, iou=iou, imgsz=imgsz)
+    if backend == 'onnx':
+        return OnnxDetector(model_path, threads=threads, conf=conf, iou=iou, imgsz=imgsz)
+    if backend == 'openvino':
+        return OpenVINODetector(model_path, threads=threads, conf=conf, iou=iou, imgsz=imgsz)
+    raise ValueError(f"Unknown detector backend: {backend} (expected one of {', '.join(BACKENDS)})")
@@ -0,0 +1,230 @@
+import json
+import logging
+import select
+import threading
+import time
+from collections import deque
+
+import psycopg2
+
+from database import CHANGE_CHANNEL
+
+
+def format_event(event):
+    """Serialize one event in text/event-stream format."""
+    if event['kind'] == 'reset':
+        return RESET_EVENT
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+# Tells the client its position is gone and it should fetch a fresh snapshot
+RESET_EVENT = "event: reset\ndata: {}\n\n"
+KEEP_ALIVE = ": keep-alive\n\n"
+
+
+class EventBroker:
+    """Fans the parking_events table out to server-sent event subscribers.
+
+    A LISTEN connection on parking_records_changed wakes the poller as soon
+    as a write commits; without it (or if it drops) the poller falls back to
+    polling every `poll_interval` seconds. The poller reads new events by
+    primary key, so the database cost is the same for one dashboard or fifty
+    and does not depend on how much history is stored. Recent events stay in a ring buffer for Last-Event-ID
+    resume; older positions are replayed from the table, and positions too
+    old for that get a `reset` event.
+
+    Event ids come from a sequence, so a transaction can commit a lower id
+    after a higher one is already visible. Skipped ids are re-checked for
+    `gap_timeout` seconds before being written off as rolled back.
+    """
+
+    def __init__(self, db, poll_interval=0.5, buffer_size=1000, gap_timeout=5.0,
+                 listen=True, listen_interval=5.0, logger=None):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.listen = listen
+        self.listen_interval = listen_interval  # safety poll while notifications arrive
+        self.buffer_size = buffer_size
+        self.gap_timeout = gap_timeout
+        self.logger = logger or logging.getLogger('EventBroker')
+
+        self.buffer = deque(maxlen=buffer_size)  # (seq, event)
+        self.seq = 0  # position in the buffer, independent of event ids
+        self.last_id = 0
+        self.gaps = {}  # missing event id -> monotonic time first noticed
+        self.cond = threading.Condition()
+        self.subscribers = []  # (on_events, on_reset) callbacks, e.g. LogProjection
+
+        self.wake = threading.Event()
+        self.listening = False
+        self.notifications = 0
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self):
+        self.last_id = self.db.get_last_event_id()
+        self.threads.append(threading.Thread(target=self._poll_loop, name='event-broker', daemon=True))
+        if self.listen:
+            self.threads.append(threading.Thread(target=self._listen_loop, name='event-listener', daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def subscribe(self, on_events, on_reset=None):
+        """Call on_events(events) after every poll that found events, on_reset() after a reset."""
+        self.subscribers.append((on_events, on_reset))
+
+    def _poll_loop(self):
+        while not self.stopped.is_set():
+            self.wake.wait(self.listen_interval if self.listening else self.poll_interval)
+            self.wake.clear()
+            if self.stopped.is_set():
+                break
+            try:
+                self.poll()
+            except Exception as e:
+                self.logger.error(f"Event poll failed: {e}")
+
+    def _listen_loop(self):
+        while not self.stopped.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.db.config)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANGE_CHANNEL}")
+                self.listening = True
+                self.wake.set()  # catch anything committed before LISTEN took effect
+
+                while not self.stopped.is_set():
+                    if not select.select([conn], [], [], 1.0)[0]:
+                        continue
+                    conn.poll()
+                    operations = set()
+                    while conn.notifies:
+                        operations.add(conn.notifies.pop(0).payload)
+                    self.notifications += 1
+                    if operations & {'DELETE', 'TRUNCATE'}:
+                        self.reset()
+                    self.wake.set()
+            except Exception as e:
+                self.logger.error(f"Change listener error: {e}; polling every {self.poll_interval}s")
+                self.stopped.wait(5)
+            finally:
+                self.listening = False
+                if conn is not None:
+                    conn.close()
+
+    def reset(self):
+        """Rows were removed: tell subscribers and SSE clients to reload their snapshot."""
+        with self.cond:
+            self.seq += 1
+            self.buffer.append((self.seq, {'id': self.last_id, 'kind': 'reset', 'data': {}}))
+            self.cond.notify_all()
+        for _, on_reset in self.subscribers:
+            if on_reset:
+                on_reset()
+
+    def poll(self):
+        """Fetch events committed since the last poll and wake subscribers."""
+        with self.cond:
+            last_id, gaps = self.last_id, list(self.gaps)
+        events = self.db.get_events(last_id, gaps, self.buffer_size)
+
+        now = time.monotonic()
+        with self.cond:
+            for event in events:
+                self.gaps.pop(event['id'], None)
+                if event['id'] > self.last_id:
+                    for missing in range(self.last_id + 1, event['id']):
+                        self.gaps[missing] = now
+                    self.last_id = event['id']
+                self.seq += 1
+                self.buffer.append((self.seq, event))
+
+            for missing, noticed in list(self.gaps.items()):
+                if now - noticed > self.gap_timeout:
+                    del self.gaps[missing]
+
+            if events:
+                self.cond.notify_all()
+
+        if events:
+            for on_events, _ in self.subscribers:
+                on_events(events)
+        return len(events)
+
+    def replay(self, last_event_id):
+        """Events after last_event_id and the buffer position to continue from.
+
+        Returns (None, seq) if the client is too far behind to catch up.
+        """
+        with self.cond:
+            seq = self.seq
+            oldest = self.buffer[0][1]['id'] if self.buffer else None
+            if oldest is not None and oldest <= last_event_id + 1:
+                return [event for _, event in self.buffer
+                        if event['id'] > last_event_id and event['kind'] != 'reset'], seq
+
+        # Not in memory: read it from the table, up to one buffer's worth
+        events = self.db.get_events(last_event_id, (), self.buffer_size)
+        if len(events) >= self.buffer_size:
+            return None, seq
+        return events, seq
+
+    def wait(self, seq, timeout):
+        """Block until there are events after buffer position seq.
+
+        Returns (events, new_seq, lost); lost is True if the subscriber fell
+        more than a buffer behind.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > seq or self.stopped.is_set(), timeout)
+            if not self.buffer or self.seq == seq:
+                return [], self.seq, False
+            lost = self.buffer[0][0] > seq + 1
+            events = [event for event_seq, event in self.buffer if event_seq > seq]
+            return events, self.seq, lost
+
+    def stream(self, last_event_id=None, heartbeat=15.0):
+        """Generator of SSE text for one subscriber."""
+        with self.cond:
+            seq = self.seq
+        seen = 0
+        if last_event_id is not None:
+            backlog, seq = self.replay(last_event_id)
+            if backlog is None:
+                yield RESET_EVENT
+            else:
+                for event in backlog:
+                    yield format_event(event)
+                seen = max((event['id'] for event in backlog), default=0)
+
+        while not self.stopped.is_set():
+            events, seq, lost = self.wait(seq, heartbeat)
+            if lost:
+                yield RESET_EVENT
+            if not events:
+                yield KEEP_ALIVE
+            for event in events:
+                if event['id'] > seen or event['kind'] == 'reset':  # else already sent from the replay
+                    yield format_event(event)
+            seen = 0
+
+    def stats(self):
+        with self.cond:
+            return {
+                'last_event_id': self.last_id,
+                'buffered': len(self.buffer),
+                'pending_gaps': len(self.gaps),
+                'listening': self.listening,
+                'notifications': self.notifications
+            }
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+        with self.cond:
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join(1.5)
@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from database import EXPORT_COLUMNS
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def export_value(value):
+    """JSON/CSV-friendly form of a database value."""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def csv_chunks(batches, columns=EXPORT_COLUMNS):
+    """Yield the header, then one CSV text chunk per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([export_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(batches, columns=EXPORT_COLUMNS):
+    """Yield one chunk of newline-delimited JSON objects per batch of rows."""
+    for rows in batches:
+        yield ''.join(
+            json.dumps({column: export_value(value) for column, value in zip(columns, row)}) + '\n'
+            for row in rows
+        )
+
+
+def export_chunks(batches, export_format):
+    """Text chunks for the given format ('csv' or 'ndjson')."""
+    if export_format == 'csv':
+        return csv_chunks(batches)
+    if export_format == 'ndjson':
+        return ndjson_chunks(batches)
+    raise ValueError(f"Unknown export format '{export_format}'")
@@ -0,0 +1,101 @@
+import argparse
+import os
+import random
+
+import cv2
+
+from detector_backend import letterbox, to_blob
+
+DEFAULT_WEIGHTS = '../model_dev/runs/detect/train/weights/best.pt'
+DEFAULT_CALIB_DIR = '../model_dev/dataset/images'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def list_images(image_dir):
+    return sorted(
+        os.path.join(image_dir, f) for f in os.listdir(image_dir)
+        if f.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def export_onnx(weights, imgsz):
+    """Export best.pt to ONNX with a dynamic batch axis (for cross-lane batching)."""
+    from ultralytics import YOLO
+    path = YOLO(weights).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+    print(f"[EXPORT] ONNX model written to {path}")
+    return path
+
+
+def quantize_int8(onnx_path, calib_dir, calib_count, imgsz, output_path=None):
+    """Statically quantize an ONNX model to int8 using dataset images for calibration."""
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    images = list_images(calib_dir)
+    random.seed(42)
+    random.shuffle(images)
+    images = images[:calib_count]
+    print(f"[CALIBRATE] Using {len(images)} images from {calib_dir}")
+
+    class ImageReader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self.input_name = input_name
+            self.paths = iter(images)
+
+        def get_next(self):
+            for path in self.paths:
+                img = cv2.imread(path)
+                if img is not None:
+                    canvas, _, _ = letterbox(img, imgsz)
+                    return {self.input_name: to_blob([canvas])}
+            return None
+
+    import onnxruntime as ort
+    input_name = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    base = os.path.splitext(onnx_path)[0]
+    prepared_path = base + '-prep.onnx'
+    output_path = output_path or base + '-int8.onnx'
+
+    quant_pre_process(onnx_path, prepared_path)
+    quantize_static(
+        prepared_path, output_path, ImageReader(input_name),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    os.remove(prepared_path)
+    print(f"[EXPORT] int8 model written to {output_path}")
+    return output_path
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Export the plate detector for CPU inference')
+
+    parser.add_argument('--weights', type=str, default=DEFAULT_WEIGHTS,
+                        help='Path to the trained PyTorch weights')
+    parser.add_argument('--imgsz', type=int, default=640,
+                        help='Inference image size (must match training)')
+    parser.add_argument('--int8', action='store_true',
+                        help='Also write an int8 statically-quantized ONNX model')
+    parser.add_argument('--calib-dir', type=str, default=DEFAULT_CALIB_DIR,
+                        help='Directory of calibration images')
+    parser.add_argument('--calib-count', type=int, default=100,
+                        help='Number of calibration images')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_arguments()
+    onnx_path = export_onnx(args.weights, args.imgsz)
+    if args.int8:
+        quantize_int8(onnx_path, args.calib_dir, args.calib_count, args.imgsz)
+
+
+if __name__ == "__main__":
+    main()
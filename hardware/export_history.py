@@ -0,0 +1,58 @@
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from storage import open_database
+from export import FORMATS, export_chunks
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Export parking history as CSV or NDJSON, streamed in constant memory'
+    )
+    parser.add_argument('--format', type=str, choices=FORMATS, default='csv',
+                        help='Output format')
+    parser.add_argument('--since', type=datetime.fromisoformat,
+                        help='Only records that entered at or after this time (ISO format)')
+    parser.add_argument('--until', type=datetime.fromisoformat,
+                        help='Only records that entered before this time (ISO format)')
+    parser.add_argument('--output', type=str,
+                        help='Output file (default: stdout)')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Rows fetched from the server-side cursor per round trip')
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_arguments()
+    db = open_database()
+
+    rows = 0
+
+    def counted(batches):
+        nonlocal rows
+        for batch in batches:
+            rows += len(batch)
+            yield batch
+
+    started = time.perf_counter()
+    batches = counted(db.export_records(args.since, args.until, args.batch_size))
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        for chunk in export_chunks(batches, args.format):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        db.close()
+
+    # Keep stdout clean for piping; report on stderr
+    print(f"[EXPORT] {rows} records in {time.perf_counter() - started:.1f}s"
+          + (f" -> {args.output}" if args.output else ""), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
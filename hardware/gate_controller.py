@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+
+import serial
+
+from metrics import counter
+
+GATE_ACTUATIONS = counter('gate_actuations_total', 'Commands sent to the gate Arduino',
+                          ['command', 'simulated'])
+
+
+class GateController:
+    """Non-blocking gate actuator shared by every part of a lane.
+
+    The gate moves through closed -> open -> closing -> closed. A single
+    scheduler thread owns the close deadline: re-triggering an open gate only
+    pushes the deadline out, so tailgating cars never stack timers and the
+    caller never sleeps while the gate is up.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    CLOSING = 'closing'
+
+    OPEN_COMMAND = b'1'
+    CLOSE_COMMAND = b'0'
+    ALERT_COMMAND = b'2'
+
+    def __init__(self, arduino=None, hold_time=15.0, closing_time=1.0, logger=None, journal=None, lane=None):
+        self.arduino = arduino
+        self.hold_time = hold_time
+        self.closing_time = closing_time  # how long the barrier takes to come down
+        self.logger = logger or logging.getLogger('GateController')
+        self.journal = journal  # optional EventJournal for the lane audit trail
+        self.lane = lane
+
+        self.state = self.CLOSED
+        self.deadline = None
+        self.opens = 0
+        self.extensions = 0
+
+        self.write_lock = threading.Lock()
+        self.cond = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._schedule, name='gate-scheduler', daemon=True)
+        self.thread.start()
+
+    def send(self, command):
+        """Write a single command byte to the Arduino (or log it in simulation)."""
+        simulated = not (self.arduino and self.arduino.is_open)
+        GATE_ACTUATIONS.labels(command=command.decode(), simulated=simulated).inc()
+        if self.journal:
+            self.journal.record('gate', self.lane, command=command.decode(), simulated=simulated)
+        if simulated:
+            self.logger.info(f"Gate command '{command.decode()}' (SIMULATED)")
+            return True
+        try:
+            with self.write_lock:
+                self.arduino.write(command)
+            return True
+        except serial.SerialException as e:
+            self.logger.error(f"Failed to control gate: {e}")
+            return False
+
+    def open(self, hold_time=None):
+        """Open the gate, or keep it open longer if it is already up. Returns immediately."""
+        hold = self.hold_time if hold_time is None else hold_time
+        with self.cond:
+            deadline = time.monotonic() + hold
+            if self.state == self.OPEN:
+                self.deadline = max(self.deadline, deadline)
+                self.extensions += 1
+                self.logger.info(f"Gate hold extended by re-trigger ({hold:.0f}s)")
+            else:
+                # Closed, or coming down: (re)open
+                self.send(self.OPEN_COMMAND)
+                self.state = self.OPEN
+                self.deadline = deadline
+                self.opens += 1
+                self.logger.info(f"Gate opening (sent '{self.OPEN_COMMAND.decode()}')")
+            self.cond.notify()
+
+    def close(self):
+        """Close the gate now instead of waiting for the hold time to expire."""
+        with self.cond:
+            if self.state == self.OPEN:
+                self.deadline = time.monotonic()
+                self.cond.notify()
+
+    def alert(self):
+        """Trigger the buzzer without touching the gate state."""
+        self.send(self.ALERT_COMMAND)
+        self.logger.info(f"Alert triggered (sent '{self.ALERT_COMMAND.decode()}')")
+
+    def _schedule(self):
+        with self.cond:
+            while self.running:
+                if self.deadline is None:
+                    self.cond.wait()
+                    continue
+
+                remaining = self.deadline - time.monotonic()
+                if remaining > 0:
+                    self.cond.wait(remaining)
+                    continue
+
+                if self.state == self.OPEN:
+                    self.send(self.CLOSE_COMMAND)
+                    self.state = self.CLOSING
+                    self.deadline = time.monotonic() + self.closing_time
+                    self.logger.info(f"Gate closing (sent '{self.CLOSE_COMMAND.decode()}')")
+                elif self.state == self.CLOSING:
+                    self.state = self.CLOSED
+                    self.deadline = None
+
+    def shutdown(self):
+        """Stop the scheduler and make sure the gate is closed."""
+        with self.cond:
+            self.running = False
+            was_closed = self.state == self.CLOSED
+            self.state = self.CLOSED
+            self.deadline = None
+            self.cond.notify()
+        self.thread.join(1.0)
+        if not was_closed:
+            self.send(self.CLOSE_COMMAND)
@@ -0,0 +1,118 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+class EventJournal:
+    """Append-only lane audit trail written by a background group-commit thread.
+
+    record() only appends to an in-memory queue, so the detection loop never
+    waits on the database. The writer thread collects events for up to
+    `flush_interval` seconds (or `max_batch` events) after the first one
+    arrives and inserts them in a single transaction: one commit, and one
+    fsync, per batch instead of per event.
+
+    If the database is unreachable the current batch is retried with backoff
+    while new events queue up; once `max_queue` events are waiting, further
+    events are dropped and counted rather than blocking the lanes.
+    """
+
+    def __init__(self, db, flush_interval=0.005, max_batch=256, max_queue=10000, logger=None):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.logger = logger or logging.getLogger('EventJournal')
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.commit_time = 0.0
+        self.failures = 0
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._write_loop, name='event-journal', daemon=True)
+        self.thread.start()
+        return self
+
+    def record(self, kind, lane=None, plate=None, track_id=None, **details):
+        """Queue one event. Never blocks; returns False if the event was dropped."""
+        try:
+            self.queue.put_nowait((datetime.now(), lane, kind, plate, track_id, details))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.recorded += 1
+        return True
+
+    def _collect(self):
+        """Block for the first event, then gather more until the batch is full or the window closes."""
+        try:
+            batch = [self.queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        backoff = 0.5
+        while True:
+            started = time.perf_counter()
+            try:
+                self.db.add_lane_events(batch)
+            except Exception as e:
+                self.failures += 1
+                if not self.running:
+                    self.logger.error(f"Journal write failed during shutdown, {len(batch)} events lost: {e}")
+                    return
+                self.logger.error(f"Journal write failed ({len(batch)} events), retrying in {backoff:.1f}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 10.0)
+                continue
+
+            self.commit_time += time.perf_counter() - started
+            self.batches += 1
+            self.written += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            return
+
+    def _write_loop(self):
+        while self.running or not self.queue.empty():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def stats(self):
+        return {
+            'recorded': self.recorded,
+            'written': self.written,
+            'pending': self.queue.qsize(),
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'avg_batch': round(self.written / self.batches, 1) if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'avg_commit_ms': round(self.commit_time / self.batches * 1000, 2) if self.batches else 0.0,
+            'failures': self.failures
+        }
+
+    def close(self, timeout=5.0):
+        """Flush what is queued and stop the writer."""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout)
@@ -0,0 +1,427 @@
+import argparse
+import logging
+import queue
+import re
+import threading
+import time
+from collections import Counter, deque
+
+import cv2
+import serial
+
+from detector_backend import BACKENDS, create_detector
+from ocr_engine import DEFAULT_RECOGNIZER, ENGINES as OCR_ENGINES, create_ocr_engine
+from pipeline import DropOldestQueue
+from plate_preprocess import DEFAULT_STRATEGY, STRATEGIES, PlatePreprocessor
+from plate_tracker import PlateTracker
+from session_index import OpenSessionIndex
+from storage import BACKENDS as STORAGE_BACKENDS, DEFAULT_BACKEND as DEFAULT_STORAGE, open_database
+from gate_controller import GateController
+from journal import EventJournal
+from profiler import add_profile_arguments, create_profiler
+from metrics import CONSENSUS_OUTCOMES, FRAMES_CAPTURED, FRAMES_SKIPPED, metrics_port, start_metrics_server
+
+
+class LaneStats:
+    """Per-lane counters and capture-to-decision latency samples."""
+
+    def __init__(self, window=500):
+        self.captured = 0
+        self.inferred = 0
+        self.skipped = 0
+        self.decisions = 0
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def add_latency(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def percentiles(self):
+        with self.lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return 0.0, 0.0, 0.0
+        pick = lambda p: samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+        return pick(0.50), pick(0.95), pick(0.99)
+
+
+class Lane:
+    """One camera + serial device pair acting as an entry or exit lane."""
+
+    def __init__(self, name, role, camera, serial_port, config):
+        if role not in ('entry', 'exit'):
+            raise ValueError(f"Unknown lane role: {role}")
+        self.name = name
+        self.role = role
+        self.camera = camera
+        self.serial_port = serial_port
+        self.config = config
+        self.logger = logging.getLogger(f'Lane.{name}')
+
+        self.frames = DropOldestQueue(1)  # only the freshest frame matters
+        self.tracker = PlateTracker()
+        self.stats = LaneStats()
+        self.last_saved_plate = None
+        self.last_entry_time = 0
+        self.running = False
+
+        self.cap = None
+        self.arduino = None
+        self.gate = None
+        self.thread = None
+
+    def open(self, journal=None):
+        self.cap = cv2.VideoCapture(self.camera)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open camera {self.camera} for lane {self.name}")
+
+        if self.serial_port:
+            try:
+                self.arduino = serial.Serial(self.serial_port, 9600, timeout=1)
+                time.sleep(2)  # Wait for connection to stabilize
+                self.logger.info(f"Connected to Arduino on {self.serial_port}")
+            except serial.SerialException as e:
+                self.logger.error(f"Failed to connect to Arduino: {e}")
+                self.arduino = None
+
+        self.gate = GateController(self.arduino, hold_time=self.config['gate_open_duration'],
+                                   logger=self.logger, journal=journal, lane=self.name)
+
+    def read_distance(self):
+        """Read distance from the lane's Arduino; no reading counts as in range."""
+        if self.arduino and self.arduino.in_waiting > 0:
+            try:
+                return float(self.arduino.readline().decode('utf-8').strip())
+            except (UnicodeDecodeError, ValueError, serial.SerialException):
+                pass
+        return self.config['detection_distance'] - 1
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, name=f"capture-{self.name}", daemon=True)
+        self.thread.start()
+
+    def _capture_loop(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            if not ret:
+                self.logger.warning("Failed to capture frame")
+                time.sleep(0.1)
+                continue
+            self.stats.captured += 1
+            FRAMES_CAPTURED.labels(lane=self.name).inc()
+            self.frames.put((time.monotonic(), frame, self.read_distance()))
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(1.0)
+        if self.cap:
+            self.cap.release()
+        if self.gate:
+            # Close the gate before exiting
+            self.gate.shutdown()
+        if self.arduino and self.arduino.is_open:
+            try:
+                self.arduino.close()
+            except serial.SerialException as e:
+                self.logger.error(f"Error closing Arduino connection: {e}")
+
+
+class LaneOrchestrator:
+    """Runs several lanes on one process with a single shared detection model.
+
+    Fresh frames from every lane with a vehicle in range are batched into one
+    model call. When more lanes are active than `max_batch`, lanes are served
+    round-robin so a busy lane cannot starve the others.
+    """
+
+    def __init__(self, lanes, config):
+        self.lanes = lanes
+        self.config = config
+        self.logger = logging.getLogger('LaneOrchestrator')
+        self.model = create_detector(config['backend'], config['model_path'])
+        self.ocr = create_ocr_engine(config['tesseract_config'], config['ocr_pool_size'],
+                                     config['ocr_engine'], config['ocr_model'])
+        self.preprocess = PlatePreprocessor(config['preprocess_strategy'])
+        if self.ocr.preprocess and self.ocr.preprocess != config['preprocess_strategy']:
+            self.logger.warning(f"The OCR model was trained on '{self.ocr.preprocess}' crops; "
+                                f"run with --preprocess {self.ocr.preprocess}")
+        self.db = open_database(config['storage'], forward_queue=config['forward_queue'], lot_id=config['lot_id'])
+        self.sessions = OpenSessionIndex(self.db, config['session_reconcile_interval']).start()
+        self.journal = EventJournal(self.db).start()  # audit trail, written off the hot path
+        self.plate_pattern = re.compile(config['plate_regex'])
+        self.profiler = create_profiler(
+            'lanes', config['profile'], config['profile_dir'], config['profile_seconds'],
+            config['profile_vehicles'], config['profile_cprofile'], self.logger
+        )
+
+        self.next_lane = 0
+        self.batches = 0
+        self.batch_frames = 0
+        self.inference_time = 0.0
+        self.last_report = time.monotonic()
+
+    def collect_batch(self):
+        """Take the freshest frame from up to max_batch lanes, round-robin."""
+        batch = []
+        count = len(self.lanes)
+        for offset in range(count):
+            lane = self.lanes[(self.next_lane + offset) % count]
+            try:
+                captured_at, frame, distance = lane.frames.get(timeout=0)
+            except queue.Empty:
+                continue
+            if distance > self.config['detection_distance']:
+                lane.stats.skipped += 1
+                FRAMES_SKIPPED.labels(lane=lane.name, reason='out_of_range').inc()
+                lane.tracker.update(frame, [])
+                self.process_tracks(lane, flush=True)
+                continue
+            batch.append((lane, captured_at, frame))
+            if len(batch) >= self.config['max_batch']:
+                # Start after the last lane served next time
+                self.next_lane = (self.next_lane + offset + 1) % count
+                break
+        return batch
+
+    def infer(self, batch):
+        started = time.perf_counter()
+        with self.profiler.span('detect', frames=len(batch)):
+            results = self.model.detect_batch([frame for _, _, frame in batch])
+        self.inference_time += time.perf_counter() - started
+        self.batches += 1
+        self.batch_frames += len(batch)
+        return results
+
+    def process_tracks(self, lane, flush=False):
+        """OCR the crops the lane's tracker released and decide on each track."""
+        for track, crops in lane.tracker.ocr_batches(flush=flush):
+            with self.profiler.span('preprocess', lane=lane.name, crops=len(crops)):
+                threshes = [self.preprocess(crop) for crop in crops]
+            with self.profiler.span('ocr', lane=lane.name, crops=len(crops)):
+                texts = self.ocr.recognize_many(threshes)
+            for text in texts:
+                matches = self.plate_pattern.findall(text)
+                self.journal.record('read', lane.name, matches[0] if matches else None, track.id,
+                                    text=text, valid=bool(matches))
+                if matches:
+                    track.add_read(matches[0])
+
+            reads = track.read_list()
+            if len(reads) >= self.config['min_plate_detections']:
+                plate, votes = Counter(reads).most_common(1)[0]
+                ratio = votes / len(reads)
+                self.journal.record('consensus', lane.name, plate, track.id, votes=votes,
+                                    reads=len(reads), ratio=round(ratio, 3),
+                                    ocr_calls=track.ocr_calls)
+                outcome = 'accepted' if ratio >= self.config['weak_consensus_ratio'] else 'weak'
+                CONSENSUS_OUTCOMES.labels(lane=lane.name, outcome=outcome).inc()
+                track.clear_reads()
+                track.decide(plate)
+                lane.stats.decisions += 1
+                with self.profiler.span('decide', lane=lane.name, plate=plate):
+                    if lane.role == 'entry':
+                        self.decide_entry(lane, plate, track)
+                    else:
+                        self.decide_exit(lane, plate, track)
+                self.profiler.vehicle_done()
+
+    def decide_entry(self, lane, plate, track):
+        now = time.time()
+        if self.sessions.has_unpaid(plate):
+            lane.logger.info(f"[SKIPPED] Unpaid record exists for {plate}")
+            self.journal.record('entry', lane.name, plate, track.id, outcome='unpaid_record_exists')
+        elif plate == lane.last_saved_plate and (now - lane.last_entry_time) <= self.config['entry_cooldown']:
+            lane.logger.info(f"[SKIPPED] Cooldown: {plate}")
+            self.journal.record('entry', lane.name, plate, track.id, outcome='cooldown')
+        else:
+            entry_id = self.sessions.add_entry(plate)
+            if entry_id:
+                lane.logger.info(f"[NEW] Logged plate {plate} with ID {entry_id}")
+                self.journal.record('entry', lane.name, plate, track.id, outcome='logged', record_id=entry_id)
+                lane.gate.open()
+                lane.last_saved_plate = plate
+                lane.last_entry_time = now
+            else:
+                lane.logger.error(f"[ERROR] Failed to log plate {plate}")
+                self.journal.record('entry', lane.name, plate, track.id, outcome='error')
+
+    def decide_exit(self, lane, plate, track):
+        if not self.sessions.get_paid(plate):
+            # Counted as an unauthorized exit in the stats rollups (migration 0009)
+            lane.logger.info(f"[ACCESS DENIED] No paid record found for {plate}")
+            self.journal.record('exit', lane.name, plate, track.id, outcome='unauthorized')
+            lane.gate.alert()  # Buzzer or alert
+        elif not self.sessions.record_exit(plate):
+            lane.logger.error(f"[ERROR] Failed to record exit for {plate}")
+            self.journal.record('exit', lane.name, plate, track.id, outcome='error')
+            lane.gate.alert()
+        else:
+            lane.logger.info(f"[ACCESS GRANTED] Exit recorded for {plate}")
+            self.journal.record('exit', lane.name, plate, track.id, outcome='granted')
+            lane.gate.open()
+
+    def step(self):
+        """Run one batched inference round. Returns False if no lane had work."""
+        with self.profiler.span('collect_batch'):
+            batch = self.collect_batch()
+        if not batch:
+            return False
+
+        results = self.infer(batch)
+        for (lane, captured_at, frame), result in zip(batch, results):
+            lane.stats.inferred += 1
+            with self.profiler.span('track', lane=lane.name, boxes=len(result.boxes)):
+                lane.tracker.update(frame, result.boxes)
+            self.process_tracks(lane)
+            lane.stats.add_latency(time.monotonic() - captured_at)
+
+            if self.config['show']:
+                cv2.imshow(f"Lane {lane.name}", result.plot())
+        return True
+
+    def report(self):
+        self.last_report = time.monotonic()
+        if self.batches:
+            self.logger.info(
+                f"{self.batches} batches, {self.batch_frames / self.batches:.2f} frames/batch, "
+                f"{self.inference_time / self.batches * 1000:.1f} ms/batch"
+            )
+        total_inferred = sum(lane.stats.inferred for lane in self.lanes) or 1
+        for lane in self.lanes:
+            stats = lane.stats
+            p50, p95, p99 = stats.percentiles()
+            self.logger.info(
+                f"[{lane.name}/{lane.role}] captured={stats.captured} inferred={stats.inferred} "
+                f"share={stats.inferred / total_inferred:.0%} out_of_range={stats.skipped} "
+                f"dropped={lane.frames.dropped} decisions={stats.decisions} "
+                f"latency p50={p50:.0f}ms p95={p95:.0f}ms p99={p99:.0f}ms"
+            )
+        self.logger.info(f"Open sessions: {self.sessions.stats()}")
+        self.logger.info(f"Journal: {self.journal.stats()}")
+        if self.config['forward_queue']:
+            self.logger.info(f"Write queue: {self.db.stats()}")
+
+    def run(self):
+        for lane in self.lanes:
+            lane.open(self.journal)
+            lane.start()
+        self.logger.info(f"Running {len(self.lanes)} lanes on one model")
+        self.profiler.start()
+
+        try:
+            while True:
+                if not self.step():
+                    time.sleep(0.005)
+                if time.monotonic() - self.last_report >= self.config['stats_interval']:
+                    self.report()
+                if self.config['show'] and cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+        except KeyboardInterrupt:
+            self.logger.info("Interrupted by user")
+        finally:
+            self.profiler.close()
+            for lane in self.lanes:
+                lane.stop()
+            self.ocr.close()
+            self.report()
+            self.sessions.close()
+            self.journal.close()
+            self.db.close()
+            cv2.destroyAllWindows()
+
+
+def parse_lane(spec):
+    """Parse ROLE:CAMERA[:SERIAL] into (role, camera, serial_port)."""
+    parts = spec.split(':', 2)
+    if len(parts) < 2:
+        raise argparse.ArgumentTypeError(f"Lane must be ROLE:CAMERA[:SERIAL], got {spec!r}")
+    role, camera = parts[0], int(parts[1])
+    serial_port = parts[2] if len(parts) > 2 else None
+    return role, camera, serial_port
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Multi-lane plate recognition with one shared model')
+
+    parser.add_argument('--lane', type=parse_lane, action='append', required=True,
+                        help='Lane as ROLE:CAMERA[:SERIAL], e.g. entry:0:/dev/ttyACM0 (repeatable)')
+    parser.add_argument('--model', type=str, default='../model_dev/runs/detect/train/weights/best.pt',
+                        help='Path to the YOLO model (.pt, or exported .onnx/.xml)')
+    parser.add_argument('--backend', type=str, choices=BACKENDS, default='torch',
+                        help='Inference backend for plate detection')
+    parser.add_argument('--max-batch', type=int, default=4,
+                        help='Maximum frames per inference call')
+    parser.add_argument('--show', action='store_true',
+                        help='Show annotated lane feeds')
+    parser.add_argument('--lot', type=str, default=None,
+                        help='Lot id recorded with entries (default: $PARKING_LOT_ID or "main")')
+    parser.add_argument('--storage', type=str, choices=STORAGE_BACKENDS, default=DEFAULT_STORAGE,
+                        help='Storage backend: central postgres, or an embedded sqlite file on the lane PC')
+    parser.add_argument('--forward-queue', type=str, default='lanes',
+                        help='Local write-ahead queue lane writes go through, so a slow or down database never stalls a lane '
+                             '(name in outbox/ or a path; "" to disable)')
+    parser.add_argument('--metrics-port', type=int, default=metrics_port(9102),
+                        help='Local port for the Prometheus /metrics endpoint (0 to disable)')
+    parser.add_argument('--preprocess', type=str, choices=sorted(STRATEGIES), default=DEFAULT_STRATEGY,
+                        help='Plate preprocessing strategy (benchmark_preprocess.py picks one)')
+    parser.add_argument('--ocr-engine', type=str, choices=OCR_ENGINES, default='tesseract',
+                        help='Plate text recognizer: Tesseract, or the CRNN from train_recognizer.py')
+    parser.add_argument('--ocr-model', type=str, default=DEFAULT_RECOGNIZER,
+                        help='Path to the exported CRNN (.onnx) for --ocr-engine crnn')
+    add_profile_arguments(parser)
+
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_arguments()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    config = {
+        'model_path': args.model,
+        'backend': args.backend,
+        'max_batch': args.max_batch,
+        'show': args.show,
+        'lot_id': args.lot,
+        'storage': args.storage,
+        'forward_queue': args.forward_queue,
+        'preprocess_strategy': args.preprocess,
+        'ocr_engine': args.ocr_engine,
+        'ocr_model': args.ocr_model,
+        'profile': args.profile,
+        'profile_dir': args.profile_dir,
+        'profile_seconds': args.profile_seconds,
+        'profile_vehicles': args.profile_vehicles,
+        'profile_cprofile': args.profile_cprofile,
+
+        'detection_distance': 50,  # cm
+        'entry_cooldown': 300,  # seconds (5 minutes)
+        'gate_open_duration': 15,  # seconds
+        'min_plate_detections': 3,
+        'weak_consensus_ratio': 0.7,  # smaller majorities are counted as weak (metrics only)
+        'plate_regex': r'(RA[A-Z]\d{3}[A-Z])',
+        'tesseract_config': '--psm 8 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+        'ocr_pool_size': 2,
+        'stats_interval': 10,  # seconds between lane stats reports
+        'session_reconcile_interval': 60  # seconds between open-session snapshots
+    }
+
+    lanes = [
+        Lane(f"{role}{i}", role, camera, serial_port, config)
+        for i, (role, camera, serial_port) in enumerate(args.lane)
+    ]
+    start_metrics_server(args.metrics_port)
+    LaneOrchestrator(lanes, config).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,59 @@
 import platform
 import cv2
-import numpy as np
-from ultralytics import YOLO
-import pytesseract
 import os
 import time
 import serial
 import serial.tools.list_ports
-import csv
 import logging
 from collections import Counter
-from datetime import datetime
 import re
 import argparse
-import threading
+from pipeline import StagedPipeline
+from ocr_engine import DEFAULT_RECOGNIZER, ENGINES as OCR_ENGINES, create_ocr_engine
+from motion_gate import SceneChangeGate
+from plate_tracker import PlateTracker
+from detector_backend import BACKENDS, create_detector
+from gate_controller import GateController
+from session_log import SessionLog, migrate_csv
+from plate_preprocess import STRATEGIES, PlatePreprocessor
+from profiler import add_profile_arguments, create_profiler
+from metrics import CONSENSUS_OUTCOMES, FRAMES_CAPTURED, FRAMES_SKIPPED, metrics_port, start_metrics_server
+
+
+# Settings not taken from the command line (see main() for the rest)
+DEFAULT_CONFIG = {
+    'camera_width': 1280,
+    'camera_height': 720,
+
+    'save_dir': 'plates',
+    'session_log': 'sessions.log',  # + sessions.log.idx (plate index and counter)
+    'csv_file': 'db.csv',  # legacy log, imported into session_log once
+    'log_file': 'logs/plate_recognition.log',
+    'lane': 'main',  # lane label on the /metrics counters
+
+    'detection_distance': 50,  # cm
+    'entry_cooldown': 300,  # seconds (5 minutes)
+    'gate_open_duration': 15,  # seconds
+    'min_plate_detections': 3,
+    'min_consensus_ratio': 0.7,
+    'plate_regex': r'(RA[A-Z]\d{3}[A-Z])',  # Regex for plates starting with RA + letter + 3 digits + letter  # Adjust pattern for your plates
+    'preprocess_strategy': 'adaptive',  # overridden by --preprocess
+    'plate_height': 48,  # px; crops are resized to this height before binarization
+    'tesseract_config': '--psm 8 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789',
+
+    'pipeline_queue_size': 2,  # frames buffered between stages (oldest dropped)
+    'pipeline_stats_interval': 10,  # seconds between throughput reports
+
+    'motion_pixel_threshold': 25,  # grey-level change for a pixel to count as changed
+    'motion_changed_fraction': 0.02,  # fraction of changed pixels that triggers detection
+    'motion_max_skip': 5.0,  # seconds before forcing a detection on a static scene
+
+    'track_iou_threshold': 0.3,  # minimum box overlap to continue a track
+    'track_max_missed': 15,  # frames a track survives without a matching box
+    'track_sample_frames': 5,  # frames of crops collected before an OCR round
+    'track_crops_per_round': 3,  # sharpest/largest crops OCR'd per round
+    'track_max_rounds': 3  # OCR rounds per track before giving up
+}
 
 
 class PlateRecognitionSystem:
@@ -24,22 +64,27 @@ class PlateRecognitionSystem:
         self.config = config
         self.setup_logging()
         self.logger.info("Initializing Plate Recognition System")
+        self.init_profiler()
 
         # Ensure directories exist
         os.makedirs(config['save_dir'], exist_ok=True)
         os.makedirs(os.path.dirname(config['log_file']), exist_ok=True)
 
         # Initialize components
-        self.init_csv()
+        self.init_session_log()
         self.load_model()
+        self.init_ocr()
+        self.init_preprocessor()
+        self.init_motion_gate()
+        self.init_tracker()
         self.connect_arduino()
+        self.init_gate()
         self.init_camera()
 
         # State variables
         self.plate_buffer = []
         self.last_saved_plate = None
         self.last_entry_time = 0
-        self.entry_count = self.get_entry_count()
         self.running = False
 
         self.logger.info("System initialization complete")
@@ -59,28 +104,83 @@ class PlateRecognitionSystem:
         )
         self.logger = logging.getLogger('PlateRecognition')
 
-    def init_csv(self):
-        """Initialize CSV log file if it doesn't exist."""
-        if not os.path.exists(self.config['csv_file']):
-            try:
-                with open(self.config['csv_file'], 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['no', 'entry_time', 'exit_time', 'car_plate', 'due_payment', 'payment_status'])
-                self.logger.info(f"Created new log file: {self.config['csv_file']}")
-            except IOError as e:
-                self.logger.error(f"Failed to create CSV file: {e}")
-                raise
+    def init_profiler(self):
+        """Set up stage spans (a no-op unless profiling was asked for)."""
+        self.profiler = create_profiler(
+            'main', self.config['profile'], self.config['profile_dir'], self.config['profile_seconds'],
+            self.config['profile_vehicles'], self.config['profile_cprofile'], self.logger
+        )
+
+    def init_session_log(self):
+        """Open the session log, importing the legacy CSV log the first time."""
+        self.sessions = SessionLog(self.config['session_log'], logger=self.logger)
+        legacy = self.config['csv_file']
+        if os.path.exists(legacy) and not self.sessions.entry_count:
+            rows = migrate_csv(legacy, self.sessions)
+            self.logger.info(f"Migrated {rows} entries from {legacy} to {self.config['session_log']}")
+        self.logger.info(f"Session log: {self.sessions.entry_count} entries, "
+                         f"{len(self.sessions.open)} open sessions")
 
     def load_model(self):
         """Load the YOLO model for plate detection."""
         try:
-            self.logger.info(f"Loading model from {self.config['model_path']}")
-            self.model = YOLO(self.config['model_path'])
+            self.logger.info(f"Loading {self.config['backend']} model from {self.config['model_path']}")
+            self.model = create_detector(self.config['backend'], self.config['model_path'])
             self.logger.info("Model loaded successfully")
         except Exception as e:
             self.logger.error(f"Failed to load model: {e}")
             raise
 
+    def init_ocr(self):
+        """Start the pool of long-lived OCR workers."""
+        self.ocr = create_ocr_engine(self.config['tesseract_config'], self.config['ocr_pool_size'],
+                                     self.config['ocr_engine'], self.config['ocr_model'])
+        self.logger.info(f"OCR engine: {type(self.ocr).__name__} with {self.ocr.workers} workers")
+
+    def init_preprocessor(self):
+        """Set up the plate preprocessing strategy (see plate_preprocess.STRATEGIES)."""
+        self.preprocessor = PlatePreprocessor(self.config['preprocess_strategy'], self.config['plate_height'])
+        self.logger.info(f"Plate preprocessing: {self.config['preprocess_strategy']}, "
+                         f"{self.config['plate_height']}px high")
+        if self.ocr.preprocess and self.ocr.preprocess != self.config['preprocess_strategy']:
+            self.logger.warning(f"The OCR model was trained on '{self.ocr.preprocess}' crops; "
+                                f"run with --preprocess {self.ocr.preprocess}")
+
+    def init_motion_gate(self):
+        """Set up the scene-change gate that skips inference on unchanged frames."""
+        self.motion_gate = None
+        if self.config['motion_gate']:
+            self.motion_gate = SceneChangeGate(
+                pixel_threshold=self.config['motion_pixel_threshold'],
+                changed_fraction=self.config['motion_changed_fraction'],
+                max_skip_seconds=self.config['motion_max_skip']
+            )
+
+    def init_tracker(self):
+        """Set up the plate tracker so OCR runs per vehicle track instead of per frame."""
+        self.tracker = PlateTracker(
+            iou_threshold=self.config['track_iou_threshold'],
+            max_missed=self.config['track_max_missed'],
+            sample_frames=self.config['track_sample_frames'],
+            crops_per_round=self.config['track_crops_per_round'],
+            max_rounds=self.config['track_max_rounds']
+        )
+
+    def scene_changed(self, frame):
+        """Return True if detection should run on this frame."""
+        return self.motion_gate is None or self.motion_gate.should_run(frame)
+
+    def should_detect(self, frame, distance):
+        """Count a captured frame and return True if a vehicle is in range and the scene changed."""
+        FRAMES_CAPTURED.labels(lane=self.config['lane']).inc()
+        if distance > self.config['detection_distance']:
+            FRAMES_SKIPPED.labels(lane=self.config['lane'], reason='out_of_range').inc()
+            return False
+        if not self.scene_changed(frame):
+            FRAMES_SKIPPED.labels(lane=self.config['lane'], reason='unchanged').inc()
+            return False
+        return True
+
     def detect_arduino_port(self):
         """Auto-detect Arduino serial port based on the operating system."""
         ports = list(serial.tools.list_ports.comports())
@@ -123,6 +223,12 @@ class PlateRecognitionSystem:
             self.logger.error(f"Failed to connect to Arduino: {e}")
             self.logger.warning("Running in simulation mode")
 
+    def init_gate(self):
+        """Start the gate controller (simulated when no Arduino is connected)."""
+        self.gate = GateController(
+            self.arduino, hold_time=self.config['gate_open_duration'], logger=self.logger
+        )
+
     def init_camera(self):
         """Initialize the webcam for video capture."""
         try:
@@ -165,27 +271,12 @@ class PlateRecognitionSystem:
         return random.choice([random.randint(10, 40)] + [random.randint(60, 150)] * 10)
 
     def control_gate(self, open_gate=True):
-        """Control the gate via Arduino."""
-        if not self.arduino or not self.arduino.is_open:
-            self.logger.info(f"Gate {'opening' if open_gate else 'closing'} (SIMULATED)")
-            return
-
-        try:
-            command = b'1' if open_gate else b'0'
-            self.arduino.write(command)
-            state = "Opening" if open_gate else "Closing"
-            self.logger.info(f"Gate {state.lower()} (sent '{command.decode()}')")
-
+        """Control the gate via the shared non-blocking gate controller."""
+        with self.profiler.span('control_gate', open=open_gate):
             if open_gate:
-                # Start a timer to close the gate after the configured duration
-                threading.Timer(
-                    self.config['gate_open_duration'],
-                    self.control_gate,
-                    [False]
-                ).start()
-
-        except serial.SerialException as e:
-            self.logger.error(f"Failed to control gate: {e}")
+                self.gate.open()
+            else:
+                self.gate.close()
 
     def process_plate_image(self, plate_img):
         """Process the plate image for better OCR accuracy."""
@@ -194,21 +285,8 @@ class PlateRecognitionSystem:
             return None
 
         try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
-
-            # Apply adaptive thresholding
-            thresh = cv2.adaptiveThreshold(
-                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY_INV, 11, 2
-            )
-
-            # Noise removal
-            kernel = np.ones((1, 1), np.uint8)
-            thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
-            thresh = cv2.medianBlur(thresh, 3)
-
-            return thresh
+            # Normalize the crop height and binarize in reused buffers
+            return self.preprocessor(plate_img)
         except Exception as e:
             self.logger.error(f"Error processing plate image: {e}")
             return None
@@ -219,15 +297,7 @@ class PlateRecognitionSystem:
             return None
 
         try:
-            # Get OCR options from config
-            config = self.config['tesseract_config']
-
-            # Run OCR
-            plate_text = pytesseract.image_to_string(
-                processed_img, config=config
-            ).strip().replace(" ", "")
-
-            return plate_text
+            return self.ocr.recognize(processed_img)
         except Exception as e:
             self.logger.error(f"OCR error: {e}")
             return None
@@ -250,23 +320,14 @@ class PlateRecognitionSystem:
         return None
 
     def save_plate_entry(self, plate_number):
-        """Save plate entry to CSV file."""
+        """Append a plate entry to the session log."""
         try:
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-            with open(self.config['csv_file'], 'a', newline='') as f:
-                writer = csv.writer(f)
-                self.entry_count += 1
-                writer.writerow([
-                    self.entry_count,
-                    current_time,
-                    '',  # exit_time (blank for now)
-                    plate_number,
-                    '',  # due_payment (blank for now)
-                    0  # payment_status (0 = unpaid)
-                ])
-
-            self.logger.info(f"Recorded entry for plate {plate_number}")
+            open_session = self.sessions.get_open(plate_number)
+            if open_session:
+                self.logger.info(f"Plate {plate_number} re-entering; entry {open_session['no']} was never closed")
+
+            entry_no = self.sessions.add_entry(plate_number)
+            self.logger.info(f"Recorded entry {entry_no} for plate {plate_number}")
 
             # Save plate image if configured
             if self.config['save_plate_images']:
@@ -275,17 +336,42 @@ class PlateRecognitionSystem:
                 self.logger.debug(f"Saved plate image to {filename}")
 
             return True
-        except IOError as e:
+        except (IOError, ValueError) as e:
             self.logger.error(f"Failed to save plate entry: {e}")
             return False
 
-    def get_entry_count(self):
-        """Get the current entry count from the CSV file."""
+    def detect_plates(self, frame):
+        """Run plate detection and return the result with the plate boxes."""
+        with self.profiler.span('detect'):
+            result = self.model.detect(frame)
+        return result, result.boxes
+
+    def read_plates(self, crops):
+        """Preprocess, OCR and validate the plate crops of one frame.
+
+        OCR for all crops runs in parallel on the engine's worker pool.
+        Returns a list of (valid_plate, plate_img, processed_img) for every crop.
+        """
+        # Process plate images for OCR
+        with self.profiler.span('preprocess', crops=len(crops)):
+            processed = [self.process_plate_image(plate_img) for plate_img in crops]
+        pending = [img for img in processed if img is not None]
+
+        # Extract text with OCR
         try:
-            with open(self.config['csv_file'], 'r') as f:
-                return sum(1 for _ in f) - 1  # Subtract header row
-        except IOError:
-            return 0
+            with self.profiler.span('ocr', crops=len(pending)):
+                texts = iter(self.ocr.recognize_many(pending))
+        except Exception as e:
+            self.logger.error(f"OCR error: {e}")
+            texts = iter([None] * len(pending))
+
+        reads = []
+        with self.profiler.span('validate'):
+            for plate_img, processed_img in zip(crops, processed):
+                plate_text = next(texts) if processed_img is not None else None
+                # Validate plate format
+                reads.append((self.validate_plate(plate_text), plate_img, processed_img))
+        return reads
 
     def process_frame(self, frame):
         """Process a single frame for plate detection."""
@@ -295,80 +381,85 @@ class PlateRecognitionSystem:
 
         try:
             # Get distance from sensor
-            distance = self.read_distance()
+            with self.profiler.span('read_distance'):
+                distance = self.read_distance()
             self.logger.debug(f"Current distance: {distance}cm")
 
-            # Only process if vehicle is close enough
-            if distance <= self.config['detection_distance']:
-                # Run object detection
-                results = self.model(frame)
-
-                # Process detection results
-                for result in results:
-                    for box in result.boxes:
-                        # Extract box coordinates
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-
-                        # Extract plate image
-                        plate_img = frame[y1:y2, x1:x2]
-                        self.current_plate_img = plate_img.copy()
-
-                        # Process plate image for OCR
-                        processed_img = self.process_plate_image(plate_img)
-                        if processed_img is None:
-                            continue
-
-                        # Extract text with OCR
-                        plate_text = self.extract_plate_text(processed_img)
-                        if not plate_text:
-                            continue
-
-                        # Validate plate format
-                        valid_plate = self.validate_plate(plate_text)
-                        if valid_plate:
-                            self.handle_valid_plate(valid_plate)
-
-                            # Display plate images if in debug mode
-                            if self.config['debug_mode']:
-                                cv2.imshow("Plate", plate_img)
-                                cv2.imshow("Processed", processed_img)
-
-                # Return annotated frame
-                return results[0].plot()
-
-            # Return original frame if no vehicle detected
-            return frame
+            # Only process if vehicle is close enough and the scene has changed
+            annotated = frame
+            detected = self.should_detect(frame, distance)
+            if detected:
+                # Run object detection and follow each plate across frames
+                result, boxes = self.detect_plates(frame)
+                with self.profiler.span('track', boxes=len(boxes)):
+                    self.tracker.update(frame, boxes)
+                annotated = result.plot()
+
+            # OCR only the best crops of tracks that are ready
+            for track, crops in self.tracker.ocr_batches(flush=not detected):
+                for valid_plate, plate_img, processed_img in self.read_plates(crops):
+                    self.current_plate_img = plate_img
+
+                    if valid_plate:
+                        with self.profiler.span('handle_valid_plate', plate=valid_plate):
+                            self.handle_valid_plate(valid_plate, track)
+
+                        # Display plate images if in debug mode
+                        if self.config['debug_mode']:
+                            cv2.imshow("Plate", plate_img)
+                            cv2.imshow("Processed", processed_img)
+
+            # Return annotated frame (original frame if no vehicle detected)
+            return annotated
 
         except Exception as e:
             self.logger.error(f"Error processing frame: {e}")
             return frame
 
-    def handle_valid_plate(self, plate_number):
-        """Handle a validated license plate."""
-        # Add to detection buffer
-        self.plate_buffer.append(plate_number)
+    def handle_valid_plate(self, plate_number, track=None):
+        """Handle a validated license plate.
 
+        Reads are buffered per track when one is given, so plates from
+        adjacent vehicles never vote in the same consensus.
+        """
+        # Add to detection buffer
+        if track is not None:
+            buffer = track.add_read(plate_number)
+        else:
+            self.plate_buffer.append(plate_number)
+            buffer = self.plate_buffer
+        self.decide_plate(buffer, track)
+
+    def decide_plate(self, buffer, track=None):
+        """Vote on the reads collected so far and act on a strong consensus."""
         # Decision after collecting enough samples
-        if len(self.plate_buffer) >= self.config['min_plate_detections']:
+        if len(buffer) >= self.config['min_plate_detections']:
             # Get most common plate from buffer (consensus)
-            plate_counts = Counter(self.plate_buffer)
+            plate_counts = Counter(buffer)
             most_common = plate_counts.most_common(1)[0][0]
             most_common_count = plate_counts.most_common(1)[0][1]
 
             # Check if we have a strong consensus
-            buffer_size = len(self.plate_buffer)
+            buffer_size = len(buffer)
             consensus_ratio = most_common_count / buffer_size
 
             if consensus_ratio >= self.config['min_consensus_ratio']:
+                CONSENSUS_OUTCOMES.labels(lane=self.config['lane'], outcome='accepted').inc()
                 self.logger.info(f"Strong consensus ({consensus_ratio:.2f}) for plate {most_common}")
+                if track is not None:
+                    # No more OCR for this vehicle
+                    track.decide(most_common)
+                    self.logger.info(f"Track {track.id} decided after {track.ocr_calls} OCR calls")
                 current_time = time.time()
 
                 # Check for duplicate entry within cooldown period
                 if (most_common != self.last_saved_plate or
                         (current_time - self.last_entry_time) > self.config['entry_cooldown']):
 
-                    # Save plate entry to CSV
-                    if self.save_plate_entry(most_common):
+                    # Save plate entry to the session log
+                    with self.profiler.span('save_plate_entry', plate=most_common):
+                        saved = self.save_plate_entry(most_common)
+                    if saved:
                         # Open gate
                         self.control_gate(open_gate=True)
 
@@ -378,30 +469,39 @@ class PlateRecognitionSystem:
                 else:
                     self.logger.info(f"Skipped duplicate entry for {most_common} within cooldown period")
             else:
+                CONSENSUS_OUTCOMES.labels(lane=self.config['lane'], outcome='weak').inc()
                 self.logger.warning(f"Weak consensus ({consensus_ratio:.2f}) for {most_common}, ignoring")
 
-            # Clear buffer after processing
-            self.plate_buffer.clear()
+            # Clear buffer after processing (the track's own, not the snapshot)
+            if track is not None:
+                track.clear_reads()
+            else:
+                buffer.clear()
+            self.profiler.vehicle_done()
 
     def run(self):
         """Main processing loop."""
         self.logger.info("Starting plate recognition system")
         self.running = True
+        self.profiler.start()
 
         try:
             while self.running:
                 # Capture frame
-                ret, frame = self.cap.read()
+                with self.profiler.span('capture'):
+                    ret, frame = self.cap.read()
                 if not ret:
                     self.logger.warning("Failed to capture frame")
                     time.sleep(0.1)
                     continue
 
                 # Process the frame
-                processed_frame = self.process_frame(frame)
+                with self.profiler.span('process_frame'):
+                    processed_frame = self.process_frame(frame)
 
                 # Display frame
-                cv2.imshow('Plate Recognition System', processed_frame)
+                with self.profiler.span('display'):
+                    cv2.imshow('Plate Recognition System', processed_frame)
 
                 # Check for exit command
                 key = cv2.waitKey(1) & 0xFF
@@ -416,22 +516,150 @@ class PlateRecognitionSystem:
         finally:
             self.cleanup()
 
+    def capture_stage(self):
+        """Pipeline source: grab a frame and the distance reading that goes with it."""
+        with self.profiler.span('capture'):
+            ret, frame = self.cap.read()
+        if not ret or frame is None or frame.size == 0:
+            self.logger.warning("Failed to capture frame")
+            time.sleep(0.1)
+            return None
+
+        self.frame_seq += 1
+        return {
+            'seq': self.frame_seq,
+            'frame': frame,
+            'distance': self.read_distance(),
+            'annotated': frame,
+            'batches': [],
+            'plates': []
+        }
+
+    def detect_stage(self, packet):
+        """Pipeline stage: run detection and tracking when a vehicle is in range."""
+        detected = self.should_detect(packet['frame'], packet['distance'])
+        if detected:
+            result, boxes = self.detect_plates(packet['frame'])
+            with self.profiler.span('track', boxes=len(boxes)):
+                self.tracker.update(packet['frame'], boxes)
+            packet['annotated'] = result.plot()
+        packet['batches'] = self.tracker.ocr_batches(flush=not detected)
+        return packet
+
+    def ocr_stage(self, packet):
+        """Pipeline stage: OCR and validate the crops released by the tracker."""
+        for track, crops in packet['batches']:
+            packet['plates'].extend(
+                (track, read) for read in self.read_plates(crops) if read[0])
+        return packet
+
+    def decide_stage(self, packet):
+        """Pipeline sink: consensus, actuation and display on the main thread.
+
+        OCR workers can finish out of order. The reads of a stale packet are
+        still merged into their tracks, since the tracker has already spent an
+        OCR round on them, but the vote and any gate action wait for the next
+        in-order packet and the stale frame is never shown.
+        """
+        if packet['seq'] < self.last_decided_seq:
+            for track, (valid_plate, _, _) in packet['plates']:
+                track.add_read(valid_plate)
+                self.late_tracks.add(track)
+            return
+        self.last_decided_seq = packet['seq']
+
+        voted = set()
+        for track, (valid_plate, plate_img, processed_img) in packet['plates']:
+            voted.add(track)
+            self.current_plate_img = plate_img
+            with self.profiler.span('handle_valid_plate', plate=valid_plate):
+                self.handle_valid_plate(valid_plate, track)
+
+            if self.config['debug_mode']:
+                cv2.imshow("Plate", plate_img)
+                cv2.imshow("Processed", processed_img)
+
+        # Vote on tracks that only got reads from late packets
+        for track in self.late_tracks - voted:
+            if track.is_decided():
+                track.clear_reads()
+            else:
+                self.decide_plate(track.read_list(), track)
+        self.late_tracks.clear()
+
+        cv2.imshow('Plate Recognition System', packet['annotated'])
+
+    def run_pipelined(self):
+        """Main loop with capture, detection, OCR and decision on separate threads."""
+        self.logger.info("Starting plate recognition system (pipelined)")
+        self.running = True
+        self.profiler.start()
+        self.frame_seq = 0
+        self.last_decided_seq = 0
+        self.late_tracks = set()
+
+        pipeline = StagedPipeline(
+            self.logger,
+            queue_size=self.config['pipeline_queue_size'],
+            stats_interval=self.config['pipeline_stats_interval']
+        )
+        pipeline.add_stage('capture', self.capture_stage)
+        # Packets carrying OCR batches or reads are never dropped: the tracker
+        # has already taken those crops off their tracks
+        pipeline.add_stage('detect', self.detect_stage, keep=lambda packet: packet['batches'])
+        pipeline.add_stage('ocr', self.ocr_stage, workers=self.config['ocr_workers'],
+                           keep=lambda packet: packet['plates'])
+        pipeline.add_sink('decide')
+
+        try:
+            pipeline.start()
+            while self.running:
+                pipeline.consume(self.decide_stage)
+
+                # Check for exit command
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    self.logger.info("Exit requested by user")
+                    break
+
+        except KeyboardInterrupt:
+            self.logger.info("Interrupted by user")
+        except Exception as e:
+            self.logger.error(f"Runtime error: {e}")
+        finally:
+            self.running = False
+            pipeline.stop()
+            self.cleanup()
+
     def cleanup(self):
         """Clean up resources."""
         self.logger.info("Cleaning up resources")
+        self.profiler.close()
 
         if self.cap and self.cap.isOpened():
             self.cap.release()
 
+        if getattr(self, 'gate', None):
+            # Close the gate before exiting
+            self.gate.shutdown()
+            self.logger.info(f"Gate opened {self.gate.opens} times, {self.gate.extensions} hold extensions")
+
         if self.arduino and self.arduino.is_open:
             try:
-                # Close the gate before exiting
-                self.arduino.write(b'0')
                 time.sleep(0.5)
                 self.arduino.close()
             except serial.SerialException as e:
                 self.logger.error(f"Error closing Arduino connection: {e}")
 
+        if getattr(self, 'ocr', None):
+            self.ocr.close()
+
+        if getattr(self, 'motion_gate', None):
+            self.logger.info(f"Motion gate: {self.motion_gate.summary()}")
+
+        if getattr(self, 'sessions', None):
+            self.sessions.close()
+
         cv2.destroyAllWindows()
         self.logger.info("System shutdown complete")
 
@@ -441,7 +669,9 @@ def parse_arguments():
     parser = argparse.ArgumentParser(description='License Plate Recognition System')
 
     parser.add_argument('--model', type=str, default='../model_dev/runs/detect/train/weights/best.pt',
-                        help='Path to the YOLO model')
+                        help='Path to the YOLO model (.pt, or exported .onnx/.xml)')
+    parser.add_argument('--backend', type=str, choices=BACKENDS, default='torch',
+                        help='Inference backend for plate detection')
     parser.add_argument('--camera', type=int, default=0,
                         help='Camera device index')
     parser.add_argument('--arduino', action='store_true', default=True,
@@ -450,6 +680,24 @@ def parse_arguments():
                         help='Enable debug mode')
     parser.add_argument('--save-images', action='store_true',
                         help='Save detected plate images')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Run capture, detection, OCR and decision as pipelined threads')
+    parser.add_argument('--ocr-workers', type=int, default=2,
+                        help='Number of OCR stage threads in pipelined mode')
+    parser.add_argument('--no-motion-gate', action='store_true',
+                        help='Run detection on every in-range frame, even if the scene is unchanged')
+    parser.add_argument('--ocr-pool', type=int, default=2,
+                        help='Number of long-lived Tesseract instances')
+    parser.add_argument('--ocr-engine', type=str, choices=OCR_ENGINES, default='tesseract',
+                        help='Plate text recognizer: Tesseract, or the CRNN from train_recognizer.py')
+    parser.add_argument('--ocr-model', type=str, default=DEFAULT_RECOGNIZER,
+                        help='Path to the exported CRNN (.onnx) for --ocr-engine crnn')
+    parser.add_argument('--metrics-port', type=int, default=metrics_port(9101),
+                        help='Local port for the Prometheus /metrics endpoint (0 to disable)')
+    parser.add_argument('--preprocess', type=str, choices=sorted(STRATEGIES),
+                        default=DEFAULT_CONFIG['preprocess_strategy'],
+                        help='Plate preprocessing strategy (benchmark_preprocess.py picks one)')
+    add_profile_arguments(parser)
 
     return parser.parse_args()
 
@@ -460,30 +708,33 @@ def main():
 
     # Configuration
     config = {
+        **DEFAULT_CONFIG,
         'model_path': args.model,
+        'backend': args.backend,
         'camera_device': args.camera,
-        'camera_width': 1280,
-        'camera_height': 720,
         'use_arduino': args.arduino,
         'debug_mode': args.debug,
         'save_plate_images': args.save_images,
-
-        'save_dir': 'plates',
-        'csv_file': 'db.csv',
-        'log_file': 'logs/plate_recognition.log',
-
-        'detection_distance': 50,  # cm
-        'entry_cooldown': 300,  # seconds (5 minutes)
-        'gate_open_duration': 15,  # seconds
-        'min_plate_detections': 3,
-        'min_consensus_ratio': 0.7,
-        'plate_regex': r'(RA[A-Z]\d{3}[A-Z])',  # Regex for plates starting with RA + letter + 3 digits + letter  # Adjust pattern for your plates
-        'tesseract_config': '--psm 8 --oem 3 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+        'ocr_workers': args.ocr_workers,
+        'ocr_pool_size': args.ocr_pool,
+        'ocr_engine': args.ocr_engine,
+        'ocr_model': args.ocr_model,
+        'motion_gate': not args.no_motion_gate,
+        'preprocess_strategy': args.preprocess,
+        'profile': args.profile,
+        'profile_dir': args.profile_dir,
+        'profile_seconds': args.profile_seconds,
+        'profile_vehicles': args.profile_vehicles,
+        'profile_cprofile': args.profile_cprofile
     }
 
     # Create and run the system
     system = PlateRecognitionSystem(config)
-    system.run()
+    start_metrics_server(args.metrics_port)
+    if args.pipeline:
+        system.run_pipelined()
+    else:
+        system.run()
 
 
 if __name__ == "__main__":
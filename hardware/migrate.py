@@ -0,0 +1,81 @@
+import argparse
+import os
+import re
+
+from database import ParkingDatabase
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_PATTERN = re.compile(r'^(\d{4})_(\w+)\.sql$')
+LOCK_ID = 7261  # pg_advisory lock key so two processes never migrate at once
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """Return (version, name, path) for every migration file, in order."""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_PATTERN.match(filename)
+        if match:
+            migrations.append((match.group(1), match.group(2), os.path.join(directory, filename)))
+    return migrations
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(16) PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+def applied_versions(cursor):
+    ensure_migrations_table(cursor)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migrations(cursor, directory=MIGRATIONS_DIR):
+    """Apply pending migrations on the given cursor's transaction. Returns the versions applied."""
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_ID,))
+    done = applied_versions(cursor)
+    applied = []
+    for version, name, path in list_migrations(directory):
+        if version in done:
+            continue
+        with open(path) as f:
+            cursor.execute(f.read())
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name)
+        )
+        applied.append(version)
+        print(f"[MIGRATE] Applied {version}_{name}")
+    return applied
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Apply database schema migrations')
+    parser.add_argument('--status', action='store_true',
+                        help='List migrations and whether they are applied, without applying')
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_arguments()
+    db = ParkingDatabase(maxconn=1)
+
+    with db.transaction() as cursor:
+        if args.status:
+            done = applied_versions(cursor)
+            for version, name, _ in list_migrations():
+                print(f"[{'x' if version in done else ' '}] {version}_{name}")
+            return
+
+        applied = apply_migrations(cursor)
+    print(f"[MIGRATE] {len(applied)} migration(s) applied" if applied else "[MIGRATE] Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+-- Base table used by the entry/exit lanes, the payment terminal and the API.
+-- IF NOT EXISTS so databases created before migrations were introduced are adopted as-is.
+CREATE TABLE IF NOT EXISTS parking_records (
+    id SERIAL PRIMARY KEY,
+    entry_time TIMESTAMP,
+    exit_time TIMESTAMP,
+    car_plate VARCHAR(20) NOT NULL,
+    due_payment NUMERIC(10, 2) DEFAULT 0,
+    payment_status SMALLINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,32 @@
+-- Partial indexes matched to the exact predicates in database.py.
+-- Open sessions are a tiny fraction of the table, so these stay small and hot.
+
+-- has_unpaid_record, get_unpaid_record, update_payment_status
+CREATE INDEX IF NOT EXISTS parking_records_open_unpaid_idx
+    ON parking_records (car_plate, entry_time DESC)
+    WHERE payment_status = 0 AND exit_time IS NULL;
+
+-- get_paid_record, record_exit
+CREATE INDEX IF NOT EXISTS parking_records_open_paid_idx
+    ON parking_records (car_plate, entry_time DESC)
+    WHERE payment_status = 1 AND exit_time IS NULL;
+
+-- Dashboard: check-ins ordered by entry_time
+CREATE INDEX IF NOT EXISTS parking_records_entry_time_idx
+    ON parking_records (entry_time DESC)
+    WHERE entry_time IS NOT NULL;
+
+-- Dashboard: check-outs ordered by exit_time
+CREATE INDEX IF NOT EXISTS parking_records_exit_time_idx
+    ON parking_records (exit_time DESC)
+    WHERE exit_time IS NOT NULL;
+
+-- Dashboard: payments ordered by created_at
+CREATE INDEX IF NOT EXISTS parking_records_payments_idx
+    ON parking_records (created_at DESC)
+    WHERE payment_status = 1;
+
+-- Dashboard: unauthorized exits ordered by created_at
+CREATE INDEX IF NOT EXISTS parking_records_alerts_idx
+    ON parking_records (created_at DESC)
+    WHERE payment_status = 0 AND exit_time IS NOT NULL;
@@ -0,0 +1,46 @@
+-- Keyset pagination for the per-type log endpoints.
+-- Each log is ordered by (timestamp, id) so the cursor is unique; the
+-- car_plate-leading variants serve the plate filter without walking the
+-- whole history. The (timestamp, id) indexes also cover the get_all_*
+-- queries, so the single-column ones from 0002 are replaced.
+
+DROP INDEX IF EXISTS parking_records_entry_time_idx;
+DROP INDEX IF EXISTS parking_records_exit_time_idx;
+DROP INDEX IF EXISTS parking_records_payments_idx;
+DROP INDEX IF EXISTS parking_records_alerts_idx;
+
+-- Check-ins
+CREATE INDEX IF NOT EXISTS parking_records_entries_keyset_idx
+    ON parking_records (entry_time DESC, id DESC)
+    WHERE entry_time IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS parking_records_entries_plate_idx
+    ON parking_records (car_plate, entry_time DESC, id DESC)
+    WHERE entry_time IS NOT NULL;
+
+-- Check-outs
+CREATE INDEX IF NOT EXISTS parking_records_exits_keyset_idx
+    ON parking_records (exit_time DESC, id DESC)
+    WHERE exit_time IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS parking_records_exits_plate_idx
+    ON parking_records (car_plate, exit_time DESC, id DESC)
+    WHERE exit_time IS NOT NULL;
+
+-- Payments
+CREATE INDEX IF NOT EXISTS parking_records_payments_keyset_idx
+    ON parking_records (created_at DESC, id DESC)
+    WHERE payment_status = 1;
+
+CREATE INDEX IF NOT EXISTS parking_records_payments_plate_idx
+    ON parking_records (car_plate, created_at DESC, id DESC)
+    WHERE payment_status = 1;
+
+-- Unauthorized exits
+CREATE INDEX IF NOT EXISTS parking_records_alerts_keyset_idx
+    ON parking_records (created_at DESC, id DESC)
+    WHERE payment_status = 0 AND exit_time IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS parking_records_alerts_plate_idx
+    ON parking_records (car_plate, created_at DESC, id DESC)
+    WHERE payment_status = 0 AND exit_time IS NOT NULL;
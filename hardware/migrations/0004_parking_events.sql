@@ -0,0 +1,47 @@
+-- Change feed for the dashboard: one row per check-in, check-out, payment
+-- and unauthorized exit, written by a trigger so every writer is covered.
+-- The BIGSERIAL id is the SSE event id clients resume from.
+
+CREATE TABLE IF NOT EXISTS parking_events (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR(16) NOT NULL,
+    record_id INTEGER NOT NULL,
+    car_plate VARCHAR(20),
+    occurred_at TIMESTAMP NOT NULL,
+    amount NUMERIC(10, 2),
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION record_parking_event() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.entry_time IS NOT NULL THEN
+            INSERT INTO parking_events (kind, record_id, car_plate, occurred_at)
+            VALUES ('checkin', NEW.id, NEW.car_plate, NEW.entry_time);
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    -- Timestamps match the ones the log endpoints order by
+    IF NEW.payment_status = 1 AND OLD.payment_status IS DISTINCT FROM 1 THEN
+        INSERT INTO parking_events (kind, record_id, car_plate, occurred_at, amount)
+        VALUES ('payment', NEW.id, NEW.car_plate, NEW.created_at, NEW.due_payment);
+    END IF;
+
+    IF NEW.exit_time IS NOT NULL AND OLD.exit_time IS NULL THEN
+        INSERT INTO parking_events (kind, record_id, car_plate, occurred_at)
+        VALUES ('checkout', NEW.id, NEW.car_plate, NEW.exit_time);
+
+        IF NEW.payment_status = 0 THEN
+            INSERT INTO parking_events (kind, record_id, car_plate, occurred_at)
+            VALUES ('alert', NEW.id, NEW.car_plate, NEW.created_at);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS parking_records_events ON parking_records;
+CREATE TRIGGER parking_records_events
+    AFTER INSERT OR UPDATE ON parking_records
+    FOR EACH ROW EXECUTE FUNCTION record_parking_event();
@@ -0,0 +1,16 @@
+-- Announce every write to parking_records on the parking_records_changed
+-- channel. Statement-level, so a bulk update sends one notification, and
+-- Postgres folds identical payloads within a transaction. The payload is
+-- the operation; DELETE and TRUNCATE tell caches to reload.
+
+CREATE OR REPLACE FUNCTION notify_parking_records_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('parking_records_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS parking_records_notify ON parking_records;
+CREATE TRIGGER parking_records_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON parking_records
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_parking_records_change();
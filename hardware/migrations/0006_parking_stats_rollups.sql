@@ -0,0 +1,151 @@
+-- Hourly and daily occupancy / dwell / revenue / unauthorized-exit rollups
+-- per lot, maintained by a trigger on every entry, exit and payment so the
+-- stats endpoints read a handful of buckets instead of scanning history.
+
+-- Block writers while the rollups are backfilled so nothing is counted twice
+LOCK TABLE parking_records IN SHARE ROW EXCLUSIVE MODE;
+
+ALTER TABLE parking_records ADD COLUMN IF NOT EXISTS lot_id VARCHAR(32) NOT NULL DEFAULT 'main';
+
+CREATE TABLE IF NOT EXISTS parking_lot_occupancy (
+    lot_id VARCHAR(32) PRIMARY KEY,
+    occupancy INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS parking_stats_hourly (
+    lot_id VARCHAR(32) NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    entries INTEGER NOT NULL DEFAULT 0,
+    exits INTEGER NOT NULL DEFAULT 0,
+    unauthorized_exits INTEGER NOT NULL DEFAULT 0,
+    dwell_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,  -- summed over exits in the bucket
+    payments INTEGER NOT NULL DEFAULT 0,
+    revenue NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    occupancy INTEGER NOT NULL DEFAULT 0,  -- cars inside after the bucket's last change
+    peak_occupancy INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (lot_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS parking_stats_daily (LIKE parking_stats_hourly INCLUDING ALL);
+
+CREATE INDEX IF NOT EXISTS parking_stats_hourly_bucket_idx ON parking_stats_hourly (bucket);
+CREATE INDEX IF NOT EXISTS parking_stats_daily_bucket_idx ON parking_stats_daily (bucket);
+
+CREATE OR REPLACE FUNCTION bump_parking_stats(
+    p_lot_id VARCHAR, p_time TIMESTAMP, p_occupancy_change INTEGER,
+    p_entries INTEGER, p_exits INTEGER, p_unauthorized INTEGER,
+    p_dwell_seconds DOUBLE PRECISION, p_payments INTEGER, p_revenue NUMERIC
+) RETURNS void AS $$
+DECLARE
+    current_occupancy INTEGER;
+BEGIN
+    INSERT INTO parking_lot_occupancy AS o (lot_id, occupancy)
+    VALUES (p_lot_id, GREATEST(p_occupancy_change, 0))
+    ON CONFLICT (lot_id) DO UPDATE SET occupancy = GREATEST(o.occupancy + p_occupancy_change, 0)
+    RETURNING occupancy INTO current_occupancy;
+
+    INSERT INTO parking_stats_hourly AS s (lot_id, bucket, entries, exits, unauthorized_exits,
+                                           dwell_seconds, payments, revenue, occupancy, peak_occupancy)
+    VALUES (p_lot_id, date_trunc('hour', p_time), p_entries, p_exits, p_unauthorized,
+            p_dwell_seconds, p_payments, p_revenue, current_occupancy, current_occupancy)
+    ON CONFLICT (lot_id, bucket) DO UPDATE SET
+        entries = s.entries + EXCLUDED.entries,
+        exits = s.exits + EXCLUDED.exits,
+        unauthorized_exits = s.unauthorized_exits + EXCLUDED.unauthorized_exits,
+        dwell_seconds = s.dwell_seconds + EXCLUDED.dwell_seconds,
+        payments = s.payments + EXCLUDED.payments,
+        revenue = s.revenue + EXCLUDED.revenue,
+        occupancy = EXCLUDED.occupancy,
+        peak_occupancy = GREATEST(s.peak_occupancy, EXCLUDED.peak_occupancy);
+
+    INSERT INTO parking_stats_daily AS s (lot_id, bucket, entries, exits, unauthorized_exits,
+                                          dwell_seconds, payments, revenue, occupancy, peak_occupancy)
+    VALUES (p_lot_id, date_trunc('day', p_time), p_entries, p_exits, p_unauthorized,
+            p_dwell_seconds, p_payments, p_revenue, current_occupancy, current_occupancy)
+    ON CONFLICT (lot_id, bucket) DO UPDATE SET
+        entries = s.entries + EXCLUDED.entries,
+        exits = s.exits + EXCLUDED.exits,
+        unauthorized_exits = s.unauthorized_exits + EXCLUDED.unauthorized_exits,
+        dwell_seconds = s.dwell_seconds + EXCLUDED.dwell_seconds,
+        payments = s.payments + EXCLUDED.payments,
+        revenue = s.revenue + EXCLUDED.revenue,
+        occupancy = EXCLUDED.occupancy,
+        peak_occupancy = GREATEST(s.peak_occupancy, EXCLUDED.peak_occupancy);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_parking_stats() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.entry_time IS NOT NULL THEN
+            PERFORM bump_parking_stats(NEW.lot_id, NEW.entry_time, 1, 1, 0, 0, 0, 0, 0);
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    -- Revenue is booked when the payment is made
+    IF NEW.payment_status = 1 AND OLD.payment_status IS DISTINCT FROM 1 THEN
+        PERFORM bump_parking_stats(NEW.lot_id, LOCALTIMESTAMP, 0, 0, 0, 0, 0, 1, NEW.due_payment);
+    END IF;
+
+    IF NEW.exit_time IS NOT NULL AND OLD.exit_time IS NULL THEN
+        PERFORM bump_parking_stats(
+            NEW.lot_id, NEW.exit_time, -1, 0, 1,
+            CASE WHEN NEW.payment_status = 0 THEN 1 ELSE 0 END,
+            COALESCE(EXTRACT(EPOCH FROM NEW.exit_time - NEW.entry_time), 0), 0, 0
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS parking_records_stats ON parking_records;
+CREATE TRIGGER parking_records_stats
+    AFTER INSERT OR UPDATE ON parking_records
+    FOR EACH ROW EXECUTE FUNCTION update_parking_stats();
+
+-- One-time backfill from history. Payment times were never stored, so past
+-- revenue is booked at the exit (or entry, for cars still inside).
+INSERT INTO parking_stats_hourly (lot_id, bucket, entries, exits, unauthorized_exits,
+                                  dwell_seconds, payments, revenue)
+SELECT lot_id, bucket, SUM(entries), SUM(exits), SUM(unauthorized), SUM(dwell), SUM(payments), SUM(revenue)
+FROM (
+    SELECT lot_id, date_trunc('hour', entry_time) AS bucket,
+           1 AS entries, 0 AS exits, 0 AS unauthorized, 0 AS dwell, 0 AS payments, 0 AS revenue
+    FROM parking_records WHERE entry_time IS NOT NULL
+    UNION ALL
+    SELECT lot_id, date_trunc('hour', exit_time), 0, 1,
+           CASE WHEN payment_status = 0 THEN 1 ELSE 0 END,
+           COALESCE(EXTRACT(EPOCH FROM exit_time - entry_time), 0), 0, 0
+    FROM parking_records WHERE exit_time IS NOT NULL
+    UNION ALL
+    SELECT lot_id, date_trunc('hour', COALESCE(exit_time, entry_time)), 0, 0, 0, 0, 1, due_payment
+    FROM parking_records WHERE payment_status = 1 AND COALESCE(exit_time, entry_time) IS NOT NULL
+) AS changes
+GROUP BY lot_id, bucket
+ON CONFLICT (lot_id, bucket) DO NOTHING;
+
+-- Occupancy after each hour is the running total of entries minus exits
+UPDATE parking_stats_hourly AS s
+SET occupancy = totals.occupancy, peak_occupancy = totals.occupancy
+FROM (
+    SELECT lot_id, bucket,
+           GREATEST(SUM(entries - exits) OVER (PARTITION BY lot_id ORDER BY bucket), 0) AS occupancy
+    FROM parking_stats_hourly
+) AS totals
+WHERE s.lot_id = totals.lot_id AND s.bucket = totals.bucket;
+
+INSERT INTO parking_stats_daily (lot_id, bucket, entries, exits, unauthorized_exits,
+                                 dwell_seconds, payments, revenue, occupancy, peak_occupancy)
+SELECT lot_id, date_trunc('day', bucket), SUM(entries), SUM(exits), SUM(unauthorized_exits),
+       SUM(dwell_seconds), SUM(payments), SUM(revenue),
+       (array_agg(occupancy ORDER BY bucket DESC))[1], MAX(peak_occupancy)
+FROM parking_stats_hourly
+GROUP BY lot_id, date_trunc('day', bucket)
+ON CONFLICT (lot_id, bucket) DO NOTHING;
+
+INSERT INTO parking_lot_occupancy (lot_id, occupancy)
+SELECT lot_id, COUNT(*) FILTER (WHERE exit_time IS NULL AND entry_time IS NOT NULL)
+FROM parking_records
+GROUP BY lot_id
+ON CONFLICT (lot_id) DO NOTHING;
@@ -0,0 +1,20 @@
+-- Append-only audit trail of what each lane saw and did: OCR reads,
+-- consensus, decisions and gate commands. Written in batches by
+-- journal.EventJournal; rows are never updated.
+
+CREATE TABLE IF NOT EXISTS lane_events (
+    id BIGSERIAL PRIMARY KEY,
+    occurred_at TIMESTAMP NOT NULL,
+    lot_id VARCHAR(32) NOT NULL DEFAULT 'main',
+    lane VARCHAR(32),
+    kind VARCHAR(32) NOT NULL,
+    car_plate VARCHAR(20),
+    track_id INTEGER,
+    details JSONB NOT NULL DEFAULT '{}'
+);
+
+-- Audits look at a time window, or at everything that happened to one plate
+CREATE INDEX IF NOT EXISTS lane_events_occurred_at_idx ON lane_events (occurred_at);
+CREATE INDEX IF NOT EXISTS lane_events_plate_idx
+    ON lane_events (car_plate, occurred_at)
+    WHERE car_plate IS NOT NULL;
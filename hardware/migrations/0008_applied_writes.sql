@@ -0,0 +1,17 @@
+-- Idempotency keys of lane writes (entries, payments, exits). A write that
+-- was queued by store_forward.StoreAndForwardDatabase may be replayed more
+-- than once (e.g. the commit succeeded but the acknowledgement was lost);
+-- the key is claimed in the same transaction as the write, so a replay of
+-- an already-applied key is a no-op. record_id is the affected row, or
+-- NULL if the write found nothing to update.
+
+CREATE TABLE IF NOT EXISTS applied_writes (
+    key UUID PRIMARY KEY,
+    op VARCHAR(16) NOT NULL,
+    car_plate VARCHAR(20) NOT NULL,
+    record_id INTEGER,
+    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Old keys are pruned once no queued write can still refer to them
+CREATE INDEX IF NOT EXISTS applied_writes_applied_at_idx ON applied_writes (applied_at);
@@ -0,0 +1,44 @@
+-- Count unauthorized exits from the exit lanes' decisions. A car refused at
+-- the exit never gets an exit_time (RECORD_EXIT_SQL only closes paid
+-- records), so the parking_records trigger from 0006 could never see one.
+-- The lanes journal outcome 'unauthorized' only when the plate has no paid
+-- session; a failed write is journaled as 'error' and is not counted.
+
+CREATE OR REPLACE FUNCTION count_unauthorized_exit() RETURNS trigger AS $$
+DECLARE
+    window_start TIMESTAMP;
+BEGIN
+    IF NEW.car_plate IS NULL OR NEW.details->>'outcome' IS DISTINCT FROM 'unauthorized' THEN
+        RETURN NULL;
+    END IF;
+
+    -- A car refused again (re-read, re-tracked, another exit lane) counts once
+    -- per visit: since its latest entry, or since midnight if it has none
+    SELECT MAX(entry_time) INTO window_start
+    FROM parking_records
+    WHERE car_plate = NEW.car_plate AND lot_id = NEW.lot_id AND entry_time <= NEW.occurred_at;
+    window_start := COALESCE(window_start, date_trunc('day', NEW.occurred_at));
+
+    IF EXISTS (
+        SELECT 1 FROM lane_events
+        WHERE car_plate = NEW.car_plate AND lot_id = NEW.lot_id AND kind = 'exit'
+          AND details->>'outcome' = 'unauthorized'
+          AND occurred_at >= window_start
+          AND (occurred_at < NEW.occurred_at OR (occurred_at = NEW.occurred_at AND id < NEW.id))
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    PERFORM bump_parking_stats(NEW.lot_id, NEW.occurred_at, 0, 0, 0, 1, 0, 0, 0);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS lane_events_unauthorized_exits ON lane_events;
+CREATE TRIGGER lane_events_unauthorized_exits
+    AFTER INSERT ON lane_events
+    FOR EACH ROW WHEN (NEW.kind = 'exit')
+    EXECUTE FUNCTION count_unauthorized_exit();
+
+-- No backfill: earlier journals used 'denied' for both unpaid cars and
+-- failed writes, so they cannot be told apart.
@@ -0,0 +1,70 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class SceneChangeGate:
+    """Cheap scene-change check that decides whether a frame is worth running YOLO on.
+
+    Frames are downscaled to a small blurred grayscale thumbnail and compared
+    against the thumbnail of the last frame that was actually inferred. If too
+    few pixels changed, detection is skipped. A refresh is still forced every
+    `max_skip_seconds` so a slowly changing scene is eventually re-checked.
+    """
+
+    def __init__(self, width=160, pixel_threshold=25, changed_fraction=0.02,
+                 max_skip_seconds=5.0, blur_size=5):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.max_skip_seconds = max_skip_seconds
+        self.blur_size = blur_size
+
+        self.reference = None
+        self.reference_time = 0.0
+
+        # Counters
+        self.frames_seen = 0
+        self.inferences_run = 0
+        self.inferences_skipped = 0
+        self.last_change = 1.0
+
+    def thumbnail(self, frame):
+        """Downscale a BGR frame to a blurred grayscale thumbnail."""
+        height = max(1, int(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (self.blur_size, self.blur_size), 0)
+
+    def should_run(self, frame):
+        """Return True if the scene changed enough since the last inference."""
+        self.frames_seen += 1
+        thumb = self.thumbnail(frame)
+        now = time.monotonic()
+
+        if self.reference is None or self.reference.shape != thumb.shape:
+            changed = True
+            self.last_change = 1.0
+        else:
+            diff = cv2.absdiff(thumb, self.reference)
+            self.last_change = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+            changed = (self.last_change >= self.changed_fraction or
+                       now - self.reference_time >= self.max_skip_seconds)
+
+        if changed:
+            self.reference = thumb
+            self.reference_time = now
+            self.inferences_run += 1
+        else:
+            self.inferences_skipped += 1
+        return changed
+
+    def reset(self):
+        """Forget the reference so the next frame is always inferred."""
+        self.reference = None
+
+    def summary(self):
+        saved = (self.inferences_skipped / self.frames_seen * 100) if self.frames_seen else 0.0
+        return (f"{self.frames_seen} frames, {self.inferences_run} inferences run, "
+                f"{self.inferences_skipped} skipped ({saved:.1f}% saved)")
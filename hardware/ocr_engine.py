@@ -0,0 +1,217 @@
+import queue
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from metrics import counter, histogram
+
+try:
+    import tesserocr
+except ImportError:  # Fall back to the pytesseract CLI wrapper
+    tesserocr = None
+
+PLATE_WHITELIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+DEFAULT_TESSERACT_CONFIG = f'--psm 8 --oem 3 -c tessedit_char_whitelist={PLATE_WHITELIST}'
+
+ENGINES = ('tesseract', 'crnn')
+DEFAULT_ENGINE = 'tesseract'
+
+# Written by train_recognizer.py
+DEFAULT_RECOGNIZER = '../model_dev/runs/recognize/train/weights/crnn.onnx'
+
+OCR_SECONDS = histogram('plate_ocr_seconds', 'OCR time per batch of crops from one vehicle', ['engine'])
+OCR_CROPS = counter('plate_ocr_crops_total', 'Plate crops sent to OCR', ['engine'])
+
+
+def parse_tesseract_config(config):
+    """Split a pytesseract-style config string into (psm, oem, variables)."""
+    psm, oem, variables = 8, 3, {}
+    args = shlex.split(config or '')
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '--psm' and i + 1 < len(args):
+            psm = int(args[i + 1])
+            i += 1
+        elif arg == '--oem' and i + 1 < len(args):
+            oem = int(args[i + 1])
+            i += 1
+        elif arg == '-c' and i + 1 < len(args):
+            key, _, value = args[i + 1].partition('=')
+            variables[key] = value
+            i += 1
+        i += 1
+    return psm, oem, variables
+
+
+def clean_text(text):
+    """Normalize raw OCR output the same way the lane scripts always have."""
+    return (text or '').strip().replace(' ', '')
+
+
+def crnn_input(img, width, height, out):
+    """Write a crop into a (height, width) float32 slot of a CRNN batch, grayscale in [0, 1]."""
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    resized = cv2.resize(img, (width, height), interpolation=cv2.INTER_LINEAR)
+    np.multiply(resized, 1 / 255, out=out, casting='unsafe')
+
+
+def ctc_decode(classes, alphabet):
+    """Greedy CTC decoding of per-column classes: merge repeats, drop blanks (class 0)."""
+    text, previous = [], 0
+    for c in classes:
+        if c != previous and c != 0:
+            text.append(alphabet[c - 1])
+        previous = c
+    return ''.join(text)
+
+
+class OCREngine:
+    """Common interface for plate text recognizers.
+
+    Crops are passed as in-memory numpy arrays (grayscale or BGR).
+    """
+
+    preprocess = None  # strategy the engine was trained on, if it depends on one
+
+    def __init__(self, workers=2):
+        self.workers = max(1, workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr')
+        self.ocr_seconds = OCR_SECONDS.labels(engine=type(self).__name__)
+        self.ocr_crops = OCR_CROPS.labels(engine=type(self).__name__)
+
+    def recognize(self, img):
+        """Return the cleaned text for a single crop ('' if nothing was read)."""
+        raise NotImplementedError
+
+    def recognize_many(self, imgs):
+        """OCR several crops from one frame, preserving order."""
+        self.ocr_crops.inc(len(imgs))
+        with self.ocr_seconds.time():
+            return self.recognize_batch(imgs)
+
+    def recognize_batch(self, imgs):
+        """Run the crops through recognize() in parallel on the worker pool."""
+        if len(imgs) <= 1:
+            return [self.recognize(img) for img in imgs]
+        return list(self.executor.map(self.recognize, imgs))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class TesseractPool(OCREngine):
+    """Pool of long-lived in-process Tesseract instances (via tesserocr).
+
+    Each instance is initialised once with the psm/oem/whitelist settings and
+    reused for every crop, so there is no process spawn or temp file per read.
+    tesserocr releases the GIL while recognising, so crops run truly in parallel.
+    """
+
+    def __init__(self, config=DEFAULT_TESSERACT_CONFIG, workers=2, lang='eng'):
+        super().__init__(workers)
+        psm, oem, variables = parse_tesseract_config(config)
+        self.apis = queue.Queue()
+        for _ in range(self.workers):
+            api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm, oem=oem)
+            for key, value in variables.items():
+                api.SetVariable(key, value)
+            self.apis.put(api)
+
+    def recognize(self, img):
+        if img is None or img.size == 0:
+            return ''
+
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        img = np.ascontiguousarray(img)
+        height, width = img.shape[:2]
+        channels = 1 if img.ndim == 2 else img.shape[2]
+
+        api = self.apis.get()
+        try:
+            api.SetImageBytes(img.tobytes(), width, height, channels, width * channels)
+            return clean_text(api.GetUTF8Text())
+        finally:
+            api.Clear()
+            self.apis.put(api)
+
+    def close(self):
+        super().close()
+        while not self.apis.empty():
+            self.apis.get_nowait().End()
+
+
+class PytesseractEngine(OCREngine):
+    """Fallback engine using the pytesseract CLI wrapper (one process per crop)."""
+
+    def __init__(self, config=DEFAULT_TESSERACT_CONFIG, workers=2):
+        super().__init__(workers)
+        import pytesseract
+        self.pytesseract = pytesseract
+        self.config = config
+
+    def recognize(self, img):
+        if img is None or img.size == 0:
+            return ''
+        return clean_text(self.pytesseract.image_to_string(img, config=self.config))
+
+
+class CRNNEngine(OCREngine):
+    """Plate text model from train_recognizer.py, run in-process by ONNX Runtime on CPU.
+
+    A small CNN + BiLSTM reads the crop, resized to a fixed size, as a
+    sequence of character columns; greedy CTC decoding turns the columns into
+    text. The crops of one vehicle go through the model as a single batch, so
+    recognize_many does not need the thread pool. The alphabet, input size and
+    the preprocessing strategy the model was trained on are read from the
+    model's metadata.
+    """
+
+    def __init__(self, model_path=DEFAULT_RECOGNIZER, threads=1):
+        super().__init__(workers=1)
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.alphabet = metadata.get('alphabet', PLATE_WHITELIST)  # class 0 is the CTC blank
+        self.height = int(metadata.get('height', 32))
+        self.width = int(metadata.get('width', 128))
+        self.preprocess = metadata.get('preprocess')
+
+    def recognize(self, img):
+        return self.recognize_batch([img])[0]
+
+    def recognize_batch(self, imgs):
+        valid = [i for i, img in enumerate(imgs) if img is not None and img.size]
+        texts = [''] * len(imgs)
+        if not valid:
+            return texts
+
+        batch = np.empty((len(valid), 1, self.height, self.width), np.float32)
+        for slot, i in enumerate(valid):
+            crnn_input(imgs[i], self.width, self.height, batch[slot, 0])
+        logits = self.session.run(None, {self.input_name: batch})[0]  # (batch, steps, classes)
+        for i, classes in zip(valid, logits.argmax(axis=2)):
+            texts[i] = ctc_decode(classes, self.alphabet)
+        return texts
+
+
+def create_ocr_engine(config=DEFAULT_TESSERACT_CONFIG, workers=2, engine=DEFAULT_ENGINE,
+                      model_path=DEFAULT_RECOGNIZER):
+    """Build the requested OCR engine; for Tesseract, the fastest available binding."""
+    if engine == 'crnn':
+        return CRNNEngine(model_path)
+    if engine != 'tesseract':
+        raise ValueError(f"Unknown OCR engine: {engine} (expected one of {', '.join(ENGINES)})")
+    if tesserocr is not None:
+        return TesseractPool(config, workers)
+    return PytesseractEngine(config, workers)
@@ -1,8 +1,8 @@
-from database import ParkingDatabase
+from storage import open_database
 from datetime import datetime
 
 # Initialize database
-db = ParkingDatabase()
+db = open_database()
 
 
 def mark_payment_success(plate_number, amount=None):
@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+import queue
+from collections import deque
+
+
+class DropOldestQueue:
+    """Bounded queue that evicts the oldest item instead of blocking the producer.
+
+    Items for which keep(item) is true are never evicted; when only such
+    items are queued, the queue grows past maxsize rather than lose them.
+    """
+
+    def __init__(self, maxsize=2, keep=None):
+        self.maxsize = max(1, maxsize)
+        self.keep = keep
+        self.items = deque()
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+
+    def put(self, item):
+        """Add an item, discarding the oldest one if the queue is full."""
+        with self.lock:
+            if len(self.items) >= self.maxsize:
+                self.evict()
+            self.items.append(item)
+            self.not_empty.notify()
+
+    def evict(self):
+        """Drop the oldest item that may be dropped, if any (lock held)."""
+        for i, queued in enumerate(self.items):
+            if self.keep is None or not self.keep(queued):
+                del self.items[i]
+                self.dropped += 1
+                return
+
+    def get(self, timeout=None):
+        """Remove and return the oldest item, raising queue.Empty on timeout."""
+        with self.not_empty:
+            if not self.not_empty.wait_for(lambda: self.items, timeout):
+                raise queue.Empty
+            return self.items.popleft()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.items)
+
+
+class StageStats:
+    """Throughput and busy-time counters for a single pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.processed = 0
+        self.busy_time = 0.0
+        self.window_processed = 0
+        self.window_start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, elapsed):
+        with self.lock:
+            self.processed += 1
+            self.window_processed += 1
+            self.busy_time += elapsed
+
+    def snapshot(self):
+        """Return (items/sec since last snapshot, avg ms per item, total) and reset the window."""
+        with self.lock:
+            now = time.monotonic()
+            window = max(now - self.window_start, 1e-6)
+            rate = self.window_processed / window
+            avg_ms = (self.busy_time / self.processed * 1000) if self.processed else 0.0
+            self.window_processed = 0
+            self.window_start = now
+            return rate, avg_ms, self.processed
+
+
+class Stage:
+    """One pipeline stage: a function run by one or more worker threads."""
+
+    def __init__(self, name, func, inbox, outbox, workers=1):
+        self.name = name
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.workers = workers
+        self.stats = StageStats(name)
+        self.threads = []
+
+    def start(self, stop_event, logger):
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, args=(stop_event, logger),
+                name=f"{self.name}-{i}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self, stop_event, logger):
+        while not stop_event.is_set():
+            if self.inbox is None:
+                item = None
+            else:
+                try:
+                    item = self.inbox.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+            started = time.perf_counter()
+            try:
+                result = self.func() if self.inbox is None else self.func(item)
+            except Exception as e:
+                logger.error(f"Error in {self.name} stage: {e}")
+                continue
+            self.stats.record(time.perf_counter() - started)
+
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+
+    def join(self, timeout=None):
+        for thread in self.threads:
+            thread.join(timeout)
+
+
+class StagedPipeline:
+    """Chain of stages connected by bounded drop-oldest queues.
+
+    The first stage is a source (called with no arguments); every later stage
+    receives the previous stage's output. The final stage may be a sink that is
+    consumed on the caller's thread so UI and actuation stay on the main thread.
+    """
+
+    def __init__(self, logger=None, queue_size=2, stats_interval=10.0):
+        self.logger = logger or logging.getLogger('Pipeline')
+        self.queue_size = queue_size
+        self.stats_interval = stats_interval
+        self.stages = []
+        self.sink_stats = None
+        self.output = None
+        self.stop_event = threading.Event()
+        self.last_report = time.monotonic()
+
+    def add_stage(self, name, func, workers=1, queue_size=None, keep=None):
+        """Append a threaded stage. The first stage added is the source.
+
+        Outputs for which keep(output) is true are never dropped downstream.
+        """
+        inbox = self.output
+        outbox = DropOldestQueue(queue_size or self.queue_size, keep)
+        self.stages.append(Stage(name, func, inbox, outbox, workers))
+        self.output = outbox
+        return self
+
+    def add_sink(self, name):
+        """Declare the final stage that runs on the caller's thread via consume()."""
+        self.sink_stats = StageStats(name)
+        return self
+
+    def start(self):
+        self.logger.info("Starting pipeline: " + " -> ".join(
+            f"{s.name}x{s.workers}" for s in self.stages))
+        for stage in self.stages:
+            stage.start(self.stop_event, self.logger)
+
+    def consume(self, func, timeout=0.1):
+        """Run the sink function on the next output item. Returns False if none was ready."""
+        try:
+            item = self.output.get(timeout=timeout)
+        except queue.Empty:
+            self.maybe_report()
+            return False
+
+        started = time.perf_counter()
+        func(item)
+        if self.sink_stats:
+            self.sink_stats.record(time.perf_counter() - started)
+        self.maybe_report()
+        return True
+
+    def stop(self, timeout=1.0):
+        self.stop_event.set()
+        for stage in self.stages:
+            stage.join(timeout)
+        self.report()
+
+    def maybe_report(self):
+        if self.stats_interval and time.monotonic() - self.last_report >= self.stats_interval:
+            self.report()
+
+    def report(self):
+        """Log per-stage throughput, latency and queue drops."""
+        self.last_report = time.monotonic()
+        for stage in self.stages:
+            rate, avg_ms, total = stage.stats.snapshot()
+            self.logger.info(
+                f"[{stage.name}] {rate:.1f} items/s, {avg_ms:.1f} ms avg, "
+                f"{total} total, {stage.outbox.dropped} dropped downstream"
+            )
+        if self.sink_stats:
+            rate, avg_ms, total = self.sink_stats.snapshot()
+            self.logger.info(f"[{self.sink_stats.name}] {rate:.1f} items/s, {avg_ms:.1f} ms avg, {total} total")
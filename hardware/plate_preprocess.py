@@ -0,0 +1,134 @@
+import threading
+
+import cv2
+import numpy as np
+
+# Crops are resized to this height (aspect kept) before binarization, so
+# thresholds, kernels and OCR see the same character size whatever the
+# distance to the camera
+PLATE_HEIGHT = 48
+MAX_ASPECT = 8  # wider crops are squeezed to PLATE_HEIGHT * MAX_ASPECT
+
+DEFAULT_STRATEGY = 'otsu'
+
+OPEN_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+
+# name -> func(gray, scratch, out); all three are uint8 arrays of the normalized size
+STRATEGIES = {}
+
+
+def register_strategy(name):
+    """Add a binarization strategy to the registry under the given name."""
+    def register(func):
+        STRATEGIES[name] = func
+        return func
+    return register
+
+
+@register_strategy('gray')
+def gray_only(gray, scratch, out):
+    """No binarization: leave thresholding to the OCR engine."""
+    np.copyto(out, gray)
+
+
+@register_strategy('otsu')
+def gaussian_otsu(gray, scratch, out):
+    """Gaussian blur then a global Otsu threshold (the lane scripts' original method)."""
+    cv2.GaussianBlur(gray, (5, 5), 0, dst=scratch)
+    cv2.threshold(scratch, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=out)
+
+
+@register_strategy('otsu_open')
+def otsu_open(gray, scratch, out):
+    """Otsu, then a 2x2 opening to drop specks left by screws and dirt."""
+    cv2.GaussianBlur(gray, (5, 5), 0, dst=out)
+    cv2.threshold(out, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=scratch)
+    cv2.morphologyEx(scratch, cv2.MORPH_OPEN, OPEN_KERNEL, dst=out)
+
+
+@register_strategy('adaptive')
+def adaptive_median(gray, scratch, out):
+    """Inverted adaptive Gaussian threshold and a 3x3 median (main.py's original method).
+
+    main.py also ran a morphological open with a 1x1 kernel, which leaves the
+    image unchanged; it is not repeated here.
+    """
+    cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2, dst=scratch)
+    cv2.medianBlur(scratch, 3, dst=out)
+
+
+clahe_ops = threading.local()  # cv2.CLAHE objects are not shared between threads
+
+
+@register_strategy('clahe_otsu')
+def clahe_otsu(gray, scratch, out):
+    """Local contrast equalization before Otsu, for shaded or back-lit plates."""
+    if not hasattr(clahe_ops, 'op'):
+        clahe_ops.op = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(2, 8))
+    clahe_ops.op.apply(gray, dst=scratch)
+    cv2.threshold(scratch, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=out)
+
+
+class PlatePreprocessor:
+    """Turns a plate crop into the image handed to OCR.
+
+    The crop is converted to grayscale and resized to a fixed height
+    (bilinear: INTER_AREA costs several times more at the non-integer
+    scales crops come in) in per-thread buffers that are allocated once and
+    reused for every call, then binarized by a registered strategy. The only
+    allocation per crop is the returned image, which the caller owns:
+    several crops of one vehicle are preprocessed before they are OCR'd
+    together, so outputs must not share a buffer.
+    """
+
+    def __init__(self, strategy=DEFAULT_STRATEGY, height=PLATE_HEIGHT, max_aspect=MAX_ASPECT):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown preprocessing strategy '{strategy}'. "
+                             f"Choose from: {', '.join(STRATEGIES)}")
+        self.strategy = strategy
+        self.binarize = STRATEGIES[strategy]
+        self.height = height
+        self.max_width = height * max_aspect
+        self.local = threading.local()
+
+    def buffers(self, crop_pixels):
+        """This thread's (native, gray, scratch) buffers.
+
+        They are flat so any width reshapes to a contiguous view; gray and
+        scratch hold the widest normalized crop, native (the crop in
+        grayscale before resizing) grows to the largest crop seen.
+        """
+        local = self.local
+        if not hasattr(local, 'gray'):
+            size = self.height * self.max_width
+            local.native = np.empty(size, np.uint8)
+            local.gray = np.empty(size, np.uint8)
+            local.scratch = np.empty(size, np.uint8)
+        if local.native.size < crop_pixels:
+            local.native = np.empty(crop_pixels, np.uint8)
+        return local.native, local.gray, local.scratch
+
+    def __call__(self, crop):
+        """Return the binarized plate for a BGR or grayscale crop, or None for an empty crop."""
+        if crop is None or crop.size == 0:
+            return None
+
+        crop_height, crop_width = crop.shape[:2]
+        height = self.height
+        width = min(self.max_width, max(1, round(crop_width * height / crop_height)))
+        pixels = height * width
+
+        native, gray, scratch = self.buffers(crop_height * crop_width)
+        if crop.ndim == 3:
+            # Grayscale first: resizing one channel is cheaper than three
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY,
+                                dst=native[:crop_height * crop_width].reshape(crop_height, crop_width))
+        gray = gray[:pixels].reshape(height, width)
+        cv2.resize(crop, (width, height), dst=gray, interpolation=cv2.INTER_LINEAR)
+
+        out = np.empty((height, width), np.uint8)
+        self.binarize(gray, scratch[:pixels].reshape(height, width), out)
+        return out
+
+    def preprocess_many(self, crops):
+        return [self(crop) for crop in crops]
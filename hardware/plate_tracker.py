@@ -0,0 +1,215 @@
+import itertools
+import threading
+from collections import Counter
+
+import cv2
+
+from metrics import histogram
+
+OCR_CALLS_PER_VEHICLE = histogram('plate_ocr_calls_per_vehicle', 'Crops OCR\'d for one plate track before it expired',
+                                  buckets=(1, 2, 3, 4, 6, 9, 12, 15))
+
+
+def box_iou(a, b):
+    """Intersection-over-union of two (x1, y1, x2, y2) boxes."""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+def crop_quality(crop):
+    """Score a plate crop by sharpness (Laplacian variance) weighted by its area."""
+    if crop is None or crop.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return sharpness * gray.shape[0] * gray.shape[1]
+
+
+class PlateTrack:
+    """A single plate followed across frames, with its OCR candidates and reads."""
+
+    def __init__(self, track_id, box, frame_index):
+        self.id = track_id
+        self.box = box
+        self.first_seen = frame_index
+        self.last_seen = frame_index
+        self.hits = 1
+
+        self.candidates = []  # (quality, crop) pairs waiting for OCR
+        self.frames_since_ocr = 0
+        self.rounds = 0
+        self.ocr_calls = 0
+
+        # Validated plate strings for this track only, and the plate voted for.
+        # OCR results and decisions may come from other threads than the
+        # tracker's, so both are only touched under the lock.
+        self.reads = []
+        self.decided = None
+        self.lock = threading.Lock()
+
+    def add_read(self, plate):
+        """Record a validated read; returns a copy of all reads so far."""
+        with self.lock:
+            self.reads.append(plate)
+            return list(self.reads)
+
+    def read_list(self):
+        with self.lock:
+            return list(self.reads)
+
+    def clear_reads(self):
+        """Start a fresh vote: drop the reads of the vote just taken."""
+        with self.lock:
+            self.reads.clear()
+
+    def decide(self, plate):
+        with self.lock:
+            self.decided = plate
+
+    def is_decided(self):
+        with self.lock:
+            return self.decided is not None
+
+    @property
+    def centroid(self):
+        return (self.box[0] + self.box[2]) / 2.0, (self.box[1] + self.box[3]) / 2.0
+
+    @property
+    def diagonal(self):
+        return max(1.0, ((self.box[2] - self.box[0]) ** 2 + (self.box[3] - self.box[1]) ** 2) ** 0.5)
+
+
+class PlateTracker:
+    """Lightweight IoU/centroid tracker over YOLO plate boxes.
+
+    Each track buffers its best crops and releases only the sharpest/largest
+    few for OCR per round, so Tesseract runs a handful of times per vehicle and
+    reads from different vehicles never share a consensus buffer.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_missed=15,
+                 sample_frames=5, crops_per_round=3, max_rounds=3):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance  # in track diagonals
+        self.max_missed = max_missed
+        self.sample_frames = sample_frames
+        self.crops_per_round = crops_per_round
+        self.max_rounds = max_rounds
+
+        self.tracks = {}
+        self.frame_index = 0
+        self.ids = itertools.count(1)
+
+    def update(self, frame, boxes):
+        """Associate this frame's boxes with tracks and buffer their crops.
+
+        Returns the tracks seen in this frame.
+        """
+        self.frame_index += 1
+        unmatched = list(range(len(boxes)))
+        seen = []
+
+        # Greedy IoU matching, best overlaps first
+        pairs = sorted(
+            ((box_iou(track.box, boxes[i]), track, i)
+             for track in self.tracks.values() for i in unmatched),
+            key=lambda p: p[0], reverse=True
+        )
+        matched_tracks = set()
+        for iou, track, i in pairs:
+            if iou < self.iou_threshold:
+                break
+            if track.id in matched_tracks or i not in unmatched:
+                continue
+            self._assign(track, boxes[i], frame)
+            matched_tracks.add(track.id)
+            unmatched.remove(i)
+            seen.append(track)
+
+        # Fall back to centroid distance for fast-moving plates
+        for i in list(unmatched):
+            box = boxes[i]
+            cx, cy = (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+            best, best_dist = None, None
+            for track in self.tracks.values():
+                if track.id in matched_tracks:
+                    continue
+                tx, ty = track.centroid
+                dist = ((cx - tx) ** 2 + (cy - ty) ** 2) ** 0.5 / track.diagonal
+                if dist <= self.max_centroid_distance and (best_dist is None or dist < best_dist):
+                    best, best_dist = track, dist
+            if best is not None:
+                self._assign(best, box, frame)
+                matched_tracks.add(best.id)
+                unmatched.remove(i)
+                seen.append(best)
+
+        # New tracks for whatever is left
+        for i in unmatched:
+            track = PlateTrack(next(self.ids), boxes[i], self.frame_index)
+            self.tracks[track.id] = track
+            self._add_candidate(track, boxes[i], frame)
+            seen.append(track)
+
+        # Expire tracks that have been gone too long
+        for track_id in [t.id for t in self.tracks.values()
+                         if self.frame_index - t.last_seen > self.max_missed]:
+            track = self.tracks.pop(track_id)
+            if track.ocr_calls:
+                OCR_CALLS_PER_VEHICLE.observe(track.ocr_calls)
+
+        return seen
+
+    def _assign(self, track, box, frame):
+        track.box = box
+        track.last_seen = self.frame_index
+        track.hits += 1
+        self._add_candidate(track, box, frame)
+
+    def _add_candidate(self, track, box, frame):
+        track.frames_since_ocr += 1
+        if track.is_decided() or track.rounds >= self.max_rounds:
+            return
+        x1, y1, x2, y2 = box
+        crop = frame[y1:y2, x1:x2]
+        if crop.size == 0:
+            return
+        track.candidates.append((crop_quality(crop), crop.copy()))
+        track.candidates.sort(key=lambda c: c[0], reverse=True)
+        del track.candidates[self.crops_per_round:]
+
+    def ocr_batches(self, flush=False):
+        """Return (track, crops) for every track whose best crops should be OCR'd now.
+
+        A track is released after `sample_frames` frames, as soon as it is not
+        seen in the current frame (so short-lived vehicles are still read), or
+        immediately when `flush` is set because no detection ran this frame.
+        """
+        batches = []
+        for track in self.tracks.values():
+            if not track.candidates or track.is_decided():
+                continue
+            if (flush or track.frames_since_ocr >= self.sample_frames or
+                    track.last_seen < self.frame_index):
+                crops = [crop for _, crop in track.candidates]
+                track.candidates = []
+                track.frames_since_ocr = 0
+                track.rounds += 1
+                track.ocr_calls += len(crops)
+                batches.append((track, crops))
+        return batches
+
+    @staticmethod
+    def consensus(track):
+        """Return (most_common_plate, count, ratio) for a track's reads."""
+        reads = track.read_list()
+        if not reads:
+            return None, 0, 0.0
+        plate, count = Counter(reads).most_common(1)[0]
+        return plate, count, count / len(reads)
@@ -1,15 +1,22 @@
 import serial
+import sys
 import time
 import serial.tools.list_ports
 import platform
 from datetime import datetime
 from math import ceil
-from database import ParkingDatabase
+from storage import open_database
+from serial_transport import SerialTransport, CARD, READY, DONE, TIMEOUT
+from metrics import metrics_port, start_metrics_server
 
-# Initialize database
-db = ParkingDatabase()
+# Initialize database; a confirmed card payment is written to outbox/payment.wal
+# before it is applied, so it is never lost after the card is debited
+db = open_database(forward_queue='payment')
 
 RATE_PER_HOUR = 500  # ₦500 per hour
+CARD_WAIT_TIMEOUT = 1  # seconds between serial link checks while waiting for a card
+RECONNECT_ATTEMPTS = 5
+RECONNECT_DELAY = 3  # seconds
 
 
 def detect_arduino_port():
@@ -28,28 +35,7 @@ def detect_arduino_port():
     return None
 
 
-def parse_arduino_data(line):
-    try:
-        parts = line.strip().split(',')
-        print(f"[ARDUINO] Parsed parts: {parts}")
-        if len(parts) != 2:
-            return None, None
-        plate = parts[0].strip()
-
-        # Remove any non-digit characters
-        balance_str = ''.join(c for c in parts[1] if c.isdigit())
-        print(f"[ARDUINO] Cleaned balance: {balance_str}")
-
-        if balance_str:
-            return plate, int(balance_str)
-        else:
-            return None, None
-    except ValueError as e:
-        print(f"[ERROR] Parsing error: {e}")
-        return None, None
-
-
-def process_payment(plate, balance, ser):
+def process_payment(plate, balance, transport):
     try:
         record = db.get_unpaid_record(plate)
         if not record:
@@ -65,76 +51,102 @@ def process_payment(plate, balance, ser):
 
         if balance < amount_due:
             print("[PAYMENT] Insufficient balance")
-            ser.write(b'I\n')
+            transport.send('I\n')
             return
 
         new_balance = balance - amount_due
 
-        # Wait for Arduino to send READY
+        # Wait for Arduino to send READY (it may already be queued)
         print("[WAIT] Waiting for Arduino to be READY...")
-        start = time.time()
-        while True:
-            if ser.in_waiting:
-                arduino_response = ser.readline().decode().strip()
-                print(f"[ARDUINO] {arduino_response}")
-                if arduino_response == "READY":
-                    break
-            if time.time() - start > 5:
-                print("[ERROR] Arduino not ready in time")
-                return
-
-        ser.write(f"{new_balance}\r\n".encode())
+        ready = transport.wait_for({READY, TIMEOUT}, timeout=5)
+        if not ready or ready.kind == TIMEOUT:
+            print("[ERROR] Arduino not ready in time")
+            return
+
+        transport.send(f"{new_balance}\r\n", expect_reply=True)
         print(f"[PAYMENT] Sent new balance ₦{new_balance}")
 
         # Wait for DONE
         print("[WAIT] Waiting for confirmation...")
-        start = time.time()
-        while True:
-            if ser.in_waiting:
-                confirm = ser.readline().decode().strip()
-                print(f"[ARDUINO] {confirm}")
-                if "DONE" in confirm:
-                    print("[ARDUINO] Payment confirmed")
-                    if db.update_payment_status(plate, amount_due, 1):
-                        print(f"[SUCCESS] Payment processed for {plate}")
-                    else:
-                        print(f"[ERROR] Could not update database for {plate}")
-                    break
-            if time.time() - start > 10:
-                print("[ERROR] Arduino did not confirm in time")
-                break
-            time.sleep(0.1)
+        confirm = transport.wait_for({DONE, TIMEOUT}, timeout=10)
+        if confirm and confirm.kind == DONE:
+            print("[ARDUINO] Payment confirmed")
+            if db.update_payment_status(plate, amount_due, 1):
+                print(f"[SUCCESS] Payment processed for {plate}")
+            else:
+                print(f"[ERROR] Could not update database for {plate}")
+        else:
+            print("[ERROR] Arduino did not confirm in time")
 
     except Exception as e:
         print(f"[ERROR] Payment error: {e}")
 
 
-def main():
+def connect():
+    """Open the Arduino port and start its reader. Returns (ser, transport) or (None, None)."""
     port = detect_arduino_port()
     if not port:
         print("[ERROR] Arduino not found")
-        return
-
+        return None, None
     try:
         ser = serial.Serial(port, 9600, timeout=1)
-        print(f"[CONNECTED] Listening on {port}")
-        time.sleep(2)
-        ser.reset_input_buffer()
+    except serial.SerialException as e:
+        print(f"[ERROR] Could not open {port}: {e}")
+        return None, None
+
+    print(f"[CONNECTED] Listening on {port}")
+    time.sleep(2)
+    ser.reset_input_buffer()
+    transport = SerialTransport(
+        ser, on_message=lambda m: print(f"[SERIAL] Received ({m.kind}): {m.raw}")
+    ).start()
+    return ser, transport
+
+
+def reconnect(ser, transport):
+    """Close the dead link and retry connect(). Returns (None, None) when every attempt fails."""
+    transport.close()
+    ser.close()
+    for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+        print(f"[RECONNECT] Attempt {attempt}/{RECONNECT_ATTEMPTS} in {RECONNECT_DELAY}s")
+        time.sleep(RECONNECT_DELAY)
+        ser, transport = connect()
+        if transport:
+            return ser, transport
+    return None, None
 
+
+def main():
+    # Prometheus /metrics on a local port (METRICS_PORT overrides, 0 disables)
+    start_metrics_server(metrics_port(9105))
+
+    ser, transport = connect()
+    if not transport:
+        return
+
+    try:
         while True:
-            if ser.in_waiting:
-                line = ser.readline().decode().strip()
-                print(f"[SERIAL] Received: {line}")
-                plate, balance = parse_arduino_data(line)
-                if plate and balance is not None:
-                    process_payment(plate, balance, ser)
+            # A dead reader thread never queues another card: reconnect instead of waiting forever
+            if not transport.alive():
+                print(f"[ERROR] Serial link lost: {transport.error or 'reader stopped'}")
+                ser, transport = reconnect(ser, transport)
+                if not transport:
+                    print("[ERROR] Could not reconnect to the Arduino, exiting")
+                    sys.exit(1)
+
+            # Blocks on the reader thread's queue: no CPU used while idle
+            card = transport.wait_for(CARD, timeout=CARD_WAIT_TIMEOUT)
+            if card:
+                process_payment(card.plate, card.balance, transport)
 
     except KeyboardInterrupt:
         print("[EXIT] Stopping gracefully.")
     except Exception as e:
         print(f"[ERROR] {e}")
     finally:
-        if 'ser' in locals():
+        if transport:
+            transport.close()
+        if ser:
             ser.close()
 
 
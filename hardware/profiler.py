@@ -0,0 +1,208 @@
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+
+# Profiles go here unless --profile-dir says otherwise
+DEFAULT_PROFILE_DIR = 'profiles'
+
+
+class Span:
+    """One timed block; recorded as a Chrome trace 'complete' event on exit."""
+
+    __slots__ = ('profiler', 'name', 'args', 'started')
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.started, time.perf_counter_ns(), self.args)
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class NullProfiler:
+    """Stands in when --profile is off: span() hands back one shared no-op context."""
+
+    enabled = False
+
+    def span(self, name, **args):
+        return NULL_SPAN
+
+    def vehicle_done(self):
+        pass
+
+    def start(self):
+        return self
+
+    def close(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler:
+    """Records spans around the recognition stages for the first N seconds or N vehicles.
+
+    Spans from every thread go into one Chrome trace (JSON array of 'X'
+    events with per-thread names), which opens in chrome://tracing or
+    https://ui.perfetto.dev. With cprofile_path, cProfile also runs on the
+    thread that called start() for the same window and its stats are dumped
+    for pstats / snakeviz. Recording stops at whichever limit comes first,
+    or at close().
+    """
+
+    def __init__(self, trace_path, seconds=None, vehicles=None, cprofile_path=None, logger=None):
+        self.trace_path = trace_path
+        self.seconds = seconds
+        self.vehicles = vehicles
+        self.cprofile_path = cprofile_path
+        self.logger = logger or logging.getLogger('Profiler')
+
+        self.enabled = False
+        self.events = []
+        self.threads = {}  # native thread id -> name
+        self.vehicle_count = 0
+        self.origin = None
+        self.deadline = None
+        self.cprofile = None
+        self.owner = None  # thread running cProfile; only it may disable it
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.origin = time.perf_counter_ns()
+        if self.seconds:
+            self.deadline = self.origin + int(self.seconds * 1e9)
+        if self.cprofile_path:
+            self.cprofile = cProfile.Profile()
+            self.owner = threading.get_ident()
+            self.cprofile.enable()
+        self.enabled = True
+        limits = [f"{self.seconds:g}s" if self.seconds else None,
+                  f"{self.vehicles} vehicles" if self.vehicles else None]
+        self.logger.info(f"Profiling for {' or '.join(l for l in limits if l) or 'the whole run'} "
+                         f"-> {self.trace_path}")
+        return self
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, args)
+
+    def record(self, name, started, ended, args):
+        if not self.enabled:
+            # A limit was hit on another thread; cProfile can only be stopped from its own
+            if self.cprofile and threading.get_ident() == self.owner:
+                self.stop_cprofile()
+            return
+        tid = threading.get_native_id()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        self.events.append((name, tid, started, ended - started, args))  # list.append is atomic
+        if self.deadline and ended >= self.deadline:
+            self.finish()
+
+    def vehicle_done(self):
+        """Count one vehicle decided; after the vehicle limit, the next span to close ends recording."""
+        if not self.enabled:
+            return
+        self.vehicle_count += 1
+        if self.vehicles and self.vehicle_count >= self.vehicles:
+            # Lets the span around this decision (e.g. handle_valid_plate) make it into the trace
+            self.deadline = time.perf_counter_ns()
+
+    def finish(self):
+        """Stop recording and write the trace (and the cProfile dump if this is its thread)."""
+        with self.lock:
+            if not self.enabled:
+                return
+            self.enabled = False
+        self.write_trace()
+        if self.cprofile and threading.get_ident() == self.owner:
+            self.stop_cprofile()
+
+    def stop_cprofile(self):
+        with self.lock:
+            profile, self.cprofile = self.cprofile, None
+        if profile is None:
+            return
+        profile.disable()
+        os.makedirs(os.path.dirname(os.path.abspath(self.cprofile_path)), exist_ok=True)
+        profile.dump_stats(self.cprofile_path)
+        self.logger.info(f"cProfile stats written to {self.cprofile_path}")
+
+    def write_trace(self):
+        pid = os.getpid()
+        trace = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in self.threads.items()
+        ]
+        for name, tid, started, duration, args in self.events:
+            event = {
+                'name': name,
+                'ph': 'X',
+                'pid': pid,
+                'tid': tid,
+                'ts': (started - self.origin) / 1000,  # microseconds
+                'dur': duration / 1000
+            }
+            if args:
+                event['args'] = args
+            trace.append(event)
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.trace_path)), exist_ok=True)
+        with open(self.trace_path, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+        self.logger.info(f"Trace of {len(self.events)} spans ({self.vehicle_count} vehicles) "
+                         f"written to {self.trace_path}")
+
+    def close(self):
+        """Write whatever was recorded if no limit was reached; call from the thread that started it."""
+        self.finish()
+        if self.cprofile and threading.get_ident() == self.owner:
+            self.stop_cprofile()
+
+
+def add_profile_arguments(parser):
+    """The --profile options shared by main.py and the lane scripts."""
+    parser.add_argument('--profile', action='store_true',
+                        help='Record stage spans to a Chrome/Perfetto trace in --profile-dir')
+    parser.add_argument('--profile-dir', type=str, default=DEFAULT_PROFILE_DIR,
+                        help='Directory for trace and cProfile files')
+    parser.add_argument('--profile-seconds', type=float, default=60.0,
+                        help='Stop profiling after this many seconds (0 for no time limit)')
+    parser.add_argument('--profile-vehicles', type=int, default=0,
+                        help='Stop profiling after this many vehicles are decided (0 for no limit)')
+    parser.add_argument('--profile-cprofile', action='store_true',
+                        help='Also run cProfile on the recognition loop for the same window')
+
+
+def create_profiler(name, enabled=False, directory=DEFAULT_PROFILE_DIR, seconds=60.0, vehicles=0,
+                    cprofile=False, logger=None):
+    """A Profiler writing <directory>/<name>-<timestamp>.trace.json (and .prof), or NULL_PROFILER."""
+    if not enabled:
+        return NULL_PROFILER
+    stem = os.path.join(directory, f"{name}-{time.strftime('%Y%m%d_%H%M%S')}")
+    return Profiler(stem + '.trace.json', seconds=seconds or None, vehicles=vehicles or None,
+                    cprofile_path=stem + '.prof' if cprofile else None, logger=logger)
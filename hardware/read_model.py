@@ -0,0 +1,125 @@
+import bisect
+import threading
+
+from database import EVENT_LOG_TYPES, LOG_PAGES
+
+# Field each log is ordered by (newest first), matching the LOG_PAGES queries
+TIME_FIELDS = {
+    'checkins': 'entry_time',
+    'checkouts': 'exit_time',
+    'payments': 'created_at',
+    'alerts': 'timestamp',
+}
+
+
+class LogProjection:
+    """Newest `size` rows of every log, kept in memory from the EventBroker feed.
+
+    Loaded once from the paginated log queries, then updated by the events the
+    broker already polls, so reads never touch the database. `etag(limit)`
+    changes whenever the content or the page size does, which lets the API
+    answer unchanged polls with 304 Not Modified.
+    """
+
+    def __init__(self, db, broker, size=500):
+        self.db = db
+        self.broker = broker
+        self.size = size
+
+        self.logs = {log_type: [] for log_type in LOG_PAGES}  # ((time, id), item), oldest first
+        self.ids = {log_type: set() for log_type in LOG_PAGES}
+        self.lock = threading.Lock()
+        self.reload_lock = threading.Lock()
+        self.pending = None  # events applied while a reload is reading the database
+
+        self.generation = 0  # bumped by every reload
+        self.version = 0  # bumped by every change
+        self.reloads = 0
+
+    def start(self):
+        self.broker.subscribe(self.apply, self.reload)
+        self.reload()
+        return self
+
+    def page_size(self, limit=None):
+        """Rows per log that snapshot(limit) returns."""
+        return min(limit or self.size, self.size)
+
+    def etag(self, limit=None):
+        with self.lock:
+            return self._etag(limit)
+
+    def _etag(self, limit):
+        return f"{self.generation}-{self.version}-{self.page_size(limit)}"
+
+    def reload(self):
+        """Rebuild every log from the database."""
+        with self.reload_lock:
+            with self.lock:
+                self.pending = []
+            try:
+                pages = {log_type: self.db.get_log_page(log_type, self.size)[0] for log_type in LOG_PAGES}
+            except Exception:
+                with self.lock:
+                    self.pending = None
+                raise
+
+            logs = {log_type: [] for log_type in LOG_PAGES}
+            ids = {log_type: set() for log_type in LOG_PAGES}
+            for log_type, items in pages.items():
+                for item in reversed(items):
+                    self._insert(logs[log_type], ids[log_type], log_type, item)
+
+            with self.lock:
+                # Events polled during the read may or may not be in the pages
+                for log_type, item in self.pending:
+                    self._insert(logs[log_type], ids[log_type], log_type, item)
+                self.pending = None
+                self.logs, self.ids = logs, ids
+                self.generation += 1
+                self.reloads += 1
+
+    def apply(self, events):
+        """Broker callback: add new rows to their logs."""
+        with self.lock:
+            changed = False
+            for event in events:
+                log_type = EVENT_LOG_TYPES.get(event['kind'])
+                if log_type is None:
+                    continue
+                changed |= self._insert(self.logs[log_type], self.ids[log_type], log_type, event['data'])
+                if self.pending is not None:
+                    self.pending.append((log_type, event['data']))
+            if changed:
+                self.version += 1
+
+    def _insert(self, rows, ids, log_type, item):
+        """Insert keeping (time, id) order and at most `size` rows. Returns True if added."""
+        if item['id'] in ids:
+            return False
+        key = (item[TIME_FIELDS[log_type]], item['id'])
+        if len(rows) >= self.size and key < rows[0][0]:
+            return False  # older than everything kept
+        bisect.insort(rows, (key, item))  # ids are unique, so items are never compared
+        ids.add(item['id'])
+        if len(rows) > self.size:
+            _, evicted = rows.pop(0)
+            ids.discard(evicted['id'])
+        return True
+
+    def snapshot(self, limit=None):
+        """({log_type: [items newest first]}, etag)."""
+        with self.lock:
+            logs = {log_type: [item for _, item in reversed(rows[-self.page_size(limit):])]
+                    for log_type, rows in self.logs.items()}
+            return logs, self._etag(limit)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'rows': {log_type: len(rows) for log_type, rows in self.logs.items()},
+                'generation': self.generation,
+                'version': self.version,
+                'reloads': self.reloads
+            }
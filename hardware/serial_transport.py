@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+
+import serial
+
+from metrics import histogram
+
+ROUND_TRIP_SECONDS = histogram('serial_round_trip_seconds',
+                               'Time from a command sent to the Arduino to the reply waited for', ['kind'])
+
+CARD = 'card'
+READY = 'ready'
+DONE = 'done'
+TIMEOUT = 'timeout'
+DENIED = 'denied'
+LOG = 'log'
+
+
+class Message:
+    """A parsed line from the payment Arduino."""
+
+    def __init__(self, kind, raw, plate=None, balance=None):
+        self.kind = kind
+        self.raw = raw
+        self.plate = plate
+        self.balance = balance
+        self.received_at = time.monotonic()
+
+    def __repr__(self):
+        return f"Message({self.kind!r}, {self.raw!r})"
+
+
+def parse_line(line):
+    """Turn one line of Arduino output into a typed Message."""
+    line = line.strip()
+    if line == 'READY':
+        return Message(READY, line)
+    if line.startswith('[TIMEOUT]'):
+        return Message(TIMEOUT, line)
+    if line.startswith('[DENIED]'):
+        return Message(DENIED, line)
+    if 'DONE' in line:
+        return Message(DONE, line)
+
+    # Card read: "<plate>,<balance>"
+    parts = line.split(',')
+    if len(parts) == 2 and parts[0].strip():
+        # Remove any non-digit characters
+        balance_str = ''.join(c for c in parts[1] if c.isdigit())
+        if balance_str:
+            return Message(CARD, line, plate=parts[0].strip(), balance=int(balance_str))
+
+    return Message(LOG, line)
+
+
+class SerialTransport:
+    """Line-oriented serial link with a dedicated reader thread.
+
+    The reader blocks in the OS on readline(), so an idle terminal costs no
+    CPU. Parsed messages are queued and callers wait on the queue with a
+    timeout instead of polling in_waiting.
+    """
+
+    def __init__(self, ser, on_message=None):
+        self.ser = ser
+        self.on_message = on_message
+        self.messages = queue.Queue()
+        self.write_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.error = None  # the SerialException that stopped the reader, if any
+        self.last_send = None  # monotonic time of the last command awaiting a reply, for round-trip timing
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._read_loop, name='serial-reader', daemon=True)
+        self.thread.start()
+        return self
+
+    def _read_loop(self):
+        while self.running:
+            try:
+                raw = self.ser.readline()  # blocks until a line or the port timeout
+            except serial.SerialException as e:
+                print(f"[ERROR] Serial read failed: {e}")
+                self.error = e
+                self.running = False
+                break
+            if not raw:
+                continue
+
+            line = raw.decode(errors='replace').strip()
+            if not line:
+                continue
+            message = parse_line(line)
+            if self.on_message:
+                self.on_message(message)
+            self.messages.put(message)
+
+    def alive(self):
+        """True while the reader thread is running and has not hit a serial error."""
+        return self.running and self.error is None and self.thread is not None and self.thread.is_alive()
+
+    def wait_for(self, kinds, timeout=None):
+        """Return the next message of one of the given kinds, or None on timeout.
+
+        Messages of other kinds that arrive first are discarded. A command
+        whose reply never comes is no longer timed.
+        """
+        if isinstance(kinds, str):
+            kinds = {kinds}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                self.last_send = None
+                return None
+            try:
+                message = self.messages.get(timeout=remaining)
+            except queue.Empty:
+                self.last_send = None
+                return None
+            if message.kind in kinds:
+                if self.last_send is not None:
+                    ROUND_TRIP_SECONDS.labels(kind=message.kind).observe(message.received_at - self.last_send)
+                    self.last_send = None
+                return message
+
+    def send(self, text, expect_reply=False):
+        """Write a command; only one sent with expect_reply is timed to the next reply waited for."""
+        with self.write_lock:
+            self.ser.write(text.encode())
+            self.last_send = time.monotonic() if expect_reply else None
+
+    def close(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(2.0)
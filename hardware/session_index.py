@@ -0,0 +1,316 @@
+import json
+import logging
+import select
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+
+import psycopg2
+
+from database import SESSION_CHANNEL
+
+
+class OpenSession:
+    """A parking record that has no exit_time yet."""
+
+    __slots__ = ('id', 'car_plate', 'entry_time', 'payment_status')
+
+    def __init__(self, id, car_plate, entry_time, payment_status):
+        self.id = id
+        self.car_plate = car_plate
+        self.entry_time = entry_time
+        self.payment_status = payment_status
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'car_plate': self.car_plate,
+            'entry_time': self.entry_time,
+            'payment_status': self.payment_status
+        }
+
+    def __repr__(self):
+        return f"OpenSession({self.id}, {self.car_plate!r}, status={self.payment_status})"
+
+
+class OpenSessionIndex:
+    """In-memory plate -> open session map so gate decisions skip the database.
+
+    The index is warmed from Postgres at startup and kept current three ways:
+    writes made through it update memory as soon as the database accepts them,
+    a LISTEN connection applies changes committed by other processes (e.g. a
+    payment at the terminal), and a periodic reconcile replaces the maps with a
+    fresh snapshot in case a notification was missed.
+
+    The few lookups that still read through to the database run on a
+    background thread and are waited for at most lookup_timeout seconds, so a
+    hung server never freezes the lane: past that, the index answers and the
+    late result still updates it.
+    """
+
+    def __init__(self, db, reconcile_interval=60.0, listen=True, lookup_timeout=0.5, logger=None):
+        self.db = db
+        self.reconcile_interval = reconcile_interval
+        self.listen = listen
+        self.lookup_timeout = lookup_timeout
+        self.logger = logger or logging.getLogger('OpenSessionIndex')
+
+        # Mirrors the two open-session partial indexes: latest session per plate
+        self.unpaid = {}
+        self.paid = {}
+        self.lock = threading.Lock()
+        self.reconcile_lock = threading.Lock()  # one snapshot at a time
+        self.pending = None  # events applied while a reconcile snapshot is in flight
+        self.lookups = ThreadPoolExecutor(max_workers=1, thread_name_prefix='session-lookup')
+        self.lookup = None  # read-through in flight; a hung one is not queued behind
+
+        self.hits = 0
+        self.misses = 0
+        self.notifications = 0
+        self.reconciles = 0
+        self.drift = 0  # sessions a reconcile had to correct
+        self.slow_lookups = 0  # read-throughs answered from the index after lookup_timeout
+        self.last_reconcile = None
+
+        self.running = False
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self):
+        """Warm the index and start the listener and reconcile threads."""
+        try:
+            self.reconcile()
+        except Exception as e:
+            # e.g. the database is down behind a store-and-forward queue; the threads retry
+            self.logger.error(f"Initial session snapshot failed, starting empty: {e}")
+        self.running = True
+        # Backends without LISTEN/NOTIFY (SQLite) rely on reconcile and read-through
+        self.listen = self.listen and getattr(self.db, 'supports_notify', False)
+        if self.listen:
+            self.threads.append(threading.Thread(target=self._listen_loop, name='session-listener', daemon=True))
+        if self.reconcile_interval:
+            self.threads.append(threading.Thread(target=self._reconcile_loop, name='session-reconcile', daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    # -- lookups ------------------------------------------------------------
+
+    def has_unpaid(self, plate_number):
+        """Whether the plate has an open unpaid session.
+
+        Without a listener, a hit may be a session another process has since
+        paid or closed, so it is confirmed against the database before it
+        refuses an entry.
+        """
+        with self.lock:
+            if plate_number not in self.unpaid:
+                return False
+        if self.listen:
+            return True
+        return self._read_through(self._confirm_unpaid, plate_number, default=True)
+
+    def _confirm_unpaid(self, plate_number):
+        if self.db.has_unpaid_record(plate_number):
+            return True
+        with self.lock:
+            self.unpaid.pop(plate_number, None)
+        self.drift += 1
+        return False
+
+    def get_paid(self, plate_number):
+        """Latest paid open session for the plate, or None.
+
+        A miss falls through to the database so a payment whose notification
+        has not arrived yet is never refused at the exit.
+        """
+        with self.lock:
+            session = self.paid.get(plate_number)
+        if session:
+            self.hits += 1
+            return session.to_dict()
+
+        self.misses += 1
+        return self._read_through(self._fetch_paid, plate_number, default=None)
+
+    def _fetch_paid(self, plate_number):
+        record = self.db.get_paid_record(plate_number)
+        if record:
+            self.apply('paid', plate_number, record['id'], record['entry_time'])
+        return record
+
+    def _read_through(self, func, plate_number, default):
+        """Run a database lookup in the background and wait for it at most lookup_timeout.
+
+        The lookup updates the index itself, so an answer that arrives after
+        the lane has moved on is still used by the next lookup.
+        """
+        with self.lock:
+            if self.lookup is not None and not self.lookup.done():
+                future = None
+            else:
+                future = self.lookup = self.lookups.submit(func, plate_number)
+        if future is not None:
+            try:
+                return future.result(timeout=self.lookup_timeout)
+            except FutureTimeout:
+                pass
+            except Exception as e:
+                self.logger.error(f"Session lookup for {plate_number} failed: {e}")
+                return default
+        self.slow_lookups += 1
+        self.logger.warning(f"Session lookup for {plate_number} is slow, answering from the index")
+        return default
+
+    # -- write-through ------------------------------------------------------
+
+    def add_entry(self, plate_number):
+        entry_id = self.db.add_entry(plate_number)
+        if entry_id:
+            self.apply('entry', plate_number, entry_id, datetime.now())
+        return entry_id
+
+    def mark_paid(self, plate_number, amount):
+        with self.lock:
+            session = self.unpaid.get(plate_number)
+        if not self.db.update_payment_status(plate_number, amount, 1):
+            return False
+        if session:
+            self.apply('paid', plate_number, session.id, session.entry_time)
+        return True
+
+    def record_exit(self, plate_number):
+        with self.lock:
+            session = self.paid.get(plate_number)
+        if not self.db.record_exit(plate_number):
+            return False
+        self.apply('exit', plate_number, session.id if session else None, None)
+        return True
+
+    # -- state changes ------------------------------------------------------
+
+    def apply(self, event, plate_number, record_id, entry_time):
+        """Apply one session change with the same effect the SQL had on the table."""
+        with self.lock:
+            self._apply(self.unpaid, self.paid, event, plate_number, record_id, entry_time)
+            if self.pending is not None:
+                self.pending.append((event, plate_number, record_id, entry_time))
+
+    @staticmethod
+    def _apply(unpaid, paid, event, plate_number, record_id, entry_time):
+        if event == 'entry':
+            unpaid[plate_number] = OpenSession(record_id, plate_number, entry_time, 0)
+        elif event == 'paid':
+            # update_payment_status pays every unpaid open session of the plate
+            unpaid.pop(plate_number, None)
+            current = paid.get(plate_number)
+            if not current or current.entry_time is None or entry_time >= current.entry_time:
+                paid[plate_number] = OpenSession(record_id, plate_number, entry_time, 1)
+        elif event == 'exit':
+            # record_exit closes every paid open session of the plate
+            paid.pop(plate_number, None)
+
+    def reconcile(self):
+        """Replace the maps with a fresh database snapshot."""
+        with self.reconcile_lock:
+            self._reconcile()
+
+    def _reconcile(self):
+        with self.lock:
+            self.pending = []
+        try:
+            rows = self.db.get_open_sessions()
+        except Exception:
+            with self.lock:
+                self.pending = None
+            raise
+
+        unpaid, paid = {}, {}
+        for row in rows:
+            target = unpaid if row['payment_status'] == 0 else paid
+            current = target.get(row['car_plate'])
+            if not current or row['entry_time'] > current.entry_time:
+                target[row['car_plate']] = OpenSession(
+                    row['id'], row['car_plate'], row['entry_time'], row['payment_status']
+                )
+
+        with self.lock:
+            # Changes applied while the snapshot was being read may or may not be in it
+            for event in self.pending:
+                self._apply(unpaid, paid, *event)
+            self.pending = None
+
+            if self.last_reconcile is not None:
+                self.drift += self._diff(self.unpaid, unpaid) + self._diff(self.paid, paid)
+            self.unpaid, self.paid = unpaid, paid
+            self.reconciles += 1
+            self.last_reconcile = time.time()
+
+        self.logger.debug(f"Reconciled: {len(unpaid)} unpaid, {len(paid)} paid open sessions")
+
+    @staticmethod
+    def _diff(old, new):
+        return sum(1 for plate in old.keys() | new.keys()
+                   if getattr(old.get(plate), 'id', None) != getattr(new.get(plate), 'id', None))
+
+    def _reconcile_loop(self):
+        while not self.stopped.wait(self.reconcile_interval):
+            try:
+                self.reconcile()
+            except Exception as e:
+                self.logger.error(f"Session reconcile failed: {e}")
+
+    def _listen_loop(self):
+        while self.running:
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.db.config)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {SESSION_CHANNEL}")
+                # Anything committed before LISTEN took effect is picked up here
+                self.reconcile()
+
+                while self.running:
+                    if not select.select([conn], [], [], 1.0)[0]:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._handle_notification(conn.notifies.pop(0))
+            except Exception as e:
+                self.logger.error(f"Session listener error: {e}; retrying in 5s")
+                self.stopped.wait(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _handle_notification(self, notify):
+        try:
+            payload = json.loads(notify.payload)
+            entry_time = datetime.fromisoformat(payload['entry_time'])
+        except (ValueError, KeyError) as e:
+            self.logger.warning(f"Ignoring malformed session notification: {e}")
+            return
+        self.notifications += 1
+        self.apply(payload['event'], payload['plate'], payload['id'], entry_time)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'unpaid': len(self.unpaid),
+                'paid': len(self.paid),
+                'hits': self.hits,
+                'misses': self.misses,
+                'notifications': self.notifications,
+                'reconciles': self.reconciles,
+                'drift': self.drift,
+                'slow_lookups': self.slow_lookups
+            }
+
+    def close(self):
+        self.running = False
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join(1.5)
+        self.lookups.shutdown(wait=False)
@@ -0,0 +1,252 @@
+import csv
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+# One fixed-size record per event: kind, entry number, unix time, plate, amount
+RECORD = struct.Struct('<BId16sf')
+ENTRY, PAID, EXIT = 1, 2, 3
+KINDS = {ENTRY: 'entry', PAID: 'paid', EXIT: 'exit'}
+
+
+class OpenEntry:
+    """An entry without an exit, as held by the plate index."""
+
+    __slots__ = ('no', 'entry_time', 'payment_status', 'due_payment')
+
+    def __init__(self, no, entry_time, payment_status=0, due_payment=None):
+        self.no = no
+        self.entry_time = entry_time
+        self.payment_status = payment_status
+        self.due_payment = due_payment
+
+    def to_dict(self, plate_number):
+        return {
+            'no': self.no,
+            'car_plate': plate_number,
+            'entry_time': datetime.fromtimestamp(self.entry_time),
+            'payment_status': self.payment_status,
+            'due_payment': self.due_payment
+        }
+
+
+class SessionLog:
+    """Append-only log of entries, payments and exits for the standalone lane.
+
+    Records are fixed-size binary structs appended in batches: they are
+    buffered in memory and written with one write and one fsync every
+    `flush_interval` seconds or `max_batch` records. The open sessions by
+    plate and the entry counter live in memory and are checkpointed to a
+    sidecar '<path>.idx' (replaced atomically) every `checkpoint_every`
+    records. Startup loads the checkpoint and replays only the records
+    written after it, so it does not grow with the history, and looking up a
+    plate's open session is a dict access.
+    """
+
+    def __init__(self, path, flush_interval=1.0, max_batch=64, checkpoint_every=256, logger=None):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.checkpoint_every = checkpoint_every
+        self.logger = logger or logging.getLogger('SessionLog')
+
+        self.lock = threading.Lock()
+        self.open = {}  # plate -> OpenEntry
+        self.entry_count = 0
+        self.buffer = []
+        self.since_checkpoint = 0
+        self.flushes = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'ab')
+        self.offset = self._load()  # bytes of the log reflected in memory (flushed)
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._flush_loop, name='session-log', daemon=True)
+        self.thread.start()
+
+    # -- recovery -----------------------------------------------------------
+
+    def _load(self):
+        size = os.path.getsize(self.path)
+        if size % RECORD.size:
+            # A torn final record from a crash mid-write
+            size -= size % RECORD.size
+            self.file.truncate(size)
+            self.logger.warning(f"Truncated a partial record at the end of {self.path}")
+
+        offset = 0
+        try:
+            with open(self.index_path) as f:
+                checkpoint = json.load(f)
+            if checkpoint['offset'] <= size:
+                offset = checkpoint['offset']
+                self.entry_count = checkpoint['entry_count']
+                self.open = {plate: OpenEntry(*fields) for plate, fields in checkpoint['open'].items()}
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            self.logger.warning(f"Ignoring unreadable index {self.index_path}, rebuilding from the log: {e}")
+
+        replayed = 0
+        for record in self._read_records(offset):
+            self._apply(*record)
+            replayed += 1
+        if replayed:
+            self.logger.info(f"Replayed {replayed} records written after the last checkpoint")
+        return size
+
+    def _read_records(self, offset=0):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                chunk = f.read(RECORD.size * 1024)
+                if not chunk:
+                    return
+                for kind, no, timestamp, plate, amount in RECORD.iter_unpack(chunk):
+                    yield kind, no, timestamp, plate.rstrip(b'\0').decode('ascii'), amount
+
+    # -- index --------------------------------------------------------------
+
+    def _apply(self, kind, no, timestamp, plate_number, amount):
+        if kind == ENTRY:
+            self.entry_count = max(self.entry_count, no)
+            self.open[plate_number] = OpenEntry(no, timestamp)
+        elif kind == PAID:
+            session = self.open.get(plate_number)
+            if session:
+                session.payment_status = 1
+                session.due_payment = amount
+        elif kind == EXIT:
+            self.open.pop(plate_number, None)
+
+    def get_open(self, plate_number):
+        """The plate's open session as a dict, or None."""
+        with self.lock:
+            session = self.open.get(plate_number)
+            return session.to_dict(plate_number) if session else None
+
+    # -- appends ------------------------------------------------------------
+
+    def _append(self, kind, plate_number, amount=0.0, timestamp=None, no=None):
+        encoded = plate_number.encode('ascii')
+        if len(encoded) > 16:
+            raise ValueError(f"Plate {plate_number!r} is longer than 16 characters")
+        timestamp = timestamp or time.time()
+        with self.lock:
+            if kind == ENTRY:
+                no = no or self.entry_count + 1
+            else:
+                session = self.open.get(plate_number)
+                if not session:
+                    return None
+                no = session.no
+            self.buffer.append(RECORD.pack(kind, no, timestamp, encoded, amount))
+            self._apply(kind, no, timestamp, plate_number, amount)
+            if len(self.buffer) >= self.max_batch:
+                self._flush()
+        return no
+
+    def add_entry(self, plate_number, timestamp=None):
+        """Open a session; returns its entry number."""
+        return self._append(ENTRY, plate_number, timestamp=timestamp)
+
+    def mark_paid(self, plate_number, amount, timestamp=None):
+        """Returns the entry number paid for, or None if the plate has no open session."""
+        return self._append(PAID, plate_number, float(amount), timestamp)
+
+    def record_exit(self, plate_number, timestamp=None):
+        """Returns the entry number closed, or None if the plate has no open session."""
+        return self._append(EXIT, plate_number, timestamp=timestamp)
+
+    def records(self):
+        """Every flushed record as a dict, oldest first (a full scan, for exports and audits)."""
+        self.flush()
+        for kind, no, timestamp, plate_number, amount in self._read_records():
+            yield {
+                'kind': KINDS[kind],
+                'no': no,
+                'time': datetime.fromtimestamp(timestamp),
+                'car_plate': plate_number,
+                'amount': amount if kind == PAID else None
+            }
+
+    # -- persistence --------------------------------------------------------
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        data = b''.join(self.buffer)
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.offset += len(data)
+        self.since_checkpoint += len(self.buffer)
+        self.buffer.clear()
+        self.flushes += 1
+        if self.since_checkpoint >= self.checkpoint_every:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        temp = self.index_path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump({
+                'offset': self.offset,
+                'entry_count': self.entry_count,
+                'open': {plate: [s.no, s.entry_time, s.payment_status, s.due_payment]
+                         for plate, s in self.open.items()}
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.index_path)
+        self.since_checkpoint = 0
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush_loop(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                self.logger.error(f"Session log flush failed: {e}")
+
+    def close(self):
+        """Flush, checkpoint and close; the next start replays nothing."""
+        self.stopped.set()
+        self.thread.join()
+        with self.lock:
+            self._flush()
+            self._checkpoint()
+            self.file.close()
+
+
+def migrate_csv(csv_path, log):
+    """Load the legacy db.csv (no, entry_time, exit_time, car_plate, due_payment,
+    payment_status) into an empty SessionLog, then rename the CSV to
+    '<csv_path>.migrated' so this runs only once. Returns the rows migrated.
+    """
+    rows = 0
+    with open(csv_path, newline='') as f:
+        for row in csv.DictReader(f):
+            plate = row['car_plate'].strip()
+            if not plate or not row['entry_time']:
+                continue
+            entered = datetime.strptime(row['entry_time'], '%Y-%m-%d %H:%M:%S').timestamp()
+            log._append(ENTRY, plate, timestamp=entered, no=int(row['no']))
+            if row['payment_status'].strip() == '1':
+                log.mark_paid(plate, float(row['due_payment'] or 0), entered)
+            if row['exit_time']:
+                log.record_exit(plate, datetime.strptime(row['exit_time'], '%Y-%m-%d %H:%M:%S').timestamp())
+            rows += 1
+    log.flush()
+    with log.lock:
+        log._checkpoint()
+    os.replace(csv_path, csv_path + '.migrated')
+    return rows
@@ -0,0 +1,482 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+from database import DEFAULT_LOT_ID, EXPORT_COLUMNS, LOG_PAGES, record_to_dict
+from storage import ParkingStore, timed_query
+
+DEFAULT_PATH = os.environ.get(
+    'PARKING_SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parking.db')
+)
+
+# Same tables and indexes as the Postgres migrations 0001-0003, 0006 (lot_id), 0007 and 0008.
+# The change feed and stats rollups are Postgres-only.
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS parking_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entry_time TIMESTAMP,
+        exit_time TIMESTAMP,
+        car_plate VARCHAR(20) NOT NULL,
+        due_payment NUMERIC(10, 2) DEFAULT 0,
+        payment_status SMALLINT DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        lot_id VARCHAR(32) NOT NULL DEFAULT 'main'
+    );
+
+    CREATE INDEX IF NOT EXISTS parking_records_open_unpaid_idx
+        ON parking_records (car_plate, entry_time DESC)
+        WHERE payment_status = 0 AND exit_time IS NULL;
+    CREATE INDEX IF NOT EXISTS parking_records_open_paid_idx
+        ON parking_records (car_plate, entry_time DESC)
+        WHERE payment_status = 1 AND exit_time IS NULL;
+
+    CREATE INDEX IF NOT EXISTS parking_records_entries_keyset_idx
+        ON parking_records (entry_time DESC, id DESC) WHERE entry_time IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS parking_records_entries_plate_idx
+        ON parking_records (car_plate, entry_time DESC, id DESC) WHERE entry_time IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS parking_records_exits_keyset_idx
+        ON parking_records (exit_time DESC, id DESC) WHERE exit_time IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS parking_records_exits_plate_idx
+        ON parking_records (car_plate, exit_time DESC, id DESC) WHERE exit_time IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS parking_records_payments_keyset_idx
+        ON parking_records (created_at DESC, id DESC) WHERE payment_status = 1;
+    CREATE INDEX IF NOT EXISTS parking_records_payments_plate_idx
+        ON parking_records (car_plate, created_at DESC, id DESC) WHERE payment_status = 1;
+    CREATE INDEX IF NOT EXISTS parking_records_alerts_keyset_idx
+        ON parking_records (created_at DESC, id DESC) WHERE payment_status = 0 AND exit_time IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS parking_records_alerts_plate_idx
+        ON parking_records (car_plate, created_at DESC, id DESC) WHERE payment_status = 0 AND exit_time IS NOT NULL;
+
+    CREATE TABLE IF NOT EXISTS applied_writes (
+        key VARCHAR(36) PRIMARY KEY,
+        op VARCHAR(16) NOT NULL,
+        car_plate VARCHAR(20) NOT NULL,
+        record_id INTEGER,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS applied_writes_applied_at_idx ON applied_writes (applied_at);
+
+    CREATE TABLE IF NOT EXISTS lane_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        occurred_at TIMESTAMP NOT NULL,
+        lot_id VARCHAR(32) NOT NULL DEFAULT 'main',
+        lane VARCHAR(32),
+        kind VARCHAR(32) NOT NULL,
+        car_plate VARCHAR(20),
+        track_id INTEGER,
+        details TEXT NOT NULL DEFAULT '{}'
+    );
+    CREATE INDEX IF NOT EXISTS lane_events_occurred_at_idx ON lane_events (occurred_at);
+    CREATE INDEX IF NOT EXISTS lane_events_plate_idx
+        ON lane_events (car_plate, occurred_at) WHERE car_plate IS NOT NULL;
+"""
+
+ADD_ENTRY_SQL = """
+    INSERT INTO parking_records (car_plate, entry_time, created_at, lot_id)
+    VALUES (?, ?, ?, ?) RETURNING id
+"""
+
+HAS_UNPAID_RECORD_SQL = """
+    SELECT id FROM parking_records
+    WHERE car_plate = ? AND payment_status = 0 AND exit_time IS NULL
+"""
+
+RECORD_COLUMNS = "id, entry_time, exit_time, car_plate, due_payment, payment_status, created_at"
+
+GET_PAID_RECORD_SQL = f"""
+    SELECT {RECORD_COLUMNS} FROM parking_records
+    WHERE car_plate = ? AND payment_status = 1 AND exit_time IS NULL
+    ORDER BY entry_time DESC LIMIT 1
+"""
+
+RECORD_EXIT_SQL = """
+    UPDATE parking_records
+    SET exit_time = ?
+    WHERE car_plate = ? AND payment_status = 1 AND exit_time IS NULL
+    RETURNING id, entry_time
+"""
+
+GET_UNPAID_RECORD_SQL = f"""
+    SELECT {RECORD_COLUMNS} FROM parking_records
+    WHERE car_plate = ? AND payment_status = 0 AND exit_time IS NULL
+    ORDER BY entry_time DESC LIMIT 1
+"""
+
+UPDATE_PAYMENT_STATUS_SQL = """
+    UPDATE parking_records
+    SET due_payment = ?, payment_status = ?
+    WHERE car_plate = ? AND payment_status = 0 AND exit_time IS NULL
+    RETURNING id, entry_time
+"""
+
+GET_OPEN_SESSIONS_SQL = """
+    SELECT id, car_plate, entry_time, payment_status
+    FROM parking_records
+    WHERE payment_status = 0 AND exit_time IS NULL
+    UNION ALL
+    SELECT id, car_plate, entry_time, payment_status
+    FROM parking_records
+    WHERE payment_status = 1 AND exit_time IS NULL
+"""
+
+GET_ALL_ENTRIES_SQL = """
+    SELECT id, car_plate, entry_time
+    FROM parking_records
+    WHERE entry_time IS NOT NULL
+    ORDER BY entry_time DESC
+"""
+
+GET_ALL_EXITS_SQL = """
+    SELECT id, car_plate, exit_time
+    FROM parking_records
+    WHERE exit_time IS NOT NULL
+    ORDER BY exit_time DESC
+"""
+
+GET_ALL_PAYMENTS_SQL = """
+    SELECT car_plate, due_payment, created_at
+    FROM parking_records
+    WHERE payment_status = 1
+    ORDER BY created_at DESC
+"""
+
+GET_ALL_ALERTS_SQL = """
+    SELECT car_plate, created_at, 'Unauthorized Exit' as reason
+    FROM parking_records
+    WHERE payment_status = 0 AND exit_time IS NOT NULL
+    ORDER BY created_at DESC
+"""
+
+# Columns, ordering timestamp and row condition per log type, as in database.LOG_PAGES
+LOG_PAGE_PARTS = {
+    'checkins': ("id, entry_time, car_plate", 'entry_time', 'entry_time IS NOT NULL'),
+    'checkouts': ("id, exit_time, car_plate", 'exit_time', 'exit_time IS NOT NULL'),
+    'payments': ("id, created_at, car_plate, due_payment", 'created_at', 'payment_status = 1'),
+    'alerts': ("id, created_at, car_plate, 'Unauthorized Exit' as reason", 'created_at',
+               'payment_status = 0 AND exit_time IS NOT NULL'),
+}
+
+CLAIM_WRITE_KEY_SQL = """
+    INSERT INTO applied_writes (key, op, car_plate, applied_at) VALUES (?, ?, ?, ?)
+    ON CONFLICT (key) DO NOTHING
+    RETURNING key
+"""
+
+GET_WRITE_KEY_SQL = """
+    SELECT record_id FROM applied_writes WHERE key = ?
+"""
+
+SET_WRITE_RECORD_SQL = """
+    UPDATE applied_writes SET record_id = ? WHERE key = ?
+"""
+
+PRUNE_WRITE_KEYS_SQL = """
+    DELETE FROM applied_writes WHERE applied_at < ?
+"""
+
+ADD_LANE_EVENTS_SQL = """
+    INSERT INTO lane_events (occurred_at, lot_id, lane, kind, car_plate, track_id, details)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+EXPORT_RECORDS_SQL = f"""
+    SELECT {', '.join(EXPORT_COLUMNS)}
+    FROM parking_records
+    WHERE entry_time IS NOT NULL
+      AND entry_time >= ? AND entry_time < ?
+    ORDER BY entry_time, id
+"""
+
+
+def log_page_sql(log_type, filters):
+    """Keyset page query with only the filters in use.
+
+    SQLite plans a statement before parameters are bound, so optional filters
+    are left out of the SQL instead of written as `? IS NULL OR ...`.
+    """
+    columns, time_column, condition = LOG_PAGE_PARTS[log_type]
+    where = [condition]
+    if 'plate' in filters:
+        where.append("car_plate = :plate")
+    if 'since' in filters:
+        where.append(f"{time_column} >= :since")
+    if 'until' in filters:
+        where.append(f"{time_column} < :until")
+    if 'before_time' in filters:
+        where.append(f"({time_column}, id) < (:before_time, :before_id)")
+    return (f"SELECT {columns} FROM parking_records WHERE {' AND '.join(where)} "
+            f"ORDER BY {time_column} DESC, id DESC LIMIT :limit")
+
+
+# Timestamps are stored as ISO text ('YYYY-MM-DD HH:MM:SS.ffffff'), which sorts chronologically
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' '))
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+
+
+class SQLiteDatabase(ParkingStore):
+    """Embedded storage for edge lanes: one SQLite file in WAL mode.
+
+    Every decision is a local file access instead of a client/server round
+    trip. WAL lets the lane, the payment terminal and exporters read while
+    one of them writes; each thread gets its own connection. With the default
+    synchronous=NORMAL a power cut can lose the last few commits but never
+    corrupts the file; use synchronous='FULL' to fsync every commit.
+    """
+
+    backend = 'sqlite'
+    unavailable_errors = (sqlite3.OperationalError,)  # e.g. locked past the busy timeout
+
+    def __init__(self, path=None, lot_id=None, synchronous='NORMAL', timeout=5.0):
+        self.path = path or DEFAULT_PATH
+        self.lot_id = lot_id or DEFAULT_LOT_ID
+        self.synchronous = synchronous
+        self.timeout = timeout
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+        with self.transaction() as cursor:
+            cursor.executescript(SCHEMA_SQL)
+
+    def connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: transactions are begun explicitly in transaction()
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                   detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self, write=True):
+        """Yield a cursor inside a transaction; commit on success, roll back on error.
+
+        Write transactions take the write lock up front (BEGIN IMMEDIATE) so two
+        writers never deadlock upgrading from a read lock.
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def pool_stats(self):
+        with self.lock:
+            return {'backend': self.backend, 'path': self.path, 'connections': len(self.connections)}
+
+    @timed_query
+    def add_entry(self, plate_number):
+        try:
+            query = ADD_ENTRY_SQL
+            entry_time = datetime.now()
+            with self.transaction() as cursor:
+                cursor.execute(query, (plate_number, entry_time, entry_time, self.lot_id))
+                return cursor.fetchone()[0]
+        except Exception as e:
+            print(f"[ERROR] Failed to add entry: {e}")
+            return None
+
+    @timed_query
+    def has_unpaid_record(self, plate_number):
+        query = HAS_UNPAID_RECORD_SQL
+        with self.transaction(write=False) as cursor:
+            cursor.execute(query, (plate_number,))
+            return bool(cursor.fetchone())
+
+    @timed_query
+    def get_paid_record(self, plate_number):
+        query = GET_PAID_RECORD_SQL
+        with self.transaction(write=False) as cursor:
+            cursor.execute(query, (plate_number,))
+            record = cursor.fetchone()
+        return record_to_dict(record) if record else None
+
+    @timed_query
+    def record_exit(self, plate_number):
+        query = RECORD_EXIT_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query, (datetime.now(), plate_number))
+            return bool(cursor.fetchall())
+
+    @timed_query
+    def get_unpaid_record(self, plate_number):
+        query = GET_UNPAID_RECORD_SQL
+        with self.transaction(write=False) as cursor:
+            cursor.execute(query, (plate_number,))
+            record = cursor.fetchone()
+        return record_to_dict(record) if record else None
+
+    @timed_query
+    def update_payment_status(self, plate_number, amount, status):
+        query = UPDATE_PAYMENT_STATUS_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query, (amount, status, plate_number))
+            return bool(cursor.fetchall())
+
+    @timed_query
+    def apply_write(self, key, op, plate_number, occurred_at, amount=None):
+        """Apply a lane write at most once per key; same contract as ParkingDatabase.apply_write."""
+        with self.transaction() as cursor:
+            cursor.execute(CLAIM_WRITE_KEY_SQL, (key, op, plate_number, datetime.now()))
+            if not cursor.fetchall():
+                cursor.execute(GET_WRITE_KEY_SQL, (key,))
+                return cursor.fetchone()[0]
+
+            if op == 'entry':
+                cursor.execute(ADD_ENTRY_SQL, (plate_number, occurred_at, occurred_at, self.lot_id))
+            elif op == 'payment':
+                cursor.execute(UPDATE_PAYMENT_STATUS_SQL, (amount, 1, plate_number))
+            elif op == 'exit':
+                cursor.execute(RECORD_EXIT_SQL, (occurred_at, plate_number))
+            else:
+                raise ValueError(f"Unknown write '{op}'")
+            rows = cursor.fetchall()
+            record_id = rows[0][0] if rows else None
+            cursor.execute(SET_WRITE_RECORD_SQL, (record_id, key))
+            return record_id
+
+    @timed_query
+    def prune_write_keys(self, before):
+        query = PRUNE_WRITE_KEYS_SQL
+        with self.transaction() as cursor:
+            cursor.execute(query, (before,))
+            return cursor.rowcount
+
+    @timed_query
+    def get_open_sessions(self):
+        query = GET_OPEN_SESSIONS_SQL
+        with self.transaction(write=False) as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        return [
+            {
+                'id': row[0],
+                'car_plate': row[1],
+                'entry_time': row[2],
+                'payment_status': row[3]
+            }
+            for row in rows
+        ]
+
+    @timed_query
+    def get_all_entries(self):
+        query = GET_ALL_ENTRIES_SQL
+        with self.transaction(write=False) as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        return [
+            {
+                'id': row[0],
+                'car_plate': row[1],
+                'entry_time': row[2].strftime('%Y-%m-%d %H:%M:%S')
+            }
+            for row in rows
+        ]
+
+    @timed_query
+    def get_all_exits(self):
+        query = GET_ALL_EXITS_SQL
+        with self.transaction(write=False) as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        return [
+            {
+                'id': row[0],
+                'car_plate': row[1],
+                'exit_time': row[2].strftime('%Y-%m-%d %H:%M:%S')
+            }
+            for row in rows
+        ]
+
+    @timed_query
+    def get_all_payments(self):
+        query = GET_ALL_PAYMENTS_SQL
+        with self.transaction(write=False) as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        return [
+            {
+                'car_plate': row[0],
+                'due_payment': float(row[1]),
+                'created_at': row[2].strftime('%Y-%m-%d %H:%M:%S')
+            }
+            for row in rows
+        ]
+
+    @timed_query
+    def get_all_alerts(self):
+        query = GET_ALL_ALERTS_SQL
+        with self.transaction(write=False) as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+        return [
+            {
+                'car_plate': row[0],
+                'timestamp': row[1].strftime('%Y-%m-%d %H:%M:%S'),
+                'reason': row[2]
+            }
+            for row in rows
+        ]
+
+    @timed_query
+    def get_log_page(self, log_type, limit=50, before=None, since=None, until=None, plate=None):
+        """One page of a log, newest first; same contract as ParkingDatabase.get_log_page."""
+        params = {'limit': limit + 1}
+        for name, value in (('plate', plate), ('since', since), ('until', until)):
+            if value is not None:
+                params[name] = value
+        if before:
+            params['before_time'], params['before_id'] = before
+        to_dict = LOG_PAGES[log_type][1]
+
+        with self.transaction(write=False) as cursor:
+            cursor.execute(log_page_sql(log_type, params), params)
+            rows = cursor.fetchall()
+
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_key = (rows[-1][1], rows[-1][0])
+        return [to_dict(row) for row in rows], next_key
+
+    @timed_query
+    def add_lane_events(self, events):
+        query = ADD_LANE_EVENTS_SQL
+        rows = [(occurred_at, self.lot_id, lane, kind, plate, track_id, json.dumps(details))
+                for occurred_at, lane, kind, plate, track_id, details in events]
+        with self.transaction() as cursor:
+            cursor.executemany(query, rows)
+
+    def export_records(self, since=None, until=None, batch_size=1000):
+        """Stream parking records with entry_time in [since, until) as batches of rows."""
+        query = EXPORT_RECORDS_SQL
+        with self.transaction(write=False) as cursor:
+            cursor.execute(query, (since or datetime.min, until or datetime.max))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections.clear()
+        self.local = threading.local()
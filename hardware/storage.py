@@ -0,0 +1,137 @@
+import functools
+import os
+import time
+
+from metrics import histogram
+
+BACKENDS = ('postgres', 'sqlite')
+
+# Selected per process, e.g. PARKING_DB_BACKEND=sqlite on an edge lane PC
+DEFAULT_BACKEND = os.environ.get('PARKING_DB_BACKEND', 'postgres')
+
+QUERY_SECONDS = histogram('parking_db_query_seconds', 'Storage call latency, including connection checkout',
+                          ['backend', 'method'])
+
+
+def timed_query(method):
+    """Record a store method's latency in parking_db_query_seconds{backend, method}."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            QUERY_SECONDS.labels(backend=self.backend, method=method.__name__).observe(
+                time.perf_counter() - started)
+    return wrapper
+
+
+class ParkingStore:
+    """Storage interface shared by the Postgres and SQLite backends.
+
+    Lanes, the payment terminal and the exporters only use these methods, so
+    they run unchanged on either backend. Features that depend on server-side
+    triggers and LISTEN/NOTIFY (the SSE change feed and the stats rollups)
+    are Postgres-only and raise NotImplementedError elsewhere.
+    """
+
+    backend = None
+    supports_notify = False  # LISTEN/NOTIFY for OpenSessionIndex and EventBroker
+    unavailable_errors = ()  # exceptions meaning "database unreachable", as opposed to a bad write
+
+    # -- parking sessions ---------------------------------------------------
+
+    def add_entry(self, plate_number):
+        """Open an unpaid session; returns its id, or None on failure."""
+        raise NotImplementedError
+
+    def has_unpaid_record(self, plate_number):
+        raise NotImplementedError
+
+    def get_unpaid_record(self, plate_number):
+        raise NotImplementedError
+
+    def get_paid_record(self, plate_number):
+        raise NotImplementedError
+
+    def update_payment_status(self, plate_number, amount, status):
+        raise NotImplementedError
+
+    def record_exit(self, plate_number):
+        raise NotImplementedError
+
+    def get_open_sessions(self):
+        raise NotImplementedError
+
+    def apply_write(self, key, op, plate_number, occurred_at, amount=None):
+        """Apply an entry/payment/exit at most once per idempotency key; returns the record id."""
+        raise NotImplementedError
+
+    def prune_write_keys(self, before):
+        raise NotImplementedError
+
+    # -- logs, journal and exports ------------------------------------------
+
+    def get_all_entries(self):
+        raise NotImplementedError
+
+    def get_all_exits(self):
+        raise NotImplementedError
+
+    def get_all_payments(self):
+        raise NotImplementedError
+
+    def get_all_alerts(self):
+        raise NotImplementedError
+
+    def get_log_page(self, log_type, limit=50, before=None, since=None, until=None, plate=None):
+        raise NotImplementedError
+
+    def add_lane_events(self, events):
+        raise NotImplementedError
+
+    def export_records(self, since=None, until=None, batch_size=1000):
+        raise NotImplementedError
+
+    # -- Postgres-only features ---------------------------------------------
+
+    def get_events(self, after_id, missing_ids=(), limit=1000):
+        raise NotImplementedError(f"The change feed requires the postgres backend, not {self.backend}")
+
+    def get_last_event_id(self):
+        raise NotImplementedError(f"The change feed requires the postgres backend, not {self.backend}")
+
+    def get_stats(self, granularity, since, until, lot_id=None, limit=1000):
+        raise NotImplementedError(f"Stats rollups require the postgres backend, not {self.backend}")
+
+    def get_lot_occupancy(self):
+        raise NotImplementedError(f"Stats rollups require the postgres backend, not {self.backend}")
+
+    def pool_stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+def open_database(backend=None, forward_queue=None, **kwargs):
+    """Open the configured storage backend (PARKING_DB_BACKEND, default postgres).
+
+    Keyword arguments go to the backend: e.g. lot_id for both, minconn/maxconn
+    for Postgres, path/synchronous for SQLite. With forward_queue (a file
+    path, or a name for a file in store_forward.DEFAULT_QUEUE_DIR), lane
+    writes survive an unreachable database: see
+    store_forward.StoreAndForwardDatabase.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend == 'postgres':
+        from database import ParkingDatabase as store_class
+    elif backend == 'sqlite':
+        from sqlite_database import SQLiteDatabase as store_class
+    else:
+        raise ValueError(f"Unknown storage backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+
+    if forward_queue:
+        from store_forward import StoreAndForwardDatabase
+        return StoreAndForwardDatabase(lambda: store_class(**kwargs), forward_queue, store_class)
+    return store_class(**kwargs)
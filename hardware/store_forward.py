@@ -0,0 +1,382 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+from storage import ParkingStore
+
+# Queue files live here unless a full path is given; one file per process
+DEFAULT_QUEUE_DIR = os.environ.get(
+    'PARKING_QUEUE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outbox')
+)
+
+# Idempotency keys must outlive any write still sitting in a lane's queue
+KEY_RETENTION = timedelta(days=30)
+
+
+class StoreUnavailable(Exception):
+    """Raised by reads that need the database while it cannot be reached."""
+
+
+class WriteAheadQueue:
+    """Durable FIFO of pending writes: an append-only file of JSON lines.
+
+    append() returns only after the record is fsync'd, so a queued write
+    survives a crash or power cut. The byte offset of the first unacknowledged
+    record is kept in '<path>.offset' (replaced atomically on every ack);
+    once every record is acknowledged the log is truncated to zero.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset_path = path + '.offset'
+        self.lock = threading.Lock()
+        self.pending = deque()  # (end offset, record)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.acked = self._read_offset()
+        self._load()
+        self.file = open(path, 'ab')
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_offset(self, offset):
+        temp = self.offset_path + '.tmp'
+        with open(temp, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.offset_path)
+        self.acked = offset
+
+    def _load(self):
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if self.acked > size:
+            # Crashed between truncating the drained log and resetting the offset
+            self._write_offset(0)
+
+        position = self.acked
+        if size:
+            with open(self.path, 'rb') as f:
+                f.seek(position)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    position += len(line)
+                    self.pending.append((position, record))
+        if position < size:
+            # A torn final line from a crash mid-append was never acknowledged to the caller
+            os.truncate(self.path, position)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+    def append(self, record):
+        line = (json.dumps(record) + '\n').encode()
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending.append((self.file.tell(), record))
+
+    def peek(self):
+        with self.lock:
+            return self.pending[0][1] if self.pending else None
+
+    def ack(self):
+        """Mark the oldest record as applied."""
+        with self.lock:
+            end, _ = self.pending.popleft()
+            if self.pending:
+                self._write_offset(end)
+                return
+            self.file.truncate(0)
+            self.file.seek(0)
+            os.fsync(self.file.fileno())
+            self._write_offset(0)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class StoreAndForwardDatabase(ParkingStore):
+    """Keeps a lane (or the payment terminal) working while its database is down.
+
+    Entries, payments and exits get an idempotency key and are appended to a
+    local WriteAheadQueue; the call returns as soon as the record is on disk
+    (add_entry returns the key as a provisional id), so a hung server or a
+    dead network path can never stall the capture loop. A background thread
+    applies the queue in order through apply_write(), which ignores keys
+    that were already applied, and reconnects with backoff while the
+    database is down, so a write is never lost and never applied twice.
+
+    While offline, nothing on the caller's thread touches the network: gate
+    lookups answer "not found" (has_unpaid_record False, get_paid_record
+    None) and other reads raise StoreUnavailable.
+    """
+
+    def __init__(self, connect, queue_path, store_class=ParkingStore,
+                 retry_interval=1.0, max_retry_interval=30.0, logger=None):
+        self.connect = connect
+        if not os.path.dirname(queue_path):
+            queue_path = os.path.join(DEFAULT_QUEUE_DIR, queue_path + '.wal')
+        self.queue = WriteAheadQueue(queue_path)
+        self.rejected_path = queue_path + '.rejected'
+        self.backend = store_class.backend
+        self.supports_notify = store_class.supports_notify
+        self.unavailable_errors = store_class.unavailable_errors
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.logger = logger or logging.getLogger('StoreAndForward')
+
+        self.db = None
+        self.online = False
+        self.connect_failures = 0
+        self.queued = 0
+        self.replayed = 0
+        self.unmatched = 0  # replayed payments/exits that found no open session
+        self.rejected = 0
+        self.outages = 0
+        self.backlog = False  # writes piled up during an outage; log when they are through
+        self.last_prune = None
+
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+
+        # One attempt up front so a healthy lane starts warm; later ones run in the background
+        self._connect()
+        if len(self.queue):
+            self.logger.warning(f"{len(self.queue)} queued writes from a previous run will be replayed")
+            self.backlog = True
+        self.thread = threading.Thread(target=self._forward_loop, name='store-forward', daemon=True)
+        self.thread.start()
+
+    def __getattr__(self, name):
+        # Backend-specific attributes (e.g. config for LISTEN) of the connected store
+        db = self.__dict__.get('db')
+        if db is None:
+            raise AttributeError(f"{name} is unavailable until the database is connected")
+        return getattr(db, name)
+
+    # -- connection state ---------------------------------------------------
+
+    def _connect(self):
+        try:
+            self.db = self.connect()
+        except Exception as e:
+            if not self.connect_failures:
+                self.logger.warning(f"Database unavailable, queueing writes locally: {e}")
+            self.connect_failures += 1
+            return False
+        self._set_online(True)
+        return True
+
+    def _set_online(self, online, error=None):
+        if online and not self.online:
+            self.logger.info("Database reachable")
+        elif not online and self.online:
+            self.outages += 1
+            self.backlog = True
+            self.logger.warning(f"Database unreachable, queueing writes locally: {error}")
+        self.online = online
+
+    def _call(self, name, *args, **kwargs):
+        if not self.online:
+            raise StoreUnavailable("Database unreachable")
+        try:
+            return getattr(self.db, name)(*args, **kwargs)
+        except self.unavailable_errors as e:
+            self._set_online(False, e)
+            self.wake.set()
+            raise StoreUnavailable(str(e)) from e
+
+    # -- writes -------------------------------------------------------------
+
+    def write(self, op, plate_number, amount=None):
+        """Queue a write durably for the forwarder thread and return its key."""
+        key = str(uuid.uuid4())
+        self.queue.append({
+            'key': key,
+            'op': op,
+            'plate': plate_number,
+            'at': datetime.now().isoformat(),
+            'amount': amount
+        })
+        self.queued += 1
+        self.wake.set()
+        return key
+
+    def add_entry(self, plate_number):
+        try:
+            return self.write('entry', plate_number)
+        except Exception as e:
+            print(f"[ERROR] Failed to add entry: {e}")
+            return None
+
+    def update_payment_status(self, plate_number, amount, status):
+        if status != 1:
+            return self._call('update_payment_status', plate_number, amount, status)
+        return bool(self.write('payment', plate_number, float(amount)))
+
+    def record_exit(self, plate_number):
+        return bool(self.write('exit', plate_number))
+
+    # -- reads --------------------------------------------------------------
+
+    def has_unpaid_record(self, plate_number):
+        try:
+            return self._call('has_unpaid_record', plate_number)
+        except StoreUnavailable:
+            return False
+
+    def get_paid_record(self, plate_number):
+        try:
+            return self._call('get_paid_record', plate_number)
+        except StoreUnavailable:
+            return None
+
+    def get_unpaid_record(self, plate_number):
+        return self._call('get_unpaid_record', plate_number)
+
+    def get_open_sessions(self):
+        return self._call('get_open_sessions')
+
+    def get_all_entries(self):
+        return self._call('get_all_entries')
+
+    def get_all_exits(self):
+        return self._call('get_all_exits')
+
+    def get_all_payments(self):
+        return self._call('get_all_payments')
+
+    def get_all_alerts(self):
+        return self._call('get_all_alerts')
+
+    def get_log_page(self, *args, **kwargs):
+        return self._call('get_log_page', *args, **kwargs)
+
+    def add_lane_events(self, events):
+        # EventJournal retries on its own; queueing here would only duplicate that
+        return self._call('add_lane_events', events)
+
+    def export_records(self, *args, **kwargs):
+        return self._call('export_records', *args, **kwargs)
+
+    # -- replay -------------------------------------------------------------
+
+    def _replay(self, record):
+        record_id = self.db.apply_write(record['key'], record['op'], record['plate'],
+                                        datetime.fromisoformat(record['at']), record['amount'])
+        self.replayed += 1
+        if record_id is None and record['op'] != 'entry':
+            self.unmatched += 1
+            self.logger.warning(f"Replayed {record['op']} for {record['plate']} matched no open session")
+
+    def _reject(self, record, error):
+        """Set aside a write the database refuses, so it cannot block the queue."""
+        self.rejected += 1
+        self.logger.error(f"Queued {record['op']} for {record['plate']} rejected: {error}")
+        with open(self.rejected_path, 'a') as f:
+            f.write(json.dumps({**record, 'error': str(error)}) + '\n')
+
+    def _prune(self):
+        now = datetime.now()
+        if self.last_prune and now - self.last_prune < timedelta(hours=1):
+            return
+        self.last_prune = now
+        try:
+            self.db.prune_write_keys(now - KEY_RETENTION)
+        except Exception as e:
+            self.logger.warning(f"Pruning idempotency keys failed: {e}")
+
+    def _forward_loop(self):
+        # Nothing restarts this thread, so no error may end it
+        while not self.stopped.is_set():
+            try:
+                self._forward()
+            except Exception as e:
+                self.logger.error(f"Write forwarder error, retrying: {e}")
+                self._set_online(False, e)
+                self.stopped.wait(self.retry_interval)
+
+    def _forward(self):
+        delay = self.retry_interval
+        while not self.stopped.is_set():
+            if self.db is None and not self._connect():
+                self.stopped.wait(delay)
+                delay = min(delay * 2, self.max_retry_interval)
+                continue
+
+            record = self.queue.peek()
+            if record is None and self.online:
+                self._prune()
+                self.wake.wait(1.0)
+                self.wake.clear()
+                continue
+
+            try:
+                if record is None:
+                    self.db.has_unpaid_record('')  # probe
+                else:
+                    self._replay(record)
+            except self.unavailable_errors as e:
+                self._set_online(False, e)
+                self.stopped.wait(delay)
+                delay = min(delay * 2, self.max_retry_interval)
+                continue
+            except Exception as e:
+                if record is not None:
+                    self._reject(record, e)
+                else:
+                    # A probe that fails oddly says no more than one that times out
+                    self.logger.error(f"Database probe failed: {e}")
+                    self._set_online(False, e)
+                    self.stopped.wait(delay)
+                    delay = min(delay * 2, self.max_retry_interval)
+                    continue
+
+            self._set_online(True)
+            delay = self.retry_interval
+            if record is not None:
+                self.queue.ack()
+                if self.backlog and not len(self.queue):
+                    self.backlog = False
+                    self.logger.info(f"Write queue drained ({self.replayed} replayed)")
+
+    def stats(self):
+        return {
+            'online': self.online,
+            'pending': len(self.queue),
+            'queued': self.queued,
+            'replayed': self.replayed,
+            'unmatched': self.unmatched,
+            'rejected': self.rejected,
+            'outages': self.outages
+        }
+
+    def pool_stats(self):
+        return self.db.pool_stats() if self.db else {}
+
+    def close(self, timeout=5.0):
+        """Stop replaying; anything still queued is replayed on the next start."""
+        self.stopped.set()
+        self.wake.set()
+        self.thread.join(timeout)
+        self.queue.close()
+        if self.db:
+            self.db.close()
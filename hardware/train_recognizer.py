@@ -0,0 +1,319 @@
+import argparse
+import csv
+import os
+import random
+import time
+
+import cv2
+import numpy as np
+
+from benchmark_preprocess import dataset_crops, labeled_crops, load_labels
+from ocr_engine import DEFAULT_RECOGNIZER, PLATE_WHITELIST, crnn_input, ctc_decode
+from plate_preprocess import STRATEGIES, PlatePreprocessor
+
+# Model input; plates are about 4:1, and 128 columns give 32 CTC steps for 7 characters
+INPUT_HEIGHT = 32
+INPUT_WIDTH = 128
+
+DEFAULT_RUN_DIR = os.path.dirname(os.path.dirname(DEFAULT_RECOGNIZER))
+DEFAULT_PREPROCESS = 'gray'  # the model learns its own thresholds
+
+
+def build_model(classes):
+    """CNN that squeezes the crop to one row of 32 columns, then a BiLSTM over the columns.
+
+    About 0.4M parameters. The graph returns (batch, 32, classes) logits;
+    class 0 is the CTC blank.
+    """
+    import torch
+    from torch import nn
+
+    def block(cin, cout, pool):
+        return [nn.Conv2d(cin, cout, 3, padding=1, bias=False), nn.BatchNorm2d(cout),
+                nn.ReLU(inplace=True), nn.MaxPool2d(pool)]
+
+    class CRNN(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.features = nn.Sequential(
+                *block(1, 32, 2),  # 16 x 64
+                *block(32, 64, 2),  # 8 x 32
+                *block(64, 128, (2, 1)),  # 4 x 32
+                *block(128, 128, (4, 1))  # 1 x 32
+            )
+            self.rnn = nn.LSTM(128, 96, bidirectional=True, batch_first=True)
+            self.classifier = nn.Linear(192, classes)
+
+        def forward(self, x):
+            columns = self.features(x).squeeze(2).permute(0, 2, 1)  # (batch, 32, 128)
+            return self.classifier(self.rnn(columns)[0])
+
+    torch.manual_seed(0)
+    return CRNN()
+
+
+def random_plate(rng):
+    """Random text in the RA[A-Z]\\d{3}[A-Z] format."""
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    return ('RA' + rng.choice(letters) + ''.join(rng.choice('0123456789') for _ in range(3))
+            + rng.choice(letters))
+
+
+def render_plate(text, rng):
+    """Draw a synthetic plate crop: dark characters on a light plate, loosely framed."""
+    height, width = 60, 240
+    background = rng.randint(170, 255)
+    plate = np.full((height, width, 3), background, np.uint8)
+    if rng.random() < 0.5:
+        plate[..., 0] = max(0, background - rng.randint(60, 140))  # yellow plates
+    cv2.rectangle(plate, (2, 2), (width - 3, height - 3), (0, 0, 0), rng.randint(1, 3))
+
+    font = rng.choice([cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX])
+    thickness = rng.randint(2, 4)
+    scale = 1.4
+    (text_width, text_height), _ = cv2.getTextSize(text, font, scale, thickness)
+    scale *= (width - 24) / text_width
+    (text_width, text_height), _ = cv2.getTextSize(text, font, scale, thickness)
+    ink = rng.randint(0, 60)
+    cv2.putText(plate, text, ((width - text_width) // 2, (height + text_height) // 2),
+                font, scale, (ink, ink, ink), thickness, cv2.LINE_AA)
+    return plate
+
+
+def augment(crop, rng):
+    """Camera-like variation: loose/tight framing, tilt, blur, noise, lighting and resolution."""
+    height, width = crop.shape[:2]
+    dx, dy = width * 0.06, height * 0.12
+    src = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    dst = src + np.float32([[rng.uniform(-dx, dx), rng.uniform(-dy, dy)] for _ in range(4)])
+    matrix = cv2.getPerspectiveTransform(src, dst)
+    crop = cv2.warpPerspective(crop, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+
+    if rng.random() < 0.5:
+        scale = rng.uniform(0.3, 0.8)  # far-away plates
+        small = cv2.resize(crop, (max(8, int(width * scale)), max(4, int(height * scale))))
+        crop = cv2.resize(small, (width, height))
+    if rng.random() < 0.4:
+        crop = cv2.GaussianBlur(crop, (rng.choice([3, 5]),) * 2, 0)
+
+    contrast, brightness = rng.uniform(0.6, 1.3), rng.uniform(-50, 40)
+    crop = crop.astype(np.float32) * contrast + brightness
+    if rng.random() < 0.5:
+        crop += np.random.default_rng(rng.randrange(1 << 30)).normal(0, rng.uniform(2, 12), crop.shape)
+    return np.clip(crop, 0, 255).astype(np.uint8)
+
+
+def load_samples(args):
+    """Labeled real crops as (name, crop, plate), from the dataset boxes and/or a crop directory."""
+    labels = load_labels(args.labels) if args.labels else {}
+    samples = []
+    if labels:
+        samples += [(name, crop, labels[name])
+                    for name, crop in dataset_crops(limit=args.limit) if labels.get(name)]
+    if args.crops:
+        samples += [sample for sample in labeled_crops(args.crops, labels) if sample[2]]
+    alphabet = set(PLATE_WHITELIST)
+    return [(name, crop, plate) for name, crop, plate in samples if set(plate) <= alphabet]
+
+
+def dump_crops(directory, limit):
+    """Write the dataset's plate crops and a file,plate CSV to fill in by hand."""
+    os.makedirs(directory, exist_ok=True)
+    crops = dataset_crops(limit=limit)
+    for name, crop in crops:
+        cv2.imwrite(os.path.join(directory, name), crop)
+    path = os.path.join(directory, 'labels.csv')
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'plate'])
+        writer.writerows([name, ''] for name, _ in crops)
+    print(f"[DUMP] {len(crops)} crops written to {directory}; fill in the plate column of {path}")
+
+
+class Batches:
+    """Preprocessed, augmented training batches drawn from real and synthetic plates."""
+
+    def __init__(self, real, synthetic, preprocess, batch_size, rng):
+        self.real = real
+        self.synthetic = synthetic
+        self.preprocess = preprocess
+        self.batch_size = batch_size
+        self.rng = rng
+
+    def repeats(self):
+        return max(1, self.synthetic // len(self.real)) if self.real else 0
+
+    def steps(self):
+        return -(-(self.synthetic + self.repeats() * len(self.real)) // self.batch_size)
+
+    def sample(self, crop, plate, augmented=True):
+        image = self.preprocess(augment(crop, self.rng) if augmented else crop)
+        return image, plate
+
+    def epoch(self):
+        """One pass: every synthetic plate once, real crops repeated to make up half the samples."""
+        rng = self.rng
+        items = [(render_plate(text, rng), text) for text in
+                 (random_plate(rng) for _ in range(self.synthetic))]
+        items += [(crop, plate) for _ in range(self.repeats()) for _, crop, plate in self.real]
+        rng.shuffle(items)
+        for start in range(0, len(items), self.batch_size):
+            yield to_batch([self.sample(crop, plate) for crop, plate in items[start:start + self.batch_size]])
+
+
+def to_batch(samples):
+    """(images, targets, target lengths, texts) as numpy arrays for a list of (image, plate)."""
+    images = np.empty((len(samples), 1, INPUT_HEIGHT, INPUT_WIDTH), np.float32)
+    for i, (image, _) in enumerate(samples):
+        crnn_input(image, INPUT_WIDTH, INPUT_HEIGHT, images[i, 0])
+    texts = [plate for _, plate in samples]
+    targets = np.array([PLATE_WHITELIST.index(c) + 1 for text in texts for c in text], np.int64)
+    lengths = np.array([len(text) for text in texts], np.int64)
+    return images, targets, lengths, texts
+
+
+def evaluate(model, batch):
+    """Exact-match accuracy of greedy decoding on a prepared batch."""
+    import torch
+    images, _, _, texts = batch
+    model.eval()
+    with torch.no_grad():
+        classes = model(torch.from_numpy(images)).argmax(dim=2).numpy()
+    model.train()
+    correct = sum(ctc_decode(row, PLATE_WHITELIST) == text for row, text in zip(classes, texts))
+    return correct / len(texts)
+
+
+def train(args):
+    import torch
+
+    rng = random.Random(args.seed)
+    real = load_samples(args)
+    rng.shuffle(real)
+    held_out = int(len(real) * args.val_fraction)
+    val_real, train_real = real[:held_out], real[held_out:]
+    print(f"[DATA] {len(train_real)} labeled crops for training, {len(val_real)} for validation, "
+          f"{args.synthetic} synthetic plates per epoch")
+    if not real:
+        print("[WARNING] No labeled crops: training on synthetic plates only "
+              "(see --dump-crops to label the dataset)")
+
+    preprocess = PlatePreprocessor(args.preprocess)
+    batches = Batches(train_real, args.synthetic, preprocess, args.batch, rng)
+    if val_real:
+        validation = to_batch([batches.sample(crop, plate, augmented=False) for _, crop, plate in val_real])
+    else:
+        validation = to_batch([batches.sample(render_plate(text, rng), text)
+                               for text in (random_plate(rng) for _ in range(500))])
+
+    model = build_model(len(PLATE_WHITELIST) + 1)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr, weight_decay=1e-4)
+    scheduler = torch.optim.lr_scheduler.OneCycleLR(optimizer, args.lr, epochs=args.epochs,
+                                                    steps_per_epoch=batches.steps())
+    ctc = torch.nn.CTCLoss(blank=0, zero_infinity=True)
+
+    weights_dir = os.path.join(args.output_dir, 'weights')
+    os.makedirs(weights_dir, exist_ok=True)
+    weights = os.path.join(weights_dir, 'crnn.pt')
+    best = -1.0
+    for epoch in range(1, args.epochs + 1):
+        started, losses = time.time(), []
+        for images, targets, lengths, _ in batches.epoch():
+            logits = model(torch.from_numpy(images))  # (batch, steps, classes)
+            log_probs = logits.log_softmax(2).permute(1, 0, 2)  # CTC wants (steps, batch, classes)
+            steps = torch.full((len(images),), log_probs.shape[0], dtype=torch.long)
+            loss = ctc(log_probs, torch.from_numpy(targets), steps, torch.from_numpy(lengths))
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 5.0)
+            optimizer.step()
+            scheduler.step()
+            losses.append(loss.item())
+
+        accuracy = evaluate(model, validation)
+        print(f"[EPOCH {epoch}/{args.epochs}] loss {np.mean(losses):.4f}  "
+              f"val accuracy {accuracy:.1%}  ({time.time() - started:.0f}s)")
+        if accuracy >= best:
+            best = accuracy
+            torch.save(model.state_dict(), weights)
+
+    print(f"[TRAIN] Best validation accuracy {best:.1%}; weights written to {weights}")
+    return weights
+
+
+def export_onnx(weights, output_path, preprocess):
+    """Export the trained weights with a dynamic batch axis and the decoding settings as metadata."""
+    import onnx
+    import torch
+
+    model = build_model(len(PLATE_WHITELIST) + 1)
+    model.load_state_dict(torch.load(weights, map_location='cpu'))
+    model.eval()
+    torch.onnx.export(
+        model, torch.zeros(1, 1, INPUT_HEIGHT, INPUT_WIDTH), output_path,
+        input_names=['image'], output_names=['logits'],
+        dynamic_axes={'image': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=17, dynamo=False
+    )
+
+    graph = onnx.load(output_path)
+    for key, value in (('alphabet', PLATE_WHITELIST), ('height', INPUT_HEIGHT),
+                       ('width', INPUT_WIDTH), ('preprocess', preprocess)):
+        graph.metadata_props.add(key=key, value=str(value))
+    onnx.save(graph, output_path)
+    print(f"[EXPORT] ONNX model written to {output_path}")
+    return output_path
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Train the CRNN plate recognizer on labeled plate crops and export it to ONNX'
+    )
+
+    parser.add_argument('--labels', type=str,
+                        help='CSV of file,plate for the dataset crops (<image stem>_<box>.jpg)')
+    parser.add_argument('--crops', type=str,
+                        help='Extra crops labeled by a <PLATE>_... file name (main.py --save-images)')
+    parser.add_argument('--limit', type=int, default=0,
+                        help='Only cut crops from the first N dataset images')
+    parser.add_argument('--dump-crops', type=str, metavar='DIR',
+                        help='Write the dataset crops and an empty labels CSV to DIR, then exit')
+    parser.add_argument('--synthetic', type=int, default=4000,
+                        help='Synthetic plates rendered per epoch')
+    parser.add_argument('--preprocess', type=str, choices=sorted(STRATEGIES), default=DEFAULT_PREPROCESS,
+                        help='Preprocessing the lanes will run before the model (stored in the ONNX file)')
+    parser.add_argument('--epochs', type=int, default=30,
+                        help='Training epochs')
+    parser.add_argument('--batch', type=int, default=64,
+                        help='Batch size')
+    parser.add_argument('--lr', type=float, default=2e-3,
+                        help='Peak learning rate')
+    parser.add_argument('--val-fraction', type=float, default=0.2,
+                        help='Share of the labeled crops held out for validation')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Random seed for the split, synthesis and augmentation')
+    parser.add_argument('--output-dir', type=str, default=DEFAULT_RUN_DIR,
+                        help='Run directory; weights go to weights/crnn.pt and weights/crnn.onnx')
+    parser.add_argument('--export-only', action='store_true',
+                        help='Skip training and export the existing weights/crnn.pt')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main entry point."""
+    args = parse_arguments()
+    if args.dump_crops:
+        dump_crops(args.dump_crops, args.limit)
+        return
+
+    weights = os.path.join(args.output_dir, 'weights', 'crnn.pt')
+    if not args.export_only:
+        weights = train(args)
+    onnx_path = export_onnx(weights, os.path.splitext(weights)[0] + '.onnx', args.preprocess)
+    print(f"[NEXT] Compare with Tesseract: python benchmark_ocr.py --model {onnx_path}")
+
+
+if __name__ == "__main__":
+    main()